@@ -1,6 +1,7 @@
 from sentence_transformers import SentenceTransformer
 import numpy as np
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+from core.colbert_store import ColBERTTokenStore
 import torch
 
 
@@ -15,6 +16,10 @@ class ColBERTRetrievalAgent:
             self.model = SentenceTransformer('sentence-transformers/all-mpnet-base-v2')
             self.max_doc_length = 512
             self.max_query_length = 64
+            self.batch_size = 32
+            # Truncate with the tokenizer: tokens past max_seq_length are dropped by the model anyway
+            self.model.max_seq_length = min(self.model.max_seq_length or self.max_doc_length, self.max_doc_length)
+            self.token_stores = {}
             print("✅ ColBERT retrieval agent initialized")
         except Exception as e:
             print(f"⚠️ Failed to initialize ColBERT agent: {str(e)}")
@@ -28,28 +33,24 @@ class ColBERTRetrievalAgent:
             return documents
 
         try:
-            encoded_docs = []
-
-            for doc in documents:
-                content = doc.get('content', '')
-                if not content.strip():
-                    continue
+            docs_to_encode = [doc for doc in documents if doc.get('content', '').strip()]
+            if not docs_to_encode:
+                return []
 
-                words = content.split()[:self.max_doc_length]
-                truncated_content = ' '.join(words)
+            token_embeddings = self.encode_token_batches([doc['content'] for doc in docs_to_encode])
 
-                token_embeddings = self.model.encode(
-                    [truncated_content],
-                    output_value='token_embeddings',
-                    convert_to_tensor=True
-                )
-
-                doc_embedding = torch.mean(token_embeddings[0], dim=0).cpu().numpy()
+            encoded_docs = []
+            for doc, doc_tokens in zip(docs_to_encode, token_embeddings):
+                doc_embedding = torch.mean(doc_tokens, dim=0).cpu().numpy()
 
                 encoded_doc = doc.copy()
-                encoded_doc['colbert_tokens'] = token_embeddings[0].cpu().numpy()
-                encoded_doc['embedding'] = doc_embedding
-                encoded_doc['token_count'] = len(token_embeddings[0])
+                # Unit-normalize once at ingestion so MaxSim is a plain dot product at query time
+                encoded_doc['colbert_tokens'] = torch.nn.functional.normalize(doc_tokens, dim=1).cpu().numpy()
+                encoded_doc['colbert_embedding'] = doc_embedding
+                # Keep the dense (BGE) vector the indexes are built from; only fill a missing one
+                if encoded_doc.get('embedding') is None:
+                    encoded_doc['embedding'] = doc_embedding
+                encoded_doc['token_count'] = len(doc_tokens)
 
                 encoded_docs.append(encoded_doc)
 
@@ -60,27 +61,57 @@ class ColBERTRetrievalAgent:
             print(f"⚠️ ColBERT document encoding failed: {str(e)}")
             return documents
 
-    def late_interaction_score(self, query_tokens: np.ndarray, doc_tokens: np.ndarray) -> float:
+    def encode_token_batches(self, texts: List[str]) -> List[torch.Tensor]:
         """
-        Compute ColBERT-style late interaction score between query and document tokens.
+        Token embeddings for many texts in padded batches of `batch_size`.
+        Each returned tensor is one text's (tokens x dim) matrix with padding
+        stripped; truncation happens in the tokenizer at `max_seq_length`.
         """
-        try:
-            query_norm = query_tokens / (np.linalg.norm(query_tokens, axis=1, keepdims=True) + 1e-8)
-            doc_norm = doc_tokens / (np.linalg.norm(doc_tokens, axis=1, keepdims=True) + 1e-8)
-
-            similarity_matrix = np.dot(query_norm, doc_norm.T)
+        return self.model.encode(
+            texts,
+            output_value='token_embeddings',
+            batch_size=self.batch_size,
+            show_progress_bar=False
+        )
+
+    def _doc_tokens(self, doc: Dict[str, Any]) -> Optional[np.ndarray]:
+        """Token matrix for a doc, either inline or sliced from its token store."""
+        if doc.get('colbert_tokens') is not None:
+            return doc['colbert_tokens']
+        file_id = doc.get('colbert_store')
+        if file_id is None or doc.get('colbert_id') is None:
+            return None
+        store = self.token_stores.get(file_id)
+        if store is None or store.is_stale():
+            store = ColBERTTokenStore(file_id)
+            if not store.load():
+                return None
+            self.token_stores[file_id] = store
+        return store.get(doc['colbert_id'])
+
+    def batch_late_interaction_scores(self, query_tokens: np.ndarray, doc_token_mats: List[np.ndarray]) -> np.ndarray:
+        """
+        MaxSim scores for many documents at once. Document tokens must already be
+        unit-normalized (done at ingestion). All candidate token matrices are
+        concatenated and scored against the query in a single GEMM, then reduced
+        with a segmented max per document.
+        """
+        scores = np.zeros(len(doc_token_mats), dtype=np.float32)
+        lengths = np.array([len(mat) for mat in doc_token_mats], dtype=np.int64)
+        non_empty = np.flatnonzero(lengths > 0)
+        if len(non_empty) == 0:
+            return scores
 
-            max_similarities = np.max(similarity_matrix, axis=1)
+        query_norm = query_tokens / (np.linalg.norm(query_tokens, axis=1, keepdims=True) + 1e-8)
+        doc_matrix = np.concatenate([doc_token_mats[i] for i in non_empty]).astype(np.float32, copy=False)
 
-            score = np.sum(max_similarities)
+        similarity_matrix = doc_matrix @ query_norm.T.astype(np.float32)
+        starts = np.concatenate(([0], np.cumsum(lengths[non_empty])[:-1]))
+        max_similarities = np.maximum.reduceat(similarity_matrix, starts, axis=0)
 
-            return float(score)
+        scores[non_empty] = max_similarities.sum(axis=1)
+        return scores
 
-        
-        except Exception as e:
-            print(f"⚠️ Late interaction scoring failed: {str(e)}")
-            return 0.0
-    
     def retrieve_with_colbert(self, query: str, documents: List[Dict[str, Any]], top_k: int = 10) -> List[Dict[str, Any]]:
         """
         Retrieve documents using ColBERT-style late interaction.
@@ -98,25 +129,31 @@ class ColBERTRetrievalAgent:
                 convert_to_tensor=True
             )[0].cpu().numpy()
             
+            scores = np.zeros(len(documents), dtype=np.float32)
+            token_positions = []
+            token_mats = []
+            query_emb = np.mean(query_tokens, axis=0)
+
+            for i, doc in enumerate(documents):
+                doc_tokens = self._doc_tokens(doc)
+                if doc_tokens is not None:
+                    token_positions.append(i)
+                    token_mats.append(doc_tokens)
+                elif doc.get('colbert_embedding', doc.get('embedding')) is not None:
+                    doc_emb = doc.get('colbert_embedding', doc.get('embedding'))
+                    scores[i] = np.dot(query_emb, doc_emb) / (
+                        np.linalg.norm(query_emb) * np.linalg.norm(doc_emb) + 1e-8
+                    )
+
+            if token_mats:
+                scores[token_positions] = self.batch_late_interaction_scores(query_tokens, token_mats)
+
             scored_docs = []
-            
-            for doc in documents:
-                if 'colbert_tokens' not in doc:
-                    if 'embedding' in doc:
-                        query_emb = np.mean(query_tokens, axis=0)
-                        doc_emb = doc['embedding']
-                        score = np.dot(query_emb, doc_emb) / (
-                            np.linalg.norm(query_emb) * np.linalg.norm(doc_emb) + 1e-8
-                        )
-                    else:
-                        score = 0.0
-                else:
-                    score = self.late_interaction_score(query_tokens, doc['colbert_tokens'])
-                
+            for doc, score in zip(documents, scores):
                 doc_with_score = doc.copy()
-                doc_with_score['colbert_score'] = score
+                doc_with_score['colbert_score'] = float(score)
                 scored_docs.append(doc_with_score)
-            
+
             scored_docs.sort(key=lambda x: x.get('colbert_score', 0), reverse=True)
             
             print(f"✅ ColBERT retrieval completed, top score: {scored_docs[0].get('colbert_score', 0):.4f}")
@@ -1,8 +1,11 @@
-from core.embeddings import compute_embeddings, save_faiss_index
+from core.embeddings import compute_embeddings, save_faiss_index, update_faiss_index
 from core.config_manager import ConfigManager
 from core.hnswlib_search import HNSWSearch
+from core.colbert_store import ColBERTTokenStore
+from core.bm25_index import BM25Index
+from core.doc_store import content_hash
 from agents.colbert_retrieval_agent import ColBERTRetrievalAgent
-from sklearn.metrics.pairwise import cosine_similarity
+import hnswlib
 import numpy as np
 import chromadb
 import os
@@ -14,84 +17,291 @@ class EmbeddingAgent:
         self.name = "EmbeddingAgent"
         self.chroma_client = chromadb.PersistentClient(path=os.path.join(ConfigManager.VECTOR_STORE_BASE, "chroma"))
         self.sim_threshold = 0.92
+        self.dedup_neighbors = 32
+        self.chroma_batch_size = 1000
         self.hnsw_search = None
         self.colbert_agent = ColBERTRetrievalAgent()
 
     def _filter_duplicates(self, docs):
+        """
+        Drop near-duplicates: walking docs in order, a doc is kept unless an
+        earlier kept doc has cosine similarity above `sim_threshold`. Candidate
+        neighbours come from an HNSW index over the docs (k = `dedup_neighbors`),
+        so memory and time grow roughly linearly with the number of docs. A
+        kept doc whose k neighbours are all duplicates (a cluster of repeated
+        headers or boilerplate) is queried again with k doubled until the
+        farthest neighbour is below the threshold, so no duplicate is missed.
+        """
         if not docs:
             return docs
         try:
-            embeddings = np.array([doc["embedding"] for doc in docs])
-            similarity_matrix = cosine_similarity(embeddings)
+            embeddings = np.array([doc["embedding"] for doc in docs]).astype("float32")
+            embeddings = embeddings / (np.linalg.norm(embeddings, axis=1, keepdims=True) + 1e-8)
+            n = len(docs)
+            k = min(self.dedup_neighbors, n)
+
+            index = hnswlib.Index(space="ip", dim=embeddings.shape[1])
+            index.init_index(max_elements=n, ef_construction=200, M=16)
+            index.set_ef(max(50, k))
+            index.add_items(embeddings, np.arange(n))
+            labels, distances = index.knn_query(embeddings, k=k)
+
+            # hnswlib "ip" distance is 1 - dot, so similarity = 1 - distance
+            similarities = 1.0 - distances
+            dropped = np.zeros(n, dtype=bool)
             keep = []
-            dropped = set()
-            for i in range(len(docs)):
-                if i in dropped:
+            for i in range(n):
+                if dropped[i]:
                     continue
-                for j in range(i + 1, len(docs)):
-                    if similarity_matrix[i][j] > self.sim_threshold:
-                        dropped.add(j)
+                row_labels, row_similarities = labels[i], similarities[i]
+                while len(row_labels) < n and row_similarities[-1] > self.sim_threshold:
+                    row_k = min(len(row_labels) * 2, n)
+                    index.set_ef(max(50, row_k))
+                    row_labels, row_distances = index.knn_query(embeddings[i:i + 1], k=row_k)
+                    row_labels, row_similarities = row_labels[0], 1.0 - row_distances[0]
+                neighbours = row_labels[(row_similarities > self.sim_threshold) & (row_labels > i)]
+                dropped[neighbours] = True
                 keep.append(docs[i])
-            print(f"✅ Filtered {len(dropped)} duplicate documents, kept {len(keep)}")
+            print(f"✅ Filtered {int(dropped.sum())} duplicate documents, kept {len(keep)}")
             return keep
         except Exception as e:
             print(f"⚠️ Deduplication failed: {str(e)}, returning all documents")
             return docs
 
-    def _save_faiss(self, docs, file_id="default"):
+    def _save_faiss(self, docs, file_id="default", embeddings=None):
         try:
             save_path = ConfigManager.get_faiss_path(file_id)
-            save_faiss_index(docs, save_path=save_path)
+            save_faiss_index(docs, save_path=save_path, embeddings=embeddings)
         except Exception as e:
             print(f"⚠️ Failed to save FAISS index: {str(e)}")
 
+    def _update_faiss(self, hnsw_search, added_docs, removed_docs, file_id="default"):
+        """Apply adds/deletes to the FAISS index in place, rebuilding from the live HNSW items if it can't."""
+        try:
+            if update_faiss_index(added_docs, save_path=ConfigManager.get_faiss_path(file_id), removed=removed_docs):
+                return
+            live_docs, live_vectors = hnsw_search.live_vectors()
+            self._save_faiss(live_docs, file_id, embeddings=live_vectors)
+        except Exception as e:
+            print(f"⚠️ Failed to update FAISS index: {str(e)}")
+
+    @staticmethod
+    def _delete_colbert(file_id, docs):
+        ids = [doc.get("colbert_id") for doc in docs if doc.get("colbert_store") == file_id]
+        ColBERTTokenStore(file_id).delete(ids)
+
+    @staticmethod
+    def _content_hash(content):
+        return content_hash(content)
+
+    def _chroma_id(self, collection_name, content):
+        return f"{collection_name}_{self._content_hash(content)}"
+
+    def _chroma_collection(self, collection_name):
+        return self.chroma_client.get_or_create_collection(
+            name=collection_name,
+            embedding_function=None,
+            metadata={"hnsw:space": "cosine"}
+        )
+
+    def _chroma_docs(self, docs, file_id, collection_name, hnsw_search):
+        """
+        Docs to upsert into Chroma. A collection that is still empty gets
+        every live HNSW item instead, so files indexed before collections were
+        named by dimension are backfilled; the old collection, written by
+        Chroma's 384-d default embedder and unusable with our vectors, is dropped.
+        """
+        try:
+            if self._chroma_collection(collection_name).count() > 0:
+                return docs
+            legacy_name = ConfigManager.get_chroma_collection_name(file_id)
+            try:
+                self.chroma_client.delete_collection(name=legacy_name)
+                print(f"✅ Dropped ChromaDB collection {legacy_name} built with the default embedder")
+            except Exception:
+                pass
+            live_docs, live_vectors = hnsw_search.live_vectors()
+            return [dict(doc, embedding=vector) for doc, vector in zip(live_docs, live_vectors)]
+        except Exception as e:
+            print(f"⚠️ Failed to check ChromaDB collection {collection_name}: {str(e)}")
+            return docs
+
+    def _delete_chroma(self, docs, collection_name):
+        try:
+            if not docs:
+                return
+            collection = self._chroma_collection(collection_name)
+            collection.delete(ids=list({self._chroma_id(collection_name, doc["content"]) for doc in docs}))
+        except Exception as e:
+            print(f"⚠️ Failed to delete from ChromaDB: {str(e)}")
+
     def _save_chroma(self, docs, collection_name):
+        """
+        Bulk-upsert docs with their precomputed embeddings, so Chroma never runs
+        its own embedding function. IDs are derived from content, which makes
+        re-ingesting the same chunks idempotent.
+        """
         try:
-            collection = self.chroma_client.get_or_create_collection(name=collection_name)
-            for i, doc in enumerate(docs):
-                collection.add(
-                    documents=[doc["content"]],
-                    metadatas=[{"source": doc.get("source", "unknown")}],
-                    ids=[f"{collection_name}_{i}"]
+            collection = self._chroma_collection(collection_name)
+
+            ids, embeddings, documents, metadatas = [], [], [], []
+            seen_ids = set()
+            for doc in docs:
+                if doc.get("embedding") is None:
+                    continue
+                doc_id = self._chroma_id(collection_name, doc["content"])
+                if doc_id in seen_ids:
+                    continue
+                seen_ids.add(doc_id)
+                ids.append(doc_id)
+                embeddings.append(np.asarray(doc["embedding"], dtype=np.float32).tolist())
+                documents.append(doc["content"])
+                metadatas.append({"source": doc.get("source", "unknown")})
+
+            get_max_batch_size = getattr(self.chroma_client, "get_max_batch_size", None)
+            batch_size = min(self.chroma_batch_size, get_max_batch_size() if get_max_batch_size else self.chroma_batch_size)
+            for start in range(0, len(ids), batch_size):
+                end = start + batch_size
+                collection.upsert(
+                    ids=ids[start:end],
+                    embeddings=embeddings[start:end],
+                    documents=documents[start:end],
+                    metadatas=metadatas[start:end]
                 )
+            print(f"✅ Upserted {len(ids)} documents into ChromaDB collection {collection_name}")
         except Exception as e:
             print(f"⚠️ Failed to save to ChromaDB: {str(e)}")
 
-    def handle(self, docs, doc_type="default"):
+    def _drop_known(self, hnsw_search, docs):
+        """
+        Split an incremental batch against an existing index: returns the docs
+        whose content is not indexed yet, and the labels of indexed docs from the
+        same files whose content no longer appears (the file changed). Both are
+        looked up by content hash / file name in the doc store, so the cost
+        follows the batch and the files it touches, not the corpus.
+        """
+        hashes = [self._content_hash(doc["content"]) for doc in docs]
+        filenames = {HNSWSearch.doc_filename(doc) for doc in docs}
+
+        live_hashes = hnsw_search.live_hashes(hashes)
+        incoming_hashes = set(hashes)
+        stale_labels = [label for label, h in hnsw_search.file_hashes(filenames) if h not in incoming_hashes]
+
+        new_docs = [doc for doc, h in zip(docs, hashes) if h not in live_hashes]
+        return new_docs, stale_labels
+
+    def _drop_indexed_duplicates(self, hnsw_search, docs):
+        """Drop new docs that are near-duplicates of docs already in the index (one batched knn query)."""
+        if not docs or hnsw_search.live_count == 0:
+            return docs
+        similarities = hnsw_search.nearest_similarities([doc["embedding"] for doc in docs])
+        kept = [doc for doc, similarity in zip(docs, similarities) if similarity <= self.sim_threshold]
+        if len(kept) < len(docs):
+            print(f"✅ Skipped {len(docs) - len(kept)} documents already indexed as near-duplicates")
+        return kept
+
+    def _update_bm25(self, hnsw_search, file_id, added_docs, stale_docs, existing):
+        """Apply the same adds/deletes to the file's lexical index (rebuilt on a fresh index)."""
+        bm25 = BM25Index(file_id)
+        if existing and not bm25.load():
+            # No lexical index yet for an existing vector index: backfill it once from the live chunks
+            bm25.add_documents(doc for _, doc in hnsw_search.iter_documents())
+            stale_docs = []
+        bm25.delete_documents(stale_docs)
+        bm25.add_documents(added_docs)
+        bm25.save()
+
+    def handle(self, docs, doc_type="default", incremental=True):
+        """
+        Embed docs and index them. With `incremental=True` an existing saved
+        index for the file is extended in place: only unseen chunks are
+        encoded and added, and chunks that disappeared from a re-ingested file
+        are soft-deleted, so the cost scales with the change, not the corpus.
+        Returns the docs added by this call.
+        """
         if not docs:
             return []
         try:
+            # Use file name (without extension) as ID
+            uploaded_file = st.session_state.get("current_file")
+            file_id = ConfigManager.get_index_id(uploaded_file)
+
             # 1. Embed
             embedded_docs = compute_embeddings(docs, doc_type=doc_type, use_cache=True)
             if not embedded_docs:
                 print("⚠️ No embeddings generated")
                 return []
+            collection_name = ConfigManager.get_chroma_collection_name(file_id, len(embedded_docs[0]["embedding"]))
+
+            hnsw_search = HNSWSearch()
+            existing = incremental and hnsw_search.load(file_id)
+            stale_docs = []
+            if existing:
+                embedded_docs, stale_labels = self._drop_known(hnsw_search, embedded_docs)
+                stale_docs = [doc for doc in hnsw_search.get_documents(stale_labels) if doc is not None]
+                hnsw_search.mark_deleted(stale_labels)
+                self._delete_colbert(file_id, stale_docs)
+                print(f"✅ Incremental update: {len(embedded_docs)} new, {len(stale_docs)} removed")
 
             # 2. ColBERT encode
-            colbert_encoded = self.colbert_agent.encode_documents(embedded_docs)
+            colbert_encoded = self.colbert_agent.encode_documents(embedded_docs) if embedded_docs else []
 
             # 3. Deduplication
             filtered = self._filter_duplicates(colbert_encoded)
+            if existing:
+                filtered = self._drop_indexed_duplicates(hnsw_search, filtered)
 
-            # 4. Build HNSW index (in-memory)
-            if filtered:
+            # 4. Move ColBERT token matrices into the float16 token store
+            filtered = ColBERTTokenStore(file_id).build(filtered, append=existing)
+
+            # 5. Build or extend the HNSW index
+            if not existing and filtered:
                 embedding_dim = len(filtered[0]['embedding']) if 'embedding' in filtered[0] else 768
-                self.hnsw_search = HNSWSearch(dim=embedding_dim, max_elements=max(10000, len(filtered) * 2))
-                if self.hnsw_search.add_documents(filtered):
-                    # Use file name (without extension) as ID
-                    uploaded_file = st.session_state.get("current_file")
-                    file_id = os.path.splitext(uploaded_file)[0] if uploaded_file else "default"
-                    self.hnsw_search.save(file_id)
-                    print("✅ HNSW index created and saved")
-
-            # 5. Save to FAISS/Chroma (optional)
-            uploaded_file = st.session_state.get("current_file")
-            file_id = os.path.splitext(uploaded_file)[0] if uploaded_file else "default"
-            self._save_faiss(filtered, file_id)
-            self._save_chroma(filtered, collection_name=f"chroma_{file_id}")
+                hnsw_search = HNSWSearch(dim=embedding_dim, max_elements=max(10000, len(filtered) * 2))
+            if filtered:
+                hnsw_search.add_documents(filtered)
+            if filtered or stale_docs:
+                hnsw_search.save(file_id)
+                print("✅ HNSW index created and saved")
+            self.hnsw_search = hnsw_search
+            if filtered or stale_docs or not existing:
+                self._update_bm25(hnsw_search, file_id, filtered, stale_docs, existing)
+
+            # 6. Save to FAISS/Chroma (optional)
+            if existing:
+                if filtered or stale_docs:
+                    self._update_faiss(hnsw_search, filtered, stale_docs, file_id)
+                self._delete_chroma(stale_docs, collection_name)
+            else:
+                self._save_faiss(filtered, file_id)
+            self._save_chroma(self._chroma_docs(filtered, file_id, collection_name, hnsw_search),
+                              collection_name=collection_name)
 
             print(f"✅ Enhanced embedding completed: {len(filtered)} documents with ColBERT + HNSW")
             return filtered
         except Exception as e:
             print(f"⚠️ EmbeddingAgent.handle failed: {str(e)}")
             return []
+
+    def remove_file(self, filename, file_id="default"):
+        """Soft-delete every chunk of `filename` from the file's indexes."""
+        try:
+            hnsw_search = HNSWSearch()
+            if not hnsw_search.load(file_id):
+                return 0
+            labels = [label for label, _ in hnsw_search.file_hashes([filename])]
+            removed = [doc for doc in hnsw_search.get_documents(labels) if doc is not None]
+            if not hnsw_search.mark_deleted(labels):
+                return 0
+            hnsw_search.save(file_id)
+            bm25 = BM25Index(file_id)
+            if bm25.load() and bm25.delete_file(filename):
+                bm25.save()
+
+            self._delete_colbert(file_id, removed)
+            self._update_faiss(hnsw_search, [], removed, file_id)
+            self._delete_chroma(removed, ConfigManager.get_chroma_collection_name(file_id, hnsw_search.dim))
+            return len(removed)
+        except Exception as e:
+            print(f"⚠️ Failed to remove {filename} from indexes: {str(e)}")
+            return 0
@@ -1,9 +1,9 @@
-import openai
 import json
 import os
 from datetime import datetime
 from agents.query_rewrite_agent import QueryRewriteAgent
-from config import OPENROUTER_API_KEY, OPENROUTER_BASE_URL, DEFAULT_MODEL, TEMPERATURE
+from core.llm_gateway import get_gateway
+from config import OPENROUTER_API_KEY, DEFAULT_MODEL
 
 
 class FeedbackLoopAgent:
@@ -11,15 +11,12 @@ class FeedbackLoopAgent:
         self.query_agent = query_agent or QueryRewriteAgent()
         try:
             if OPENROUTER_API_KEY:
-                self.client = openai.OpenAI(
-                    api_key=OPENROUTER_API_KEY,
-                    base_url=OPENROUTER_BASE_URL
-                )
+                self.gateway = get_gateway()
             else:
-                self.client = None
+                self.gateway = None
                 print("Warning: OpenAI client not initialized due to missing API key. Feedback loop functionality will be disabled.")
         except Exception as e:
-            self.client = None
+            self.gateway = None
             print(f"Warning: Failed to initialize OpenAI client: {str(e)}. Feedback loop functionality will be disabled.")
         self.feedback_csv_path = os.path.join(log_dir, "feedback.csv")
         self.label_jsonl_path = os.path.join(log_dir, "label_dataset.jsonl")
@@ -42,7 +39,7 @@ class FeedbackLoopAgent:
             f.write(json.dumps(entry) + "\n")
 
     def grade_with_llm(self, query, answer):
-        if not self.client:
+        if not self.gateway:
             print("⚠️ LLM grading skipped: OpenAI client not available")
             return 3  # fallback score
             
@@ -56,12 +53,7 @@ Answer: {answer}
 Score (just the number from 1-5):
 """
 
-        response = self.client.chat.completions.create(
-            model=DEFAULT_MODEL,
-            messages=[{"role": "user", "content": grading_prompt}],
-            temperature=0
-        )
-        score_text = response.choices[0].message.content.strip()
+        score_text = self.gateway.complete(grading_prompt, DEFAULT_MODEL, temperature=0).strip()
         try:
             score = int(score_text)
         except:
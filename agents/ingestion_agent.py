@@ -1,6 +1,11 @@
 from core.mcp import create_mcp_message
-from core.document_loader import load_or_parse
-from core.embeddings import compute_embeddings, save_faiss_index
+from core.document_loader import get_file_hash, iter_parse
+from core.embeddings import (
+    EMBEDDING_MODEL_NAME, FaissIndexBuilder, faiss_index_paths, iter_embed, load_faiss_params
+)
+from core.bm25_index import BM25Index
+from core.streaming import prefetch
+from core.config_manager import ConfigManager
 import streamlit as st
 import os
 
@@ -9,23 +14,45 @@ class IngestionAgent:
     def __init__(self):
         self.name = "IngestionAgent"
 
-    def handle(self, file_paths, doc_type="default"):
+    def handle(self, file_paths, doc_type="default", max_workers=None):
+        """
+        Ingestion pipeline: page batches flow parser -> embedder -> FAISS/BM25
+        builders through bounded queues of STREAM_QUEUE_SIZE batches, so the
+        stages overlap and a slow stage holds the others back instead of
+        letting batches pile up. Files and PDF page ranges are parsed in a
+        process pool; batches stay in input file / page order. The embedded
+        chunks are returned for the chat page, which retrieves over them.
+
+        Indexes built from the same file contents and embedding model (as
+        recorded in the FAISS params) are reused rather than rebuilt and
+        retuned; the chunks then come from the parse and embedding caches.
+        """
         file_id = st.session_state.get("current_file") or "default"
-        parsed_docs = []
+        queue_size = ConfigManager.STREAM_QUEUE_SIZE
+        faiss_path = ConfigManager.get_faiss_path(file_id)
+
+        batches = prefetch(iter_parse(file_paths, max_workers=max_workers), maxsize=queue_size)
+        embedded_batches = prefetch(iter_embed(batches, doc_type=file_id), maxsize=queue_size)
 
-        for filepath in file_paths:
-            ext = os.path.splitext(filepath)[-1]
-            doc_type = self.map_extension_to_doc_type(ext)
+        source = self._source_version(file_paths)
+        faiss_builder = FaissIndexBuilder(save_path=faiss_path, source=source)
+        bm25 = BM25Index(ConfigManager.get_index_id(st.session_state.get("current_file")))
+        reuse = self._indexes_current(faiss_path, bm25, source)
+        if reuse:
+            print(f"♻️ Indexes for {file_id} match its contents; reusing them")
 
-            parsed = load_or_parse(filepath)
-            if isinstance(parsed, list):
-                parsed_docs.extend(parsed)
-            else:
-                parsed_docs.append(parsed)
+        documents = []
+        try:
+            for batch in embedded_batches:
+                if not reuse:
+                    faiss_builder.add(batch)
+                    bm25.add_documents(batch)
+                documents.extend(batch)
+        except Exception as e:
+            print(f"⚠️ Ingestion pipeline failed: {str(e)}")
+            documents = []
 
-        # Filter out empty content
-        parsed_docs = [doc for doc in parsed_docs if doc.get("content", "").strip()]
-        if not parsed_docs:
+        if not documents:
             return create_mcp_message(
                 sender=self.name,
                 receiver="EmbeddingAgent",
@@ -33,27 +60,37 @@ class IngestionAgent:
                 payload={"status": "error", "message": "No valid content extracted from documents"}
             )
 
-        print(f"✅ Ingestion: Parsed {len(parsed_docs)} chunks")
-
-        docs_with_embeddings = compute_embeddings(parsed_docs, doc_type=file_id)
-
-        # ✅ Ensure `source` survives through embedding
-        for i, doc in enumerate(docs_with_embeddings):
-            if "source" not in doc:
-                doc["source"] = parsed_docs[i].get("source", f"{file_id} p.{i+1}")
-
-        print(f"✅ Ingestion: Embedded {len(docs_with_embeddings)} chunks")
-
-        if len(docs_with_embeddings) > 0:
-            save_faiss_index(docs_with_embeddings, save_path=f"vector_store/faiss_{file_id}.pkl")
+        print(f"✅ Ingestion: Embedded {len(documents)} chunks")
+        if not reuse:
+            # The FAISS params record the source, so they are written last
+            bm25.save()
+            faiss_builder.save()
 
         return create_mcp_message(
             sender=self.name,
             receiver="EmbeddingAgent",
             msg_type="INGESTION_RESULT",
-            payload={"status": "success", "documents": docs_with_embeddings}
+            payload={"status": "success", "documents": documents}
         )
 
+    @staticmethod
+    def _source_version(file_paths):
+        """Content hashes of the input files and the embedding model the indexes are built from."""
+        try:
+            return {"files": [get_file_hash(path) for path in file_paths], "model": EMBEDDING_MODEL_NAME}
+        except OSError:
+            return None
+
+    @staticmethod
+    def _indexes_current(faiss_path, bm25, source):
+        """True if the saved FAISS and BM25 indexes were built from `source`."""
+        if source is None or not os.path.exists(faiss_index_paths(faiss_path)[0]):
+            return False
+        if not os.path.exists(bm25.index_path):
+            return False
+        params = load_faiss_params(faiss_path)
+        return bool(params) and params.get("source") == source
+
     def map_extension_to_doc_type(self, ext):
         mapping = {
             ".pdf": "pdf",
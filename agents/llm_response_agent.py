@@ -1,24 +1,53 @@
-import openai
+import time
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from core.mcp import create_mcp_message
-from tenacity import retry, wait_exponential, stop_after_attempt
-from config import OPENROUTER_API_KEY, OPENROUTER_BASE_URL, AVAILABLE_MODELS, TEMPERATURE
+from core.answer_cache import AnswerCache
+from core.hedging import LatencyTracker
+from core.llm_gateway import get_gateway
+from core.context_packer import ContextPacker, estimate_tokens
+from core.utils import chunk_id
+from tenacity import retry, wait_exponential, stop_after_attempt, stop_after_delay
+from config import (
+    AVAILABLE_MODELS, TEMPERATURE, API_TIMEOUT, MAX_RETRIES,
+    HEDGE_REQUESTS, HEDGE_DELAY_MS, HEDGE_MIN_DELAY_MS, CONTEXT_TOKEN_BUDGET, MODEL_TOKEN_BUDGETS
+)
+
+RED_FLAGS = ["I'm not sure", "I cannot find", "no information", "not available", "hallucination"]
 
 
 class LLMResponseAgent:
     def __init__(self):
         self.name = "LLMResponseAgent"
         self.models = AVAILABLE_MODELS
-        self.client = openai.OpenAI(
-            api_key=OPENROUTER_API_KEY,
-            base_url=OPENROUTER_BASE_URL
+        # Characters held back while streaming before the answer is shown; a
+        # guardrail hit inside this window still falls back to the next model
+        self.guardrail_window = 160
+        self.answer_cache = AnswerCache()
+        self.hedging = HEDGE_REQUESTS
+        self.latency = LatencyTracker(
+            default_delay=HEDGE_DELAY_MS / 1000.0, min_delay=HEDGE_MIN_DELAY_MS / 1000.0, max_delay=API_TIMEOUT
         )
+        self.executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="llm-hedge")
+        self.gateway = get_gateway()
+        self.packer = ContextPacker()
+
+    def token_budget(self, model=None):
+        """
+        Prompt token budget for `model`. Without one, the smallest budget of
+        the configured models, so the prompt fits whichever of them gets it.
+        """
+        budgets = [MODEL_TOKEN_BUDGETS.get(m, CONTEXT_TOKEN_BUDGET) for m in ([model] if model else self.models) if m]
+        return min(budgets) if budgets else CONTEXT_TOKEN_BUDGET
 
-    def build_prompt(self, query, chunks, memory_context="", format_type="markdown", cot=True):
-        context = "\n\n".join([
-            f"### Source: {c.get('source', 'unknown')}\n{c['content']}" for c in chunks
-        ])
-        if memory_context:
-            context = f"📋 Relevant Chat History:\n{memory_context}\n\n{context}"
+    def build_prompt(self, query, chunks, memory_context="", format_type="markdown", cot=False, model=None,
+                     stats=None):
+        """
+        Prompt for `query` with the chunks packed into the model's token
+        budget (see ContextPacker). Pass a dict as `stats` to receive the
+        packing stats, including `tokens_saved`.
+        """
         instruction = "Answer the following question using the provided context below."
         if cot:
             instruction += " Think step by step and explain your reasoning clearly."
@@ -29,6 +58,13 @@ class LLMResponseAgent:
         elif format_type == "list":
             instruction += " Return the answer as a bullet-point list."
 
+        history = f"📋 Relevant Chat History:\n{memory_context}\n\n" if memory_context else ""
+        frame = f"{instruction}\n\n📚 Context:\n{history}\n\n❓ Question: {query}\n\n💡 Answer:"
+        context, pack_stats = self.packer.pack(chunks, max(0, self.token_budget(model) - estimate_tokens(frame)))
+        if stats is not None:
+            stats.update(pack_stats)
+        context = history + context
+
         return f"""{instruction}
 
 📚 Context:
@@ -38,18 +74,268 @@ class LLMResponseAgent:
 
 💡 Answer:"""
 
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=10))
+    @retry(
+        stop=(stop_after_attempt(MAX_RETRIES) | stop_after_delay(API_TIMEOUT)),
+        wait=wait_exponential(multiplier=1, min=2, max=10)
+    )
     def call_llm(self, prompt, model):
-        response = self.client.chat.completions.create(
-            model=model,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=TEMPERATURE
-        )
-        return response.choices[0].message.content
+        return self.gateway.complete(prompt, model, temperature=TEMPERATURE)
+
+    def stream_llm(self, prompt, model, cancel=None):
+        """Yield the completion's text deltas as they arrive; setting `cancel` ends the stream promptly."""
+        # Closing the generator early (e.g. a cancelled hedge) drops the HTTP stream too
+        yield from self.gateway.stream(prompt, model, temperature=TEMPERATURE, cancel=cancel)
 
     def guardrails_check(self, response: str) -> bool:
-        red_flags = ["I'm not sure", "I cannot find", "no information", "not available", "hallucination"]
-        return any(flag.lower() in response.lower() for flag in red_flags)
+        return any(flag.lower() in response.lower() for flag in RED_FLAGS)
+
+    def _stream_guarded(self, prompt, model, cancel=None):
+        """
+        Stream one model's answer. The first `guardrail_window` characters are
+        buffered and checked; a red flag or error there raises so the caller
+        can fall back. After that, deltas pass straight through and only the
+        new tail of the text is re-checked.
+        """
+        text = ""
+        released = False
+        tail = max(len(flag) for flag in RED_FLAGS)
+        for delta in self.stream_llm(prompt, model, cancel=cancel):
+            checked_from = max(0, len(text) - tail)
+            text += delta
+            if self.guardrails_check(text[checked_from:]):
+                if not released:
+                    raise ValueError("guardrail triggered")
+                print(f"⚠️ Guardrail flag in streamed answer from {model}")
+            if released:
+                yield delta
+            elif len(text) >= self.guardrail_window:
+                released = True
+                yield text
+        if not released:
+            if not text:
+                raise ValueError("empty response")
+            yield text
+
+    def _attempt(self, prompt, model, cancel, events):
+        """
+        One hedged attempt: stream `model` through the guardrail window and
+        forward its deltas as ("delta" | "done" | "error", model, value)
+        events, stopping as soon as `cancel` is set.
+        """
+        start = time.perf_counter()
+        first = True
+        # Passing `cancel` down lets a stalled stream give up its worker and gateway slot at once
+        stream = self._stream_guarded(prompt, model, cancel=cancel)
+        try:
+            for delta in stream:
+                if cancel.is_set():
+                    return
+                if first:
+                    self.latency.record(model, time.perf_counter() - start)
+                    first = False
+                events.put(("delta", model, delta))
+            events.put(("done", model, None))
+        except Exception as e:
+            events.put(("error", model, e))
+        finally:
+            stream.close()
+
+    def _hedged_stream(self, prompt_for, models=None, outcome=None):
+        """
+        Yield the answer of the first model whose stream clears the guardrail
+        window. The primary is asked first; the next model is also asked once
+        the primary runs past its p95 time-to-first-token, or right away when
+        an attempt fails. The winner's rivals are cancelled. No model
+        producing an accepted first token within API_TIMEOUT is an error, as
+        is a stall of API_TIMEOUT mid-answer.
+
+        `prompt_for(model)` gives each model's prompt (see `_prompts`).
+        `models` defaults to the configured fallback order. If an `outcome`
+        dict is given, the winning model is recorded under "model" and the
+        models that failed under "failed".
+        """
+        models = [model for model in (models or self.models) if model]
+        outcome = {} if outcome is None else outcome
+        outcome.update(model=None, failed=[])
+        if not models:
+            raise RuntimeError("no models configured")
+
+        events = queue.Queue()
+        cancels = {}
+        failed = set()
+        winner = None
+        deadline = time.monotonic() + API_TIMEOUT
+        next_hedge = None
+
+        def launch():
+            model = models[len(cancels)]
+            cancels[model] = threading.Event()
+            self.executor.submit(self._attempt, prompt_for(model), model, cancels[model], events)
+            return time.monotonic() + self.latency.hedge_delay(model)
+
+        def cancel_all(keep=None):
+            for model, cancel in cancels.items():
+                if model != keep:
+                    cancel.set()
+
+        next_hedge = launch()
+        try:
+            while True:
+                now = time.monotonic()
+                if winner is None:
+                    if now >= deadline:
+                        raise TimeoutError(f"no accepted response within {API_TIMEOUT}s")
+                    timeout = deadline - now
+                    if len(cancels) < len(models):
+                        timeout = min(timeout, max(0.0, next_hedge - now))
+                else:
+                    timeout = API_TIMEOUT
+
+                try:
+                    kind, model, value = events.get(timeout=timeout)
+                except queue.Empty:
+                    if winner is not None:
+                        raise TimeoutError(f"{winner} stalled mid-answer")
+                    if len(cancels) < len(models) and time.monotonic() >= next_hedge:
+                        print(f"⏱️ Hedging: also asking {models[len(cancels)]}")
+                        next_hedge = launch()
+                    continue
+
+                if winner is None:
+                    if kind == "delta":
+                        winner = outcome["model"] = model
+                        cancel_all(keep=winner)
+                        yield value
+                    elif kind == "error":
+                        print(f"⚠️ Model {model} failed: {str(value)}")
+                        failed.add(model)
+                        outcome["failed"].append(model)
+                        if len(cancels) < len(models):
+                            next_hedge = launch()
+                        elif len(failed) == len(cancels):
+                            raise RuntimeError("all models failed or tripped the guardrail")
+                elif model == winner:
+                    if kind == "delta":
+                        yield value
+                    elif kind == "done":
+                        return
+                    else:
+                        raise value
+        finally:
+            cancel_all()
+
+    def _prompts(self, payload, query, chunks, memory_context=""):
+        """
+        Per-model prompt builder: `prompt_for(model)` packs the chunks into
+        that model's own token budget, so a fallback with a larger context
+        window is not held to the primary's. Each prompt is built on first
+        use; the packing stats of the last one built are in the payload as
+        `context_stats` until `_answered` records the answering model's.
+        """
+        prompts = {}
+        stats = {}
+
+        def prompt_for(model):
+            if model not in prompts:
+                stats[model] = {}
+                prompts[model] = self.build_prompt(
+                    query, chunks, memory_context=memory_context, model=model, stats=stats[model]
+                )
+                payload["context_stats"] = packed = stats[model]
+                print(
+                    f"📦 Context packed for {model}: {packed['chunks']} chunks -> {packed['blocks']} blocks, "
+                    f"{packed['tokens_unpacked']} -> {packed['tokens']} tokens (saved {packed['tokens_saved']})"
+                )
+            return prompts[model]
+
+        prompt_for.stats = stats
+        return prompt_for
+
+    @staticmethod
+    def _answered(payload, prompt_for, model):
+        """Report the packing stats of the prompt the answering `model` got."""
+        if model in prompt_for.stats:
+            payload["context_stats"] = prompt_for.stats[model]
+
+    def _cache_key(self, payload, chunks):
+        """(doc_id, query, chunk ids) for the answer cache, or None if the caller gave no doc_id."""
+        doc_id = payload.get("doc_id")
+        if not doc_id:
+            return None
+        return doc_id, payload.get("original_query") or payload.get("query", ""), [chunk_id(c) for c in chunks]
+
+    def _cached_answer(self, cache_key):
+        if cache_key is None:
+            return None
+        cached = self.answer_cache.get(*cache_key)
+        if cached:
+            print(f"⚡ Answer cache {cached['match']} hit ({cached['similarity']:.3f}); {self.answer_cache.stats()}")
+            return cached["answer"]
+        return None
+
+    def _store_answer(self, cache_key, answer, chunks):
+        if cache_key is not None:
+            doc_id, query, chunk_ids = cache_key
+            self.answer_cache.put(doc_id, query, answer, chunk_ids, chunks)
+
+    def handle_stream(self, message):
+        """
+        Streaming counterpart of `handle`: a generator of answer text for
+        `st.write_stream`. Models are tried in fallback order until one
+        produces an answer that clears the guardrail window.
+        """
+        payload = message.get("payload", {})
+        query = payload.get("query", "")
+        chunks = payload.get("retrieved_context", [])
+        if not query:
+            yield "⚠️ No query provided."
+            return
+
+        cache_key = self._cache_key(payload, chunks)
+        cached = self._cached_answer(cache_key)
+        if cached:
+            yield cached
+            return
+
+        prompt_for = self._prompts(payload, query, chunks)
+        if self.hedging:
+            answer = ""
+            outcome = {}
+            try:
+                for delta in self._hedged_stream(prompt_for, outcome=outcome):
+                    answer += delta
+                    yield delta
+                self._answered(payload, prompt_for, outcome["model"])
+                self._store_answer(cache_key, answer, chunks)
+            except Exception as e:
+                print(f"⚠️ Hedged streaming failed: {str(e)}")
+                if answer:
+                    yield "\n\n⚠️ The response was interrupted."
+                else:
+                    yield "⚠️ Sorry, all LLMs failed or did not produce a confident response."
+            return
+
+        for model in self.models:
+            if not model:
+                continue
+            started = False
+            answer = ""
+            try:
+                for delta in self._stream_guarded(prompt_for(model), model):
+                    started = True
+                    answer += delta
+                    yield delta
+                self._answered(payload, prompt_for, model)
+                self._store_answer(cache_key, answer, chunks)
+                return
+            except Exception as e:
+                print(f"⚠️ Model {model} failed while streaming: {str(e)}")
+                if started:
+                    # Part of this answer is already on screen; don't splice another model's onto it
+                    yield "\n\n⚠️ The response was interrupted."
+                    return
+
+        yield "⚠️ Sorry, all LLMs failed or did not produce a confident response."
 
     def handle(self, message):
         try:
@@ -67,10 +353,36 @@ class LLMResponseAgent:
             if not query:
                 return "⚠️ No query provided."
 
+            cache_key = self._cache_key(payload, chunks)
+            cached = self._cached_answer(cache_key)
+            if cached:
+                return cached
+
             memory_context = ""
-            
-            # Build enriched prompt
-            prompt = self.build_prompt(query, chunks, memory_context=memory_context)
+
+            # Build the enriched prompt for each model as it is tried
+            prompt_for = self._prompts(payload, query, chunks, memory_context=memory_context)
+
+            if self.hedging:
+                # The full text is only checked once complete; a red flag past the
+                # guardrail window sends the question on to the models not yet tried
+                remaining = [model for model in self.models if model]
+                while remaining:
+                    outcome = {}
+                    try:
+                        response = "".join(self._hedged_stream(prompt_for, models=remaining, outcome=outcome))
+                        if response and not self.guardrails_check(response):
+                            self._answered(payload, prompt_for, outcome["model"])
+                            self._store_answer(cache_key, response, chunks)
+                            return response
+                        print(f"⚠️ Model {outcome['model']} tripped the guardrail")
+                    except Exception as e:
+                        print(f"⚠️ Hedged request failed: {str(e)}")
+                        if not outcome.get("model"):
+                            break
+                    tried = set(outcome.get("failed", [])) | {outcome.get("model")}
+                    remaining = [model for model in remaining if model not in tried]
+                return "⚠️ Sorry, all LLMs failed or did not produce a confident response."
 
             # Try models in fallback order
             for model in self.models:
@@ -78,8 +390,10 @@ class LLMResponseAgent:
                     continue
 
                 try:
-                    response = self.call_llm(prompt, model)
+                    response = self.call_llm(prompt_for(model), model)
                     if response and not self.guardrails_check(response):
+                        self._answered(payload, prompt_for, model)
+                        self._store_answer(cache_key, response, chunks)
                         return response
                 except Exception as e:
                     print(f"⚠️ Model {model} failed: {str(e)}")
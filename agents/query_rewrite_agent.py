@@ -4,22 +4,19 @@ and try to add more classifications in the
 program to get more different type of classifications
 """
 
-import openai
-from config import OPENROUTER_API_KEY, OPENROUTER_BASE_URL, DEFAULT_MODEL, TEMPERATURE
+from config import OPENROUTER_API_KEY, DEFAULT_MODEL, TEMPERATURE
+from core.llm_gateway import get_gateway
 
 class QueryRewriteAgent:
     def __init__(self):
         try:
             if OPENROUTER_API_KEY:
-                self.client = openai.OpenAI(
-                    api_key=OPENROUTER_API_KEY,
-                    base_url=OPENROUTER_BASE_URL
-                )
+                self.gateway = get_gateway()
             else:
-                self.client = None
+                self.gateway = None
                 print("Warning: OpenAI client not initialized due to missing API key. Query rewriting will be disabled.")
         except Exception as e:
-            self.client = None
+            self.gateway = None
             print(f"Warning: Failed to initialize OpenAI client: {str(e)}. Query rewriting will be disabled.")
         self.few_shot_examples = [
             {
@@ -66,7 +63,7 @@ class QueryRewriteAgent:
         return preferences
 
     def rewrite(self, query: str) -> str:
-        if not self.client:
+        if not self.gateway:
             print("⚠️ Query rewriting skipped: OpenAI client not available")
             return query
             
@@ -98,12 +95,7 @@ Current Query: {query}
 Rewritten:
 """
 
-            response = self.client.chat.completions.create(
-                model=DEFAULT_MODEL,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=TEMPERATURE
-            )
-            return response.choices[0].message.content
+            return self.gateway.complete(prompt, DEFAULT_MODEL, temperature=TEMPERATURE)
         except Exception as e:
             print(f"⚠️ Query rewriting failed: {str(e)}")
             return query
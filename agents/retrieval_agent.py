@@ -1,23 +1,30 @@
 from core.mcp import create_mcp_message
-from core.embeddings import compute_embeddings, load_faiss_index
+from core.embeddings import encode_query
 from core.config_manager import ConfigManager
-from core.hnswlib_search import HNSWSearch
+from core.index_registry import IndexRegistry
+from core.bm25_index import identifier_tokens, reciprocal_rank_fusion, tokenize
+from core.doc_store import content_hash
+from core.fanout import fan_out
 from agents.colbert_retrieval_agent import ColBERTRetrievalAgent
 from agents.reranker_agent import RerankerAgent
 import chromadb
 import numpy as np
-import hashlib
 import streamlit as st
 import traceback
 
 
 class RetrievalAgent:
-    def __init__(self):
+    def __init__(self, index_registry=None):
         self.name = "RetrievalAgent"
         self.reranker = RerankerAgent()
         self.chroma = chromadb.PersistentClient(path=ConfigManager.VECTOR_STORE_BASE + "/chroma")
-        self.hnsw_search = None
+        self.index_registry = index_registry or IndexRegistry()
+        if self.index_registry.chroma_client is None:
+            self.index_registry.chroma_client = self.chroma
         self.colbert_agent = ColBERTRetrievalAgent()
+        # Per-retriever deadlines in ms; unlisted retrievers use RETRIEVER_DEADLINE_MS
+        self.retriever_deadlines = {}
+        self._embedding_agent = None
 
     def handle_ingestion(self, message):
         from agents.embedding_agent import EmbeddingAgent
@@ -29,31 +36,57 @@ class RetrievalAgent:
             print("⚠️ RetrievalAgent: No documents received in payload.")
             return
 
-        embedding_agent = EmbeddingAgent()
-        embedding_agent.handle(documents, doc_type=doc_type)
+        # Built once: it holds a Chroma client and a ColBERT agent
+        if self._embedding_agent is None:
+            self._embedding_agent = EmbeddingAgent()
+        self._embedding_agent.handle(documents, doc_type=doc_type)
 
-    def _retrieve_faiss(self, query, doc_type="default", top_k=10):
+    def _retrieve_faiss(self, query, doc_type="default", top_k=10, file_id=None):
         try:
-            file_id = st.session_state.get("current_file") or "default"
-            path = ConfigManager.get_faiss_path(file_id)
-            index, docs = load_faiss_index(path)
+            file_id = file_id or st.session_state.get("current_file") or "default"
+            index, docs = self.index_registry.get_faiss(file_id)
 
             if index is None or not docs:
                 return []
 
-            query_embedding = compute_embeddings([{"content": query}])[0]["embedding"]
-            D, indices = index.search(np.array([query_embedding]).astype("float32"), top_k)
-            return [docs[i] for i in indices[0] if i < len(docs)]
+            query_embedding = encode_query(query)
+            if query_embedding is None:
+                return []
+            query = np.array([query_embedding]).astype("float32")
+            if not hasattr(docs, "get_many"):
+                D, indices = index.search(query, top_k)
+                return [docs[int(i)] for i in indices[0] if 0 <= i < len(docs)]
+
+            # Only the top-k rows are read from the doc store. Ids are doc store
+            # labels; an index that cannot remove ids (HNSW) still returns
+            # tombstoned rows, so search deeper until top_k live ones are found
+            k = top_k
+            while True:
+                D, indices = index.search(query, k)
+                hits = [int(i) for i in indices[0] if i >= 0]
+                results = [doc for doc in docs.get_many(hits, include_deleted=False) if doc is not None]
+                if len(results) >= top_k or len(hits) < k or k >= index.ntotal:
+                    return results[:top_k]
+                k = min(k * 2, index.ntotal)
         except Exception as e:
             print(f"⚠️ FAISS retrieval failed: {str(e)}")
             return []
 
-    def _retrieve_chroma(self, query, collection_name="chroma_default", top_k=10):
+    def _retrieve_chroma(self, query, collection_name="chroma_default", top_k=10, file_id=None):
         try:
-            file_id = st.session_state.get("current_file") or "default"
-            collection_name = ConfigManager.get_chroma_collection_name(file_id)
-            collection = self.chroma.get_or_create_collection(name=collection_name)
-            results = collection.query(query_texts=[query], n_results=top_k)
+            # Chroma collections are written under the extension-less index ID
+            file_id = ConfigManager.get_index_id(file_id or st.session_state.get("current_file"))
+
+            # Query with our own embedding so Chroma never runs its default embedder
+            query_embedding = encode_query(query)
+            if query_embedding is None:
+                return []
+            collection = self.index_registry.get_chroma(file_id, len(query_embedding))
+            if collection.count() == 0:
+                print(f"⚠️ ChromaDB collection {collection.name} is empty; re-ingest the file to populate it")
+                return []
+            query_embedding = query_embedding.tolist()
+            results = collection.query(query_embeddings=[query_embedding], n_results=top_k)
 
             if not results["documents"] or not results["documents"][0]:
                 return []
@@ -66,116 +99,172 @@ class RetrievalAgent:
 
     def _retrieve_hnsw(self, query, file_id, top_k=10):
         try:
-            if not self.hnsw_search:
-                self.hnsw_search = HNSWSearch()
-                if not self.hnsw_search.load(file_id):
-                    return []
-
-            query_embedding = compute_embeddings([{"content": query}])
-            if not query_embedding:
+            hnsw_search = self.index_registry.get_hnsw(ConfigManager.get_index_id(file_id))
+            if hnsw_search is None:
                 return []
 
-            embedding = query_embedding[0]
-            if isinstance(embedding, dict):
-                embedding = embedding.get("embedding")
-
+            embedding = encode_query(query)
             if embedding is None:
-                print("⚠️ HNSW: Invalid embedding structure")
                 return []
 
-            results = self.hnsw_search.search(embedding, top_k)
+            results = hnsw_search.search(embedding, top_k)
             print(f"✅ HNSW search returned {len(results)} results")
             return results
         except Exception as e:
             print(f"⚠️ HNSW search failed: {str(e)}")
             return []
 
-    def handle_query(self, query, docs=None, top_k=5, filter_doc_type=None):
+    def _retrieve_bm25(self, query, file_id, top_k=10):
         try:
-            print("🟢 handle_query: START")
+            bm25 = self.index_registry.get_bm25(ConfigManager.get_index_id(file_id))
+            if bm25 is None:
+                return []
+            results = bm25.search(query, top_k)
+            print(f"✅ BM25 search returned {len(results)} results")
+            return results
+        except Exception as e:
+            print(f"⚠️ BM25 search failed: {str(e)}")
+            return []
 
-            if docs is not None:
-                print(f"📄 Using provided docs (len={len(docs)})")
-                unique_chunks = docs
+    def _fan_out(self, query, tasks, report):
+        """
+        Run retrievers concurrently under their deadlines, merging the timing
+        report into `report`. Returns name -> results for those that finished.
+        """
+        # Encode once up front so concurrent dense retrievers share the cached vector
+        encode_query(query)
+        results, stage_report = fan_out(tasks, deadlines=self.retriever_deadlines)
+        report["timed_out"].extend(stage_report["timed_out"])
+        report["failed"].extend(stage_report["failed"])
+        report["latency_ms"].update(stage_report["latency_ms"])
+        return results
 
-            else:
-                file_id = st.session_state.get("current_file", "default")
-
-                print("🔎 Attempting HNSW retrieval")
-                hnsw_results = self._retrieve_hnsw(query, file_id, top_k * 2)
-                print(f"🔹 HNSW returned {len(hnsw_results)}")
-
-                if not hnsw_results:
-                    print("🔁 Falling back to FAISS + Chroma")
-                    faiss_results = self._retrieve_faiss(query, doc_type=filter_doc_type or "default", top_k=10)
-                    chroma_results = self._retrieve_chroma(query, collection_name=f"chroma_{filter_doc_type or 'default'}", top_k=10)
-                    combined = faiss_results + chroma_results
-                else:
-                    combined = hnsw_results
-
-                print(f"🧩 Combined results: {len(combined)}")
-
-                seen_hashes = set()
-                unique_chunks = []
-                for i, doc in enumerate(combined):
-                    if not isinstance(doc, dict):
-                        print(f"⚠️ Skipping non-dict chunk at index {i}: {type(doc)}")
-                        continue
-                    content = doc.get("content", "")
-                    if not content:
-                        continue
-                    content_hash = hashlib.md5(content.encode()).hexdigest()
-                    if content_hash not in seen_hashes:
-                        seen_hashes.add(content_hash)
-                        unique_chunks.append(doc)
-
-            print(f"✅ Unique chunks after dedup: {len(unique_chunks)}")
-
-            # Normalize dict to list (if any)
-            if isinstance(unique_chunks, dict):
-                unique_chunks = list(unique_chunks.values())
-
-            # Preview first chunk safely
-            if unique_chunks:
-                first_chunk = unique_chunks[0]
-                if isinstance(first_chunk, dict):
-                    print("🧠 First chunk preview:", first_chunk.get("content", "")[:200])
-                else:
-                    print("🧠 First chunk (non-dict):", str(first_chunk)[:200])
-            else:
-                print("⚠️ No unique chunks available to preview")
+    @staticmethod
+    def _keyword_hits(query, bm25_results):
+        """
+        True when the query hinges on identifiers (invoice numbers, SKUs, codes)
+        and the top lexical hit contains all of them as whole tokens; dense and
+        ColBERT stages add nothing for such exact-match lookups.
+        """
+        identifiers = identifier_tokens(query)
+        if not identifiers or not bm25_results:
+            return False
+        top_tokens = set(tokenize(bm25_results[0].get("content", "")))
+        return all(identifier in top_tokens for identifier in identifiers)
+
+    def retrieve(self, query, docs=None, top_k=5, filter_doc_type=None, file_id=None, report=None):
+        """
+        Candidate stage of `handle_query`: index lookups (or the provided
+        docs) narrowed by ColBERT to about 2 * top_k chunks, before reranking.
+        Returns (chunks, keyword); `keyword` means the chunks come from the
+        identifier shortcut (BM25 only, no dense or ColBERT stage). Either
+        way the chunks still go through `rerank`.
+        """
+        report = report if report is not None else {"timed_out": [], "failed": [], "latency_ms": {}}
+
+        if docs is not None:
+            print(f"📄 Using provided docs (len={len(docs)})")
+            unique_chunks = docs
+
+        else:
+            file_id = file_id or st.session_state.get("current_file", "default")
 
-            if unique_chunks and len(unique_chunks) > top_k:
-                colbert_results = self.colbert_agent.hybrid_retrieve(query, unique_chunks, top_k * 2)
-                unique_chunks = colbert_results
+            # All retrievers run at once; the keyword shortcut and the FAISS +
+            # Chroma fallback are decided on the collected results, so neither
+            # waits on a BM25 or HNSW round trip first.
+            # Worker threads have no Streamlit session, so pass everything in
+            results = self._fan_out(query, {
+                "bm25": lambda: self._retrieve_bm25(query, file_id, top_k * 2),
+                "hnsw": lambda: self._retrieve_hnsw(query, file_id, top_k * 2),
+                "faiss": lambda: self._retrieve_faiss(
+                    query, doc_type=filter_doc_type or "default", top_k=10, file_id=file_id),
+                "chroma": lambda: self._retrieve_chroma(
+                    query, collection_name=f"chroma_{filter_doc_type or 'default'}", top_k=10, file_id=file_id),
+            }, report)
 
-            if len(unique_chunks) > top_k:
-                reranked = self.reranker.rerank(query, unique_chunks, method="hybrid", top_k=top_k)
+            bm25_results = results.get("bm25", [])
+            if self._keyword_hits(query, bm25_results):
+                print("🔑 Keyword query matched by BM25; skipping dense and ColBERT stages")
+                return bm25_results, True
+
+            dense_results = [results.get("hnsw", [])]
+            print(f"🔹 HNSW returned {len(dense_results[0])}")
+            if not dense_results[0]:
+                print("🔁 Falling back to FAISS + Chroma")
+                dense_results = [results.get("faiss", []), results.get("chroma", [])]
+
+            # Reciprocal rank fusion of the dense and lexical rankings
+            combined = reciprocal_rank_fusion(dense_results + [bm25_results], top_k=top_k * 2)
+
+            print(f"🧩 Combined results: {len(combined)}")
+
+            seen_hashes = set()
+            unique_chunks = []
+            for i, doc in enumerate(combined):
+                if not isinstance(doc, dict):
+                    print(f"⚠️ Skipping non-dict chunk at index {i}: {type(doc)}")
+                    continue
+                content = doc.get("content", "")
+                if not content:
+                    continue
+                key = content_hash(content)
+                if key not in seen_hashes:
+                    seen_hashes.add(key)
+                    unique_chunks.append(doc)
+
+        print(f"✅ Unique chunks after dedup: {len(unique_chunks)}")
+
+        # Normalize dict to list (if any)
+        if isinstance(unique_chunks, dict):
+            unique_chunks = list(unique_chunks.values())
+
+        # Preview first chunk safely
+        if unique_chunks:
+            first_chunk = unique_chunks[0]
+            if isinstance(first_chunk, dict):
+                print("🧠 First chunk preview:", first_chunk.get("content", "")[:200])
             else:
-                reranked = unique_chunks[:top_k]
+                print("🧠 First chunk (non-dict):", str(first_chunk)[:200])
+        else:
+            print("⚠️ No unique chunks available to preview")
 
-            print(f"📦 Returning {len(reranked)} chunks to LLM")
+        if unique_chunks and len(unique_chunks) > top_k:
+            colbert_results = self.colbert_agent.hybrid_retrieve(query, unique_chunks, top_k * 2)
+            unique_chunks = colbert_results
+
+        return unique_chunks, False
 
-            return create_mcp_message(
-                sender=self.name,
-                receiver="LLMResponseAgent",
-                msg_type="RETRIEVAL_RESULT",
-                payload={
-                    "retrieved_context": reranked,
-                    "query": query
-                }
-            )
+    def rerank(self, query, chunks, top_k=5):
+        """Rerank stage of `handle_query`."""
+        if len(chunks) > top_k:
+            return self.reranker.rerank(query, chunks, method="hybrid", top_k=top_k)
+        return chunks[:top_k]
+
+    def result_message(self, query, chunks, report):
+        return create_mcp_message(
+            sender=self.name,
+            receiver="LLMResponseAgent",
+            msg_type="RETRIEVAL_RESULT",
+            payload={
+                "retrieved_context": chunks,
+                "query": query,
+                "retrieval_report": report
+            }
+        )
+
+    def handle_query(self, query, docs=None, top_k=5, filter_doc_type=None):
+        report = {"timed_out": [], "failed": [], "latency_ms": {}}
+        try:
+            print("🟢 handle_query: START")
+
+            chunks, _ = self.retrieve(query, docs=docs, top_k=top_k, filter_doc_type=filter_doc_type, report=report)
+            reranked = self.rerank(query, chunks, top_k=top_k)
+
+            print(f"📦 Returning {len(reranked)} chunks to LLM")
+            return self.result_message(query, reranked, report)
 
         except Exception as e:
             print(f"⚠️ RetrievalAgent.handle_query failed: {str(e)}")
             print("Full traceback:")
             traceback.print_exc()
-            return create_mcp_message(
-                sender=self.name,
-                receiver="LLMResponseAgent",
-                msg_type="RETRIEVAL_RESULT",
-                payload={
-                    "retrieved_context": [],
-                    "query": query
-                }
-            )
+            return self.result_message(query, [], report)
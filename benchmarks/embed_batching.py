@@ -0,0 +1,71 @@
+"""
+Microbenchmark: chunks/sec for the original single `encode` call versus the
+length-bucketed scheduler in `core.embeddings.encode_bucketed`.
+
+Usage:
+    python -m benchmarks.embed_batching --chunks 2000 --batch-size 32 --threads 4
+"""
+
+import argparse
+import random
+import time
+import numpy as np
+from core.embeddings import embedding_model, encode_bucketed
+
+WORDS = (
+    "revenue margin quarter forecast growth customer acquisition churn invoice "
+    "segment operating expense liability asset depreciation guidance outlook"
+).split()
+
+
+def synthetic_corpus(n, seed=0):
+    """Mix of short headers and long paragraphs, like splitter output on reports."""
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(n):
+        length = rng.choice([rng.randint(3, 12), rng.randint(40, 90)])
+        corpus.append(" ".join(rng.choice(WORDS) for _ in range(length)))
+    return corpus
+
+
+def bench(label, fn, texts):
+    start = time.perf_counter()
+    embeddings = fn(texts)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<12} {len(texts) / elapsed:8.1f} chunks/sec  ({elapsed:.2f}s)")
+    return embeddings
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--max-batch-tokens", type=int, default=8192)
+    parser.add_argument("--threads", type=int, default=0)
+    args = parser.parse_args()
+
+    if embedding_model is None:
+        print("⚠️ Embedding model not available")
+        return
+
+    texts = synthetic_corpus(args.chunks)
+    encode_bucketed(texts[:8], num_threads=args.threads)  # warm-up
+
+    before = bench(
+        "before",
+        lambda t: embedding_model.encode(t, normalize_embeddings=True, show_progress_bar=False),
+        texts
+    )
+    after = bench(
+        "bucketed",
+        lambda t: encode_bucketed(
+            t, batch_size=args.batch_size, max_batch_tokens=args.max_batch_tokens, num_threads=args.threads
+        ),
+        texts
+    )
+    drift = np.max(np.abs(np.asarray(before) - after))
+    print(f"max abs difference between outputs: {drift:.2e}")
+
+
+if __name__ == "__main__":
+    main()
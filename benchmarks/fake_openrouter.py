@@ -0,0 +1,193 @@
+"""
+Local stand-in for the OpenRouter chat completions API, for exercising the
+LLM agents (blocking and streaming) without network access or API keys.
+Answers are canned; latency, failures and guardrail-tripping answers are
+configurable per model. The server counts requests, TCP connections and
+peak concurrent requests, so it doubles as a target for offline load tests
+(see benchmarks/llm_gateway.py).
+
+Usage:
+    python -m benchmarks.fake_openrouter --port 8001 --ttft-ms 400 --token-ms 20
+    OPENROUTER_BASE_URL=http://127.0.0.1:8001/v1 streamlit run app.py
+"""
+
+import argparse
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_ANSWER = (
+    "Based on the provided context, revenue grew 12% year over year, driven mainly by "
+    "the enterprise segment. Operating margin improved to 18% as expenses grew more "
+    "slowly than revenue. The outlook section guides to similar growth next year."
+)
+FLAGGED_ANSWER = "I'm not sure, the context has no information about that."
+
+
+class FakeOpenRouter:
+    """
+    Behaviour of the fake server. `ttft_ms` delays the first token and
+    `token_ms` every token after it; models in `fail_models` return HTTP 500
+    and models in `flag_models` answer with a guardrail red flag. `requests`,
+    `connections` and `peak_concurrency` are updated as the server runs.
+    """
+
+    def __init__(self, answer=DEFAULT_ANSWER, ttft_ms=300, token_ms=15, fail_models=(), flag_models=()):
+        self.answer = answer
+        self.ttft_ms = ttft_ms
+        self.token_ms = token_ms
+        self.fail_models = set(fail_models)
+        self.flag_models = set(flag_models)
+        self.requests = 0
+        self.connections = 0
+        self.in_flight = 0
+        self.peak_concurrency = 0
+        self._lock = threading.Lock()
+
+    def count_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def count_connection(self):
+        with self._lock:
+            self.connections += 1
+
+    def begin(self):
+        with self._lock:
+            self.in_flight += 1
+            self.peak_concurrency = max(self.peak_concurrency, self.in_flight)
+
+    def end(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def stats(self):
+        with self._lock:
+            return {"requests": self.requests, "connections": self.connections,
+                    "peak_concurrency": self.peak_concurrency}
+
+    def answer_for(self, model):
+        return FLAGGED_ANSWER if model in self.flag_models else self.answer
+
+    def tokens(self, model):
+        words = self.answer_for(model).split(" ")
+        return [word if i == 0 else " " + word for i, word in enumerate(words)]
+
+
+def _make_handler(fake):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def setup(self):
+            super().setup()
+            fake.count_connection()
+
+        def _send_json(self, status, body):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _write_chunk(self, data):
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+        def do_POST(self):
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self._send_json(404, {"error": {"message": "not found"}})
+                return
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            fake.count_request()
+            fake.begin()
+            try:
+                self._complete(request)
+            except (BrokenPipeError, ConnectionResetError):
+                # The client closed the stream early (e.g. a cancelled hedged request)
+                self.close_connection = True
+            finally:
+                fake.end()
+
+        def _complete(self, request):
+            model = request.get("model", "fake-model")
+            completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+            created = int(time.time())
+
+            time.sleep(fake.ttft_ms / 1000.0)
+            if model in fake.fail_models:
+                self._send_json(500, {"error": {"message": f"{model} unavailable", "code": 500}})
+                return
+
+            if not request.get("stream"):
+                time.sleep(fake.token_ms * len(fake.tokens(model)) / 1000.0)
+                self._send_json(200, {
+                    "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": fake.answer_for(model)}}],
+                })
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for i, token in enumerate(fake.tokens(model)):
+                if i:
+                    time.sleep(fake.token_ms / 1000.0)
+                chunk = {
+                    "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                    "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}],
+                }
+                self._write_chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+            self._write_chunk(b"data: [DONE]\n\n")
+            self._write_chunk(b"")
+
+    return Handler
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # Load tests open many connections at once; the default backlog of 5 would drop them
+    request_queue_size = 256
+
+
+def start_server(fake=None, host="127.0.0.1", port=0):
+    """Serve `fake` on a background thread; returns (server, base_url)."""
+    fake = fake or FakeOpenRouter()
+    server = _Server((host, port), _make_handler(fake))
+    server.fake = fake
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--ttft-ms", type=int, default=300)
+    parser.add_argument("--token-ms", type=int, default=15)
+    parser.add_argument("--fail-models", default="", help="comma-separated models that return HTTP 500")
+    parser.add_argument("--flag-models", default="", help="comma-separated models that trip the guardrail")
+    args = parser.parse_args()
+
+    fake = FakeOpenRouter(
+        ttft_ms=args.ttft_ms, token_ms=args.token_ms,
+        fail_models=[m for m in args.fail_models.split(",") if m],
+        flag_models=[m for m in args.flag_models.split(",") if m],
+    )
+    server, base_url = start_server(fake, port=args.port)
+    print(f"Fake OpenRouter listening on {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        print(f"Served: {fake.stats()}")
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
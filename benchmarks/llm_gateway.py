@@ -0,0 +1,113 @@
+"""
+Offline load test of the LLM call path against the local fake OpenRouter
+server. Each simulated chat turn makes the two calls the pipeline makes (a
+query rewrite, then the answer), from many client threads at once, with a
+share of repeated questions. Compares:
+
+- per-call: a fresh OpenAI client per call (what per-call agent objects
+  amounted to): a new connection each time, no global limit, no coalescing
+- gateway: the shared LLMGateway (pooled keep-alive connections, global
+  concurrency / rate limit, coalescing of identical in-flight prompts)
+
+Usage:
+    python -m benchmarks.llm_gateway --turns 200 --clients 32 --repeat 0.3 --max-concurrency 16
+"""
+
+import argparse
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import openai
+from agents.query_rewrite_agent import QueryRewriteAgent
+from core.llm_gateway import LLMGateway
+from benchmarks.fake_openrouter import FakeOpenRouter, start_server
+
+QUESTIONS = [
+    "How did revenue develop?", "What drove the margin change?", "Summarize the outlook.",
+    "Which segment grew fastest?", "What are the main risks?", "How much cash was generated?",
+]
+
+
+def make_turns(count, repeat, seed=0):
+    rng = random.Random(seed)
+    turns = []
+    for i in range(count):
+        if turns and rng.random() < repeat:
+            turns.append(rng.choice(QUESTIONS))
+        else:
+            turns.append(f"{rng.choice(QUESTIONS)} (variant {i})")
+    return turns
+
+
+def run(turns, clients, complete):
+    rewriter = QueryRewriteAgent()
+    rewriter.gateway = type("Complete", (), {"complete": staticmethod(complete)})()
+
+    def turn(query):
+        start = time.perf_counter()
+        refined = rewriter.rewrite(query)
+        # The fake's rewrite is canned, so the original question keeps answer prompts distinct
+        complete(f"Context: ...\n\nQuestion: {query}\nRewritten: {refined}\n\nAnswer:", "good-model")
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        latencies = list(pool.map(turn, turns))
+    return time.perf_counter() - start, latencies
+
+
+def report(name, wall, latencies, fake, before):
+    served = {key: value - before[key] for key, value in fake.stats().items() if key != "peak_concurrency"}
+    print(
+        f"{name:9s}: {len(latencies) / wall:7.1f} turns/s | p50 {np.percentile(latencies, 50) * 1000:7.1f} ms "
+        f"p95 {np.percentile(latencies, 95) * 1000:7.1f} ms | server requests {served['requests']:4d}, "
+        f"connections {served['connections']:4d}, peak concurrency {fake.peak_concurrency}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--clients", type=int, default=32, help="concurrent simulated users")
+    parser.add_argument("--repeat", type=float, default=0.3, help="share of turns repeating an earlier question")
+    parser.add_argument("--ttft-ms", type=int, default=100)
+    parser.add_argument("--token-ms", type=int, default=1)
+    parser.add_argument("--max-concurrency", type=int, default=16)
+    parser.add_argument("--rate-limit-rpm", type=int, default=0)
+    args = parser.parse_args()
+
+    fake = FakeOpenRouter(ttft_ms=args.ttft_ms, token_ms=args.token_ms)
+    server, base_url = start_server(fake)
+    turns = make_turns(args.turns, args.repeat)
+
+    def per_call(prompt, model, temperature=0.4):
+        client = openai.OpenAI(api_key="fake", base_url=base_url, max_retries=0)
+        try:
+            response = client.chat.completions.create(
+                model=model, messages=[{"role": "user", "content": prompt}], temperature=temperature
+            )
+            return response.choices[0].message.content
+        finally:
+            client.close()
+
+    before = fake.stats()
+    wall, latencies = run(turns, args.clients, per_call)
+    report("per-call", wall, latencies, fake, before)
+
+    fake.peak_concurrency = 0
+    gateway = LLMGateway(
+        api_key="fake", base_url=base_url, max_concurrency=args.max_concurrency,
+        rate_per_minute=args.rate_limit_rpm
+    )
+    before = fake.stats()
+    wall, latencies = run(turns, args.clients, gateway.complete)
+    report("gateway", wall, latencies, fake, before)
+    print(f"gateway stats: {gateway.stats()}")
+
+    gateway.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
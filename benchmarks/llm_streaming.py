@@ -0,0 +1,70 @@
+"""
+Time-to-first-token for the blocking `LLMResponseAgent.handle` versus the
+streaming `handle_stream`, against the local fake OpenRouter server. The
+model list starts with a failing and a guardrail-tripping model, so the
+fallback path is exercised too.
+
+Usage:
+    python -m benchmarks.llm_streaming --ttft-ms 400 --token-ms 20 --runs 5
+"""
+
+import argparse
+import time
+from agents.llm_response_agent import LLMResponseAgent
+from core.llm_gateway import LLMGateway
+from benchmarks.fake_openrouter import FakeOpenRouter, start_server
+
+MESSAGE = {
+    "payload": {
+        "query": "How did revenue develop?",
+        "retrieved_context": [{"content": "Revenue grew 12% year over year.", "source": "report.pdf p. 3"}],
+    }
+}
+
+
+def timed_stream(chunks):
+    start = time.perf_counter()
+    first = None
+    text = ""
+    for chunk in chunks:
+        if first is None:
+            first = time.perf_counter() - start
+        text += chunk
+    return first, time.perf_counter() - start, text
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ttft-ms", type=int, default=300)
+    parser.add_argument("--token-ms", type=int, default=15)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--no-fallback", action="store_true", help="only query the healthy model")
+    args = parser.parse_args()
+
+    fake = FakeOpenRouter(
+        ttft_ms=args.ttft_ms, token_ms=args.token_ms, fail_models=["fail-model"], flag_models=["flag-model"]
+    )
+    server, base_url = start_server(fake)
+
+    agent = LLMResponseAgent()
+    agent.gateway = LLMGateway(api_key="fake", base_url=base_url)
+    agent.models = ["good-model"] if args.no_fallback else ["fail-model", "flag-model", "good-model"]
+    # Skip tenacity's retry backoff on the deliberately failing model
+    agent.call_llm = lambda prompt, model: LLMResponseAgent.call_llm.__wrapped__(agent, prompt, model)
+
+    for run in range(args.runs):
+        start = time.perf_counter()
+        agent.handle(MESSAGE)
+        blocking_first = time.perf_counter() - start  # the whole answer arrives at once
+        stream_first, stream_total, text = timed_stream(agent.handle_stream(MESSAGE))
+        print(
+            f"run {run + 1}: blocking ttft {blocking_first * 1000:7.1f} ms | "
+            f"streaming ttft {stream_first * 1000:7.1f} ms, total {stream_total * 1000:7.1f} ms"
+        )
+    print(f"last streamed answer: {text[:80]}...")
+    print(f"requests served: {fake.requests}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
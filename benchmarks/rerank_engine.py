@@ -0,0 +1,91 @@
+"""
+Microbenchmark: CrossEncoder pairs/sec for the float model, the dynamic int8
+model and the score cache, plus how closely the int8 ranking agrees with
+the float ranking (top-k overlap and Kendall tau per query).
+
+Usage:
+    python -m benchmarks.rerank_engine --queries 50 --chunks 20 --batch-size 32
+"""
+
+import argparse
+import random
+import time
+import numpy as np
+from scipy.stats import kendalltau
+from sentence_transformers import CrossEncoder
+from core.rerank_engine import CrossEncoderEngine, DEFAULT_RERANK_MODEL
+
+WORDS = (
+    "revenue margin quarter forecast growth customer acquisition churn invoice "
+    "segment operating expense liability asset depreciation guidance outlook"
+).split()
+
+QUESTIONS = [
+    "What was the operating margin this quarter?",
+    "How did customer churn change year over year?",
+    "What guidance was given for next year's revenue?",
+    "Which segment had the highest growth?",
+    "What are the main liabilities on the balance sheet?",
+]
+
+
+def workload(n_queries, n_chunks, seed=0):
+    """Distinct queries, each with its own candidate chunks of mixed length."""
+    rng = random.Random(seed)
+    queries = []
+    for i in range(n_queries):
+        chunks = [
+            {"content": " ".join(rng.choice(WORDS) for _ in range(rng.randint(20, 120)))}
+            for _ in range(n_chunks)
+        ]
+        queries.append((f"{rng.choice(QUESTIONS)} ({i})", chunks))
+    return queries
+
+
+def bench(label, engine, queries):
+    start = time.perf_counter()
+    scores = [engine.score(query, docs) for query, docs in queries]
+    elapsed = time.perf_counter() - start
+    pairs = sum(len(docs) for _, docs in queries)
+    print(f"{label:<10} {pairs / elapsed:9.1f} pairs/sec  ({elapsed:.2f}s)")
+    return scores
+
+
+def agreement(reference, candidate, top_k):
+    overlaps, taus = [], []
+    for ref, cand in zip(reference, candidate):
+        k = min(top_k, len(ref))
+        overlaps.append(len(set(np.argsort(-ref)[:k]) & set(np.argsort(-cand)[:k])) / k)
+        taus.append(kendalltau(ref, cand)[0])
+    return float(np.mean(overlaps)), float(np.nanmean(taus))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--chunks", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+
+    queries = workload(args.queries, args.chunks)
+
+    float_engine = CrossEncoderEngine(batch_size=args.batch_size, quantize=False)
+    int8_engine = CrossEncoderEngine(
+        batch_size=args.batch_size, quantize=True, model=CrossEncoder(DEFAULT_RERANK_MODEL, device="cpu")
+    )
+    warm_up = [(queries[0][0], "warm-up")]
+    float_engine.model.predict(warm_up)
+    int8_engine.model.predict(warm_up)
+
+    float_scores = bench("float32", float_engine, queries)
+    int8_scores = bench("int8", int8_engine, queries)
+    bench("cached", float_engine, queries)
+
+    overlap, tau = agreement(float_scores, int8_scores, args.top_k)
+    print(f"int8 vs float32: top-{args.top_k} overlap {overlap:.3f}, mean Kendall tau {tau:.3f}")
+    print(f"cache: {float_engine.cache_stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,28 @@
+import time
 import streamlit as st
 from viewer_component import show_pdf_preview
 from core.agent_manager import AgentManager
 from core.utils import safe_execute
+from core.config_manager import ConfigManager
+from core.document_loader import get_file_hash
 from utils.page_utils import extract_page_chunks
 
 agent_manager = AgentManager()
 agents = agent_manager.get_agents()
 
+def stream_bubble(deltas, refresh_s=0.05):
+    """Render streamed answer text inside the same ai-bubble as a finished answer, redrawn as it grows."""
+    placeholder = st.empty()
+    answer = ""
+    last_draw = 0.0
+    for delta in deltas:
+        answer += delta
+        if time.monotonic() - last_draw >= refresh_s:
+            placeholder.markdown(f"<div class='ai-bubble'>{answer}▌</div>", unsafe_allow_html=True)
+            last_draw = time.monotonic()
+    placeholder.markdown(f"<div class='ai-bubble'>{answer}</div>", unsafe_allow_html=True)
+    return answer
+
 def render_chat():
     file_name = st.session_state.get("current_file")
     embedded_docs = st.session_state.get("embedded_docs", [])
@@ -27,19 +43,46 @@ def render_chat():
 
     query = st.chat_input("Ask a question about the document...")
     if query:
-        refined = safe_execute(lambda: agents['query'].rewrite(query), fallback=query)
-        msg = agents['retrieval'].handle_query(refined, docs=embedded_docs)
-        answer = agents['llm'].handle(msg)
+        # Answers are cached per document version, so a changed file never serves stale answers
+        doc_id = safe_execute(
+            lambda: f"{ConfigManager.get_index_id(file_name)}:{get_file_hash(f'data/{file_name}')}",
+            fallback=None
+        )
+        # Before retrieval the context is unknown, so only an exact repeat may skip it; a miss
+        # here is counted by the context-aware lookup when the answer is generated
+        cached = agents['llm'].answer_cache.get(doc_id, query, count_miss=False) if doc_id else None
+
+        if cached:
+            # Repeat question: skip rewrite, retrieval, reranking and generation
+            chunks = cached["chunks"]
+        else:
+            if ConfigManager.SPECULATIVE_PIPELINE:
+                # Retrieval on the raw query overlaps the rewrite LLM call
+                msg = agents['pipeline'].run(query, docs=embedded_docs, file_id=file_name)
+            else:
+                refined = safe_execute(lambda: agents['query'].rewrite(query), fallback=query)
+                msg = agents['retrieval'].handle_query(refined, docs=embedded_docs)
+            msg["payload"].update({"doc_id": doc_id, "original_query": query})
+            chunks = msg["payload"]["retrieved_context"]
 
-        chunks = msg["payload"]["retrieved_context"]
         page_refs = extract_page_chunks(chunks)
 
         st.session_state.highlight_page = next(iter(page_refs.keys()), None)
         st.session_state.highlight_texts = list(page_refs.get(st.session_state.highlight_page, []))
 
-        # Display bubbles
+        # Display bubbles; the answer renders token by token as the model streams it
         st.markdown(f"<div class='user-bubble'>{query}</div>", unsafe_allow_html=True)
-        st.markdown(f"<div class='ai-bubble'>{answer}</div>", unsafe_allow_html=True)
+        if cached:
+            st.markdown(f"<div class='ai-bubble'>{cached['answer']}</div>", unsafe_allow_html=True)
+        else:
+            stream_bubble(agents['llm'].handle_stream(msg))
+            timings = msg["payload"].get("timings") or {}
+            captions = [f"{stage} {ms:.0f} ms" for stage, ms in timings.items()]
+            context_stats = msg["payload"].get("context_stats")
+            if context_stats:
+                captions.append(f"context {context_stats['tokens']} tokens (saved {context_stats['tokens_saved']})")
+            if captions:
+                st.caption(" · ".join(captions))
 
         # Show source page numbers
         if chunks:
@@ -26,6 +26,26 @@ API_TIMEOUT = int(os.getenv("API_TIMEOUT", "30"))
 MAX_RETRIES = int(os.getenv("MAX_RETRIES", "3"))
 TEMPERATURE = float(os.getenv("TEMPERATURE", "0.4"))
 
+# Hedged requests: the next model is also asked once the current one runs past
+# its p95 time-to-first-token (HEDGE_DELAY_MS until enough samples exist)
+HEDGE_REQUESTS = os.getenv("HEDGE_REQUESTS", "1").lower() in ("1", "true", "yes")
+HEDGE_DELAY_MS = int(os.getenv("HEDGE_DELAY_MS", "2000"))
+HEDGE_MIN_DELAY_MS = int(os.getenv("HEDGE_MIN_DELAY_MS", "250"))
+
+# Shared LLM gateway: pooled keep-alive connections plus a process-wide
+# concurrency limit and request rate limit (0 = unlimited)
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_RATE_LIMIT_RPM = int(os.getenv("LLM_RATE_LIMIT_RPM", "0"))
+
+# Prompt token budget per model, e.g. MODEL_TOKEN_BUDGETS="openrouter/openai/gpt-4=6000,openrouter/grok-1=3000";
+# models not listed get CONTEXT_TOKEN_BUDGET
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+MODEL_TOKEN_BUDGETS = {
+    model.strip(): int(tokens)
+    for model, tokens in (item.rsplit("=", 1) for item in os.getenv("MODEL_TOKEN_BUDGETS", "").split(",") if "=" in item)
+}
+
 # Validate required configuration (optional for development)
 if not OPENROUTER_API_KEY:
     print("Warning: OPENROUTER_API_KEY environment variable not set. LLM functionality will be limited.")
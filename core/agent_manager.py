@@ -3,6 +3,9 @@ from agents.retrieval_agent import RetrievalAgent
 from agents.llm_response_agent import LLMResponseAgent
 from agents.query_rewrite_agent import QueryRewriteAgent
 from agents.prompt_formatter_agent import PromptFormatterAgent
+from agents.feedback_loop_agent import FeedbackLoopAgent
+from core.index_registry import IndexRegistry
+from core.speculative_pipeline import SpeculativePipeline
 
 class AgentManager:
     _instance = None
@@ -15,11 +18,15 @@ class AgentManager:
 
     def __init__(self):
         if not self._initialized:
+            # One index registry per process, shared by every Streamlit session
+            self.index_registry = IndexRegistry()
             self.ingestion_agent = IngestionAgent()
-            self.retrieval_agent = RetrievalAgent()
+            self.retrieval_agent = RetrievalAgent(index_registry=self.index_registry)
             self.llm_agent = LLMResponseAgent()
             self.query_agent = QueryRewriteAgent()
             self.formatter_agent = PromptFormatterAgent()
+            self.feedback_agent = FeedbackLoopAgent(query_agent=self.query_agent)
+            self.pipeline = SpeculativePipeline(self.query_agent, self.retrieval_agent)
             self._initialized = True
 
     def get_agents(self):
@@ -28,5 +35,7 @@ class AgentManager:
             'retrieval': self.retrieval_agent,
             'llm': self.llm_agent,
             'query': self.query_agent,
-            'formatter': self.formatter_agent
+            'formatter': self.formatter_agent,
+            'feedback': self.feedback_agent,
+            'pipeline': self.pipeline
         }
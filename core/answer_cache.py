@@ -0,0 +1,169 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+import numpy as np
+from core.config_manager import ConfigManager
+from core.utils import normalize_query
+
+
+def context_fingerprint(chunk_ids):
+    """Order-insensitive fingerprint of the chunk ids an answer was generated from."""
+    return hashlib.sha1("\n".join(sorted(chunk_ids)).encode()).hexdigest()
+
+
+class AnswerCache:
+    """
+    Persistent cache of LLM answers in SQLite, keyed by document id, the
+    fingerprint of the retrieved chunk ids and the query. A lookup first
+    tries the exact (normalized) query, then, only when the retrieved
+    context is known, the stored query embeddings of the same
+    document/context, accepting the closest one above
+    `similarity_threshold`. Entries expire after `ttl` seconds and the least
+    recently used ones are evicted past `max_entries`. Hit/miss counters
+    are persisted so the hit rate survives restarts.
+    """
+
+    def __init__(self, path=None, ttl=None, max_entries=None, similarity_threshold=None, embed_fn=None):
+        self.path = path or os.path.join(ConfigManager.VECTOR_STORE_BASE, "answer_cache.sqlite")
+        self.ttl = ttl if ttl is not None else ConfigManager.ANSWER_CACHE_TTL
+        self.max_entries = max_entries or ConfigManager.ANSWER_CACHE_SIZE
+        self.similarity_threshold = similarity_threshold or ConfigManager.ANSWER_CACHE_SIMILARITY
+        self.embed_fn = embed_fn
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, doc_id TEXT, context_fp TEXT, query TEXT, "
+            "embedding BLOB, answer TEXT, chunks TEXT, created REAL, last_hit REAL, hits INTEGER DEFAULT 0)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS answers_doc ON answers (doc_id, context_fp)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS stats (key TEXT PRIMARY KEY, value INTEGER)")
+        self._conn.commit()
+
+    def _embed(self, query):
+        try:
+            if self.embed_fn is None:
+                # Imported on first use: it loads the embedding model
+                from core.embeddings import encode_query
+                self.embed_fn = encode_query
+            embedding = self.embed_fn(query)
+            return None if embedding is None else np.asarray(embedding, dtype=np.float32)
+        except Exception as e:
+            print(f"⚠️ Answer cache could not embed query: {str(e)}")
+            return None
+
+    def _count(self, key):
+        self._conn.execute(
+            "INSERT INTO stats (key, value) VALUES (?, 1) ON CONFLICT(key) DO UPDATE SET value = value + 1", (key,)
+        )
+
+    def get(self, doc_id, query, chunk_ids=None, count_miss=True):
+        """
+        Cached entry {answer, chunks, match, similarity} for `query` on
+        `doc_id`, or None. With `chunk_ids` only answers generated from the
+        same retrieved context match, exactly or semantically. Without them
+        (a lookup before retrieval) only the exact query matches, since a
+        similar question may need different context. Pass `count_miss=False`
+        for a lookup that is followed by another one for the same question,
+        so each question counts once in the stats.
+        """
+        query_norm = normalize_query(query).lower()
+        context_fp = context_fingerprint(chunk_ids) if chunk_ids is not None else None
+        where = "doc_id = ? AND created >= ?"
+        params = [doc_id, time.time() - self.ttl]
+        if context_fp is not None:
+            where += " AND context_fp = ?"
+            params.append(context_fp)
+
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, query, embedding, answer, chunks FROM answers WHERE {where} ORDER BY last_hit DESC",
+                params
+            ).fetchall()
+
+        match = None
+        for row in rows:
+            if row[1] == query_norm:
+                match = (row, "exact", 1.0)
+                break
+
+        if match is None and rows and context_fp is not None:
+            embedding = self._embed(query_norm)
+            candidates = [row for row in rows if row[2] is not None]
+            if embedding is not None and candidates:
+                matrix = np.stack([np.frombuffer(row[2], dtype=np.float32) for row in candidates])
+                similarities = matrix @ embedding
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.similarity_threshold:
+                    match = (candidates[best], "semantic", float(similarities[best]))
+
+        with self._lock:
+            if match is None:
+                if count_miss:
+                    self._count("misses")
+            else:
+                self._count(f"hits_{match[1]}")
+                self._conn.execute(
+                    "UPDATE answers SET last_hit = ?, hits = hits + 1 WHERE id = ?", (time.time(), match[0][0])
+                )
+            self._conn.commit()
+
+        if match is None:
+            return None
+        row, kind, similarity = match
+        return {"answer": row[3], "chunks": json.loads(row[4] or "[]"), "match": kind, "similarity": similarity}
+
+    def put(self, doc_id, query, answer, chunk_ids, chunks=None):
+        """Store an answer generated for `query` from the chunks with `chunk_ids`."""
+        query_norm = normalize_query(query).lower()
+        embedding = self._embed(query_norm)
+        now = time.time()
+        chunks_json = json.dumps(
+            [{"content": c.get("content", ""), "source": c.get("source", "")} for c in (chunks or [])]
+        )
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM answers WHERE doc_id = ? AND context_fp = ? AND query = ?",
+                (doc_id, context_fingerprint(chunk_ids), query_norm)
+            )
+            self._conn.execute(
+                "INSERT INTO answers (doc_id, context_fp, query, embedding, answer, chunks, created, last_hit) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (doc_id, context_fingerprint(chunk_ids), query_norm,
+                 embedding.tobytes() if embedding is not None else None, answer, chunks_json, now, now)
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now):
+        self._conn.execute("DELETE FROM answers WHERE created < ?", (now - self.ttl,))
+        self._conn.execute(
+            "DELETE FROM answers WHERE id IN (SELECT id FROM answers ORDER BY last_hit DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+
+    def invalidate(self, doc_id):
+        """Drop every cached answer for a document (e.g. after re-ingestion)."""
+        with self._lock:
+            self._conn.execute("DELETE FROM answers WHERE doc_id = ?", (doc_id,))
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT key, value FROM stats").fetchall())
+            entries = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+        hits = counts.get("hits_exact", 0) + counts.get("hits_semantic", 0)
+        lookups = hits + counts.get("misses", 0)
+        return {
+            "entries": entries,
+            "hits_exact": counts.get("hits_exact", 0),
+            "hits_semantic": counts.get("hits_semantic", 0),
+            "misses": counts.get("misses", 0),
+            "hit_rate": hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,314 @@
+import os
+import re
+import pickle
+from collections import Counter, defaultdict
+import numpy as np
+from core.config_manager import ConfigManager
+from core.doc_store import DocStore, content_hash, doc_filename
+
+# Compound tokens such as "inv-2023-001" or "a1.b2" are kept whole (and also split)
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-_./][a-z0-9]+)*")
+# Period tokens ("2023", "fy2023", "q4") read like IDs but are everyday words in reports
+_PERIOD_RE = re.compile(r"(?:fy|q[1-4]|h[12])?(?:19|20)?\d{2}|q[1-4]|h[12]")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have how i in is it of on or that the this to was what when "
+    "where which who why with".split()
+)
+
+
+def tokenize(text):
+    tokens = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        if token in _STOPWORDS:
+            continue
+        tokens.append(token)
+        if not token.isalnum():
+            tokens.extend(part for part in re.split(r"[-_./]", token) if part)
+    return tokens
+
+
+def _is_identifier(token):
+    digits = sum(c.isdigit() for c in token)
+    if not digits or _PERIOD_RE.fullmatch(token):
+        return False
+    if any(c.isalpha() for c in token):
+        # Mixed letters and digits: "inv-2023-001", "sku4471", "a1b2"
+        return len(token) >= 4
+    # Digits only: long numbers ("00481236") or separated codes ("2023-001"), not years or amounts
+    return digits >= 6 or (digits >= 5 and not token.isdigit())
+
+
+def identifier_tokens(query):
+    """Tokens that look like IDs (invoice numbers, SKUs, codes), as opposed to years, periods or amounts."""
+    return [token for token in _TOKEN_RE.findall(query.lower()) if _is_identifier(token)]
+
+
+def reciprocal_rank_fusion(result_lists, k=60, top_k=None):
+    """
+    Fuse ranked doc lists with RRF: score(d) = sum(1 / (k + rank)). Docs are
+    matched across lists by content; the first list's copy of a doc is kept.
+    """
+    scores = defaultdict(float)
+    docs = {}
+    for results in result_lists:
+        for rank, doc in enumerate(results, start=1):
+            key = content_hash(doc.get("content", ""))
+            scores[key] += 1.0 / (k + rank)
+            docs.setdefault(key, doc)
+
+    fused = []
+    for key in sorted(scores, key=scores.get, reverse=True)[:top_k]:
+        doc = dict(docs[key])
+        doc["rrf_score"] = scores[key]
+        fused.append(doc)
+    return fused
+
+
+class BM25Index:
+    """
+    Persistent BM25 inverted index over one file's chunks. Postings are numpy
+    (label, term frequency) arrays per term, so a query scores every document
+    with a few vectorized operations; chunk text lives in a `DocStore` and
+    only the top-k rows are read back. Supports incremental adds (known
+    content is skipped), soft deletes and compaction like `HNSWSearch`.
+    """
+
+    INDEX_FILE = "bm25_index.pkl"
+    DOCS_FILE = "bm25_docs.sqlite"
+
+    def __init__(self, file_id, k1=1.5, b=0.75, compaction_threshold=0.25):
+        self.file_id = file_id
+        self.index_dir = os.path.join(ConfigManager.VECTOR_STORE_BASE, file_id)
+        self.k1 = k1
+        self.b = b
+        self.compaction_threshold = compaction_threshold
+        self.postings = {}
+        self.doc_lengths = np.zeros(0, dtype=np.float32)
+        self.hashes = {}
+        self.deleted = set()
+        self.doc_store = None
+        self._unsaved = {}
+        self._rewrite_store = False
+        self._stats = None
+
+    @property
+    def index_path(self):
+        return os.path.join(self.index_dir, self.INDEX_FILE)
+
+    @property
+    def docs_path(self):
+        return os.path.join(self.index_dir, self.DOCS_FILE)
+
+    @property
+    def doc_count(self):
+        return len(self.doc_lengths)
+
+    @property
+    def live_count(self):
+        return self.doc_count - len(self.deleted)
+
+    def add_documents(self, docs):
+        """Index docs whose content is not in the index yet; returns how many were added."""
+        new_docs = []
+        for doc in docs:
+            content = doc.get("content", "")
+            key = content_hash(content)
+            if not content.strip() or key in self.hashes:
+                continue
+            self.hashes[key] = self.doc_count + len(new_docs)
+            new_docs.append(doc)
+        if not new_docs:
+            return 0
+
+        start = self.doc_count
+        term_rows = defaultdict(lambda: ([], []))
+        lengths = []
+        for offset, doc in enumerate(new_docs):
+            counts = Counter(tokenize(doc["content"]))
+            lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                labels, tfs = term_rows[term]
+                labels.append(start + offset)
+                tfs.append(tf)
+
+        # One concatenation per term per batch keeps incremental adds cheap
+        for term, (labels, tfs) in term_rows.items():
+            labels = np.array(labels, dtype=np.int32)
+            tfs = np.array(tfs, dtype=np.float32)
+            if term in self.postings:
+                old_labels, old_tfs = self.postings[term]
+                labels = np.concatenate([old_labels, labels])
+                tfs = np.concatenate([old_tfs, tfs])
+            self.postings[term] = (labels, tfs)
+
+        self.doc_lengths = np.concatenate([self.doc_lengths, np.array(lengths, dtype=np.float32)])
+        self._stats = None
+        for offset, doc in enumerate(new_docs):
+            self._unsaved[start + offset] = {k: v for k, v in doc.items() if k != "embedding"}
+        return len(new_docs)
+
+    def mark_deleted(self, labels):
+        labels = [int(label) for label in labels if label not in self.deleted and label < self.doc_count]
+        self.deleted.update(labels)
+        if labels:
+            self._stats = None
+        if self.doc_count and len(self.deleted) / self.doc_count > self.compaction_threshold:
+            self.compact()
+        return len(labels)
+
+    def delete_documents(self, docs):
+        """Soft-delete indexed docs with the same content as `docs`."""
+        hashes = {content_hash(doc.get("content", "")) for doc in docs}
+        return self.mark_deleted([self.hashes.pop(h) for h in hashes if h in self.hashes])
+
+    def delete_file(self, filename):
+        """
+        Soft-delete every chunk that was parsed from `filename`. Saved chunks
+        are found through the doc store's filename index; only unsaved ones
+        (or all of them, before the store is in sync) are scanned.
+        """
+        if self.doc_store is None or self._rewrite_store:
+            found = [(label, content_hash(doc.get("content", ""))) for label, doc in self.iter_documents()
+                     if doc_filename(doc) == filename]
+        else:
+            found = [(label, h) for label, h in self.doc_store.labels_for_files([filename])
+                     if label not in self._unsaved and label not in self.deleted]
+            found += [(label, content_hash(doc.get("content", ""))) for label, doc in self._unsaved.items()
+                      if label not in self.deleted and doc_filename(doc) == filename]
+        for _, h in found:
+            self.hashes.pop(h, None)
+        return self.mark_deleted([label for label, _ in found])
+
+    def get_documents(self, labels):
+        docs = [self._unsaved.get(int(label)) for label in labels]
+        missing = [i for i, doc in enumerate(docs) if doc is None]
+        if missing and self.doc_store is not None and not self._rewrite_store:
+            for i, doc in zip(missing, self.doc_store.get_many([labels[i] for i in missing])):
+                docs[i] = doc
+        return docs
+
+    def iter_documents(self):
+        """Yield (label, doc) for every live document."""
+        if self.doc_store is not None and not self._rewrite_store:
+            for label, doc in self.doc_store.iter_documents(include_deleted=True):
+                if label not in self.deleted and label not in self._unsaved:
+                    yield label, doc
+        for label in sorted(self._unsaved):
+            if label not in self.deleted:
+                yield label, self._unsaved[label]
+
+    def compact(self):
+        """Rebuild from live documents only, relabelling them 0..n-1."""
+        live_docs = [doc for _, doc in self.iter_documents()]
+        self.postings = {}
+        self.doc_lengths = np.zeros(0, dtype=np.float32)
+        self._stats = None
+        self.hashes = {}
+        self.deleted = set()
+        self._unsaved = {}
+        self.add_documents(live_docs)
+        self._rewrite_store = True
+        print(f"✅ Compacted BM25 index to {self.doc_count} documents")
+
+    def _live_stats(self):
+        """
+        Live-document mask and BM25 length normalisation. Soft-deleted chunks
+        keep their postings until compaction but are left out of the document
+        count, document frequencies and avgdl, so scores match a rebuilt index.
+        """
+        if self._stats is None:
+            live = np.ones(self.doc_count, dtype=bool)
+            if self.deleted:
+                live[list(self.deleted)] = False
+            avgdl = (float(self.doc_lengths[live].mean()) if live.any() else 0.0) or 1.0
+            self._stats = live, self.k1 * (1 - self.b + self.b * self.doc_lengths / avgdl)
+        return self._stats
+
+    def search(self, query, k=10):
+        """Top-k live documents by BM25 score, each with a `bm25_score`."""
+        terms = [term for term in set(tokenize(query)) if term in self.postings]
+        if not terms or self.live_count == 0:
+            return []
+
+        live, norm = self._live_stats()
+        n = self.live_count
+        scores = np.zeros(self.doc_count, dtype=np.float32)
+        for term in terms:
+            labels, tfs = self.postings[term]
+            df = int(np.count_nonzero(live[labels]))
+            if df == 0:
+                continue
+            idf = np.log(1 + (n - df + 0.5) / (df + 0.5))
+            scores[labels] += idf * tfs * (self.k1 + 1) / (tfs + norm[labels])
+        if self.deleted:
+            scores[~live] = 0.0
+
+        k = min(k, int(np.count_nonzero(scores)))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        results = []
+        for label, doc in zip(top, self.get_documents([int(label) for label in top])):
+            if doc is None:
+                continue
+            doc = dict(doc)
+            doc["bm25_score"] = float(scores[label])
+            results.append(doc)
+        return results
+
+    def save(self):
+        try:
+            os.makedirs(self.index_dir, exist_ok=True)
+            if self.doc_store is None:
+                self.doc_store = DocStore(self.docs_path)
+                self._rewrite_store = True
+
+            if self._rewrite_store:
+                self.doc_store.replace_all([self._unsaved.get(label, {"content": ""}) for label in range(self.doc_count)])
+            elif self._unsaved:
+                labels = sorted(self._unsaved)
+                self.doc_store.put_many(labels[0], [self._unsaved[label] for label in labels])
+            self._unsaved = {}
+            self._rewrite_store = False
+
+            payload = {
+                "postings": self.postings,
+                "doc_lengths": self.doc_lengths,
+                "hashes": self.hashes,
+                "deleted": sorted(self.deleted),
+                "k1": self.k1,
+                "b": self.b,
+            }
+            # Written last and swapped in atomically, so it versions the doc store too
+            with open(f"{self.index_path}.tmp", "wb") as f:
+                pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(f"{self.index_path}.tmp", self.index_path)
+            print(f"✅ Saved BM25 index for {self.file_id} ({self.live_count} documents)")
+            return True
+        except Exception as e:
+            print(f"⚠️ Failed to save BM25 index: {str(e)}")
+            return False
+
+    def load(self):
+        try:
+            if not (os.path.exists(self.index_path) and os.path.exists(self.docs_path)):
+                return False
+            with open(self.index_path, "rb") as f:
+                payload = pickle.load(f)
+            self.postings = payload["postings"]
+            self.doc_lengths = payload["doc_lengths"]
+            self._stats = None
+            self.hashes = payload["hashes"]
+            self.deleted = set(payload["deleted"])
+            self.k1 = payload.get("k1", self.k1)
+            self.b = payload.get("b", self.b)
+            self.doc_store = DocStore(self.docs_path)
+            if any(len(key) != 16 for key in self.hashes):
+                # Indexes saved before the shared `content_hash` keyed docs by md5
+                self.hashes = {content_hash(doc.get("content", "")): label for label, doc in self.iter_documents()}
+            return True
+        except Exception as e:
+            print(f"⚠️ Failed to load BM25 index: {str(e)}")
+            return False
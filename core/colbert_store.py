@@ -0,0 +1,235 @@
+import os
+import json
+import numpy as np
+from core.config_manager import ConfigManager
+
+
+class ColBERTTokenStore:
+    """
+    Contiguous float16 token matrix for all documents of one file, with an
+    (offset, length) row per document. Documents keep only a `colbert_id`
+    and the store's `colbert_store` key; token slices are read from a
+    memory-mapped file at query time. The matrix is a raw append-only file,
+    so incremental ingestion only writes the new documents' tokens.
+
+    Deleted documents keep their `colbert_id` but their row becomes (0, 0);
+    once more than `compaction_threshold` of the matrix is dead, the live
+    slices are copied into a new generation of the files (ids unchanged) and
+    the meta file, which names the current generation, is swapped to it. A
+    full rebuild also writes a new generation, so files that readers have
+    memory-mapped are never truncated or rewritten in place.
+    """
+
+    TOKENS_FILE = "colbert_tokens.f16"
+    OFFSETS_FILE = "colbert_offsets.npy"
+    META_FILE = "colbert_meta.json"
+
+    def __init__(self, file_id, compaction_threshold=0.25):
+        self.file_id = file_id
+        self.index_dir = os.path.join(ConfigManager.VECTOR_STORE_BASE, file_id)
+        self.compaction_threshold = compaction_threshold
+        self.tokens = None
+        self.offsets = None
+        self.loaded_mtime = None
+
+    def _read_meta(self):
+        try:
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def _file_name(name, generation):
+        if not generation:
+            return name
+        base, ext = os.path.splitext(name)
+        return f"{base}.{generation}{ext}"
+
+    def _generation_paths(self, generation):
+        return (os.path.join(self.index_dir, self._file_name(self.TOKENS_FILE, generation)),
+                os.path.join(self.index_dir, self._file_name(self.OFFSETS_FILE, generation)))
+
+    @property
+    def tokens_path(self):
+        return self._generation_paths(self._read_meta().get("generation", 0))[0]
+
+    @property
+    def offsets_path(self):
+        return self._generation_paths(self._read_meta().get("generation", 0))[1]
+
+    @property
+    def meta_path(self):
+        return os.path.join(self.index_dir, self.META_FILE)
+
+    def _write_meta(self, meta):
+        with open(f"{self.meta_path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(f"{self.meta_path}.tmp", self.meta_path)
+
+    @staticmethod
+    def _save_offsets(path, offsets):
+        with open(f"{path}.tmp", "wb") as f:
+            np.save(f, offsets)
+        os.replace(f"{path}.tmp", path)
+
+    def build(self, docs, append=False):
+        """
+        Move each doc's `colbert_tokens` into the store. Returns copies of the
+        docs with the token arrays replaced by `colbert_id`/`colbert_store`.
+        With `append=True` the tokens are added after the existing documents.
+        """
+        token_docs = [doc for doc in docs if doc.get('colbert_tokens') is not None]
+        if not token_docs:
+            return docs
+
+        try:
+            os.makedirs(self.index_dir, exist_ok=True)
+            dim = token_docs[0]['colbert_tokens'].shape[1]
+            lengths = np.array([len(doc['colbert_tokens']) for doc in token_docs], dtype=np.int64)
+
+            meta = self._read_meta()
+            generation = meta.get("generation", 0)
+            tokens_path, offsets_path = self._generation_paths(generation)
+            existing = np.zeros((0, 2), dtype=np.int64)
+            if append and meta and os.path.exists(offsets_path):
+                if meta["dim"] != dim:
+                    raise ValueError(f"token dim {dim} does not match stored dim {meta['dim']}")
+                existing = np.load(offsets_path)
+            retired = None
+            if not len(existing) and (meta or os.path.exists(tokens_path)):
+                # Rebuild into the next generation; readers may have the current files mapped
+                retired = generation
+                generation += 1
+                tokens_path, offsets_path = self._generation_paths(generation)
+            # Deleted rows have length 0, so new tokens go after the furthest live row end
+            base_offset = int((existing[:, 0] + existing[:, 1]).max()) if len(existing) else 0
+
+            offsets = np.zeros((len(token_docs), 2), dtype=np.int64)
+            offsets[:, 0] = base_offset + np.concatenate(([0], np.cumsum(lengths)[:-1]))
+            offsets[:, 1] = lengths
+
+            with open(tokens_path, "ab" if len(existing) else "wb") as f:
+                if len(existing):
+                    f.truncate(base_offset * dim * 2)
+                for doc in token_docs:
+                    f.write(np.ascontiguousarray(doc['colbert_tokens'], dtype=np.float16).tobytes())
+            self._save_offsets(offsets_path, np.vstack([existing, offsets]))
+            self._write_meta({"dim": int(dim), "dtype": "float16", "generation": generation})
+            if retired is not None:
+                self._retire(retired)
+
+            slim_docs = []
+            colbert_id = len(existing)
+            for doc in docs:
+                slim = {k: v for k, v in doc.items() if k != 'colbert_tokens'}
+                if doc.get('colbert_tokens') is not None:
+                    slim['colbert_id'] = colbert_id
+                    slim['colbert_store'] = self.file_id
+                    colbert_id += 1
+                slim_docs.append(slim)
+
+            print(f"✅ Saved ColBERT token store for {self.file_id} ({int(lengths.sum())} new tokens)")
+            return slim_docs
+        except Exception as e:
+            print(f"⚠️ Failed to build ColBERT token store: {str(e)}")
+            return docs
+
+    def delete(self, colbert_ids):
+        """Drop the tokens of deleted documents; compacts once the dead share passes the threshold."""
+        colbert_ids = [int(i) for i in colbert_ids if i is not None]
+        if not colbert_ids:
+            return 0
+        try:
+            meta = self._read_meta()
+            if not meta:
+                return 0
+            generation = meta.get("generation", 0)
+            tokens_path, offsets_path = self._generation_paths(generation)
+            offsets = np.load(offsets_path)
+            colbert_ids = sorted({i for i in colbert_ids if i < len(offsets) and offsets[i, 1]})
+            if not colbert_ids:
+                return 0
+            offsets[colbert_ids] = 0
+
+            total_rows = os.path.getsize(tokens_path) // (meta["dim"] * 2)
+            if total_rows and 1 - offsets[:, 1].sum() / total_rows > self.compaction_threshold:
+                self._compact(meta, offsets)
+            else:
+                self._save_offsets(offsets_path, offsets)
+                # Readers reload on a meta change
+                self._write_meta(meta)
+            return len(colbert_ids)
+        except Exception as e:
+            print(f"⚠️ Failed to delete from ColBERT token store: {str(e)}")
+            return 0
+
+    def _compact(self, meta, offsets):
+        """Copy the live token rows into the next generation of files and switch the meta file to it."""
+        dim = meta["dim"]
+        generation = meta.get("generation", 0)
+        old_tokens_path, _ = self._generation_paths(generation)
+        new_tokens_path, new_offsets_path = self._generation_paths(generation + 1)
+
+        total_rows = os.path.getsize(old_tokens_path) // (dim * 2)
+        source = np.memmap(old_tokens_path, dtype=np.float16, mode="r", shape=(total_rows, dim))
+        compacted = np.zeros_like(offsets)
+        position = 0
+        with open(new_tokens_path, "wb") as f:
+            for colbert_id, (start, length) in enumerate(offsets):
+                if length:
+                    f.write(np.ascontiguousarray(source[start:start + length]).tobytes())
+                    compacted[colbert_id] = (position, length)
+                    position += length
+        del source
+        self._save_offsets(new_offsets_path, compacted)
+        self._write_meta(dict(meta, generation=generation + 1))
+        self._retire(generation)
+        print(f"✅ Compacted ColBERT token store for {self.file_id}: {total_rows} -> {position} token rows")
+
+    def _retire(self, generation):
+        """Remove a replaced generation; open memory maps keep its data alive until they are closed."""
+        for path in self._generation_paths(generation):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def load(self):
+        try:
+            if not os.path.exists(self.meta_path):
+                return False
+            self.loaded_mtime = self._meta_version()
+            meta = self._read_meta()
+            tokens_path, offsets_path = self._generation_paths(meta.get("generation", 0))
+            if not (os.path.exists(tokens_path) and os.path.exists(offsets_path)):
+                return False
+            self.offsets = np.load(offsets_path)
+            dim = meta["dim"]
+            # Deleted rows have length 0, so the matrix extent is the furthest live row end
+            rows = int((self.offsets[:, 0] + self.offsets[:, 1]).max()) if len(self.offsets) else 0
+            if rows:
+                self.tokens = np.memmap(tokens_path, dtype=np.float16, mode="r", shape=(rows, dim))
+            else:
+                self.tokens = np.zeros((0, dim), dtype=np.float16)
+            return True
+        except Exception as e:
+            print(f"⚠️ Failed to load ColBERT token store: {str(e)}")
+            return False
+
+    def _meta_version(self):
+        # The meta file is always swapped in with os.replace, so its inode changes on every write
+        stat = os.stat(self.meta_path)
+        return stat.st_ino, stat.st_mtime_ns
+
+    def is_stale(self):
+        """True if the store changed on disk after it was loaded (the meta file is rewritten last)."""
+        try:
+            return self._meta_version() != self.loaded_mtime
+        except OSError:
+            return True
+
+    def get(self, colbert_id):
+        """Token matrix for one document, read from the memory map."""
+        start, length = self.offsets[colbert_id]
+        return self.tokens[start:start + length]
@@ -9,15 +9,61 @@ class ConfigManager:
     MEMORY_DB_PATH = "vector_store/memory"
     SESSION_FILE = "session_store.pkl"
 
+    # Ingestion tuning
+    INGESTION_WORKERS = int(os.getenv("INGESTION_WORKERS", str(os.cpu_count() or 1)))
+    PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "25"))
+    STREAM_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", "4"))
+
+    # Embedding encode scheduling
+    EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "32"))
+    EMBED_MAX_BATCH_TOKENS = int(os.getenv("EMBED_MAX_BATCH_TOKENS", "8192"))
+    EMBED_TORCH_THREADS = int(os.getenv("EMBED_TORCH_THREADS", "0"))
+
+    # Recall@10 the FAISS index builder tunes for, validated against exact search
+    FAISS_TARGET_RECALL = float(os.getenv("FAISS_TARGET_RECALL", "0.95"))
+
+    # Loaded index handles kept in memory across queries/sessions
+    INDEX_CACHE_BYTES = int(os.getenv("INDEX_CACHE_BYTES", str(2 * 1024 ** 3)))
+
+    # Query embeddings kept in the in-process LRU
+    QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+
+    # Concurrent retriever fan-out
+    RETRIEVER_WORKERS = int(os.getenv("RETRIEVER_WORKERS", "8"))
+    RETRIEVER_DEADLINE_MS = int(os.getenv("RETRIEVER_DEADLINE_MS", "2000"))
+
+    # CrossEncoder reranking
+    RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "32"))
+    RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", "50000"))
+    RERANK_INT8 = os.getenv("RERANK_INT8", "0").lower() in ("1", "true", "yes")
+
+    # Persistent answer cache (exact + near-duplicate queries)
+    ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", str(7 * 24 * 3600)))
+    ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "5000"))
+    ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))
+
+    # Overlap the query rewrite with retrieval on the raw query
+    SPECULATIVE_PIPELINE = os.getenv("SPECULATIVE_PIPELINE", "1").lower() in ("1", "true", "yes")
+
     @classmethod
     def get_faiss_path(cls, file_id):
         """Get FAISS index path for a file."""
         return os.path.join(cls.VECTOR_STORE_BASE, f"faiss_{file_id}.pkl")
 
     @classmethod
-    def get_chroma_collection_name(cls, file_id):
-        """Get ChromaDB collection name for a file."""
-        return f"chroma_{file_id}"
+    def get_index_id(cls, file_name):
+        """Storage ID for an uploaded file: its name without extension."""
+        return os.path.splitext(file_name)[0] if file_name else "default"
+
+    @classmethod
+    def get_chroma_collection_name(cls, file_id, dim=None):
+        """
+        Get ChromaDB collection name for a file. A collection's dimension is
+        fixed by its first vectors, so the embedding dimension is part of the
+        name; without `dim` this is the name older ingests used, whose
+        collections hold vectors from Chroma's default 384-d embedder.
+        """
+        return f"chroma_{file_id}" if dim is None else f"chroma_{file_id}_d{dim}"
 
     @classmethod
     def get_memory_collection_name(cls, file_id):
@@ -0,0 +1,166 @@
+import re
+
+SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+")
+
+
+def estimate_tokens(text):
+    """
+    Rough token count for budgeting. OpenRouter models use different
+    tokenizers, so a ~4 characters per token estimate stands in for all of them.
+    """
+    return (len(text) + 3) // 4 if text else 0
+
+
+def _normalize(sentence):
+    return " ".join(sentence.lower().split())
+
+
+def _sentences(text):
+    """Split into (sentence, separator) pairs; line breaks are kept so tables and lists survive."""
+    units = []
+    for line in text.split("\n"):
+        for sentence in SENTENCE_SPLIT.split(line):
+            if sentence.strip():
+                units.append([sentence.strip(), " "])
+        if units:
+            units[-1][1] = "\n"
+    return units
+
+
+def _join(units):
+    return "".join(sentence + separator for sentence, separator in units).strip()
+
+
+def _overlap_merge(first, second, min_overlap):
+    """`first` followed by `second` when the end of `first` overlaps the start of `second`, else None."""
+    if second in first:
+        return first
+    probe = second[:min_overlap]
+    if len(probe) < min_overlap:
+        return None
+    pos = first.find(probe)
+    while pos != -1:
+        if second.startswith(first[pos:]):
+            return first + second[len(first) - pos:]
+        pos = first.find(probe, pos + 1)
+    return None
+
+
+class ContextPacker:
+    """
+    Packs ranked chunks into as few prompt tokens as possible:
+
+    1. Chunks from the same source (page) whose text overlaps, as the
+       splitter's 100-character overlap makes neighbouring chunks do, are
+       merged into one block under the rank of the best chunk, so the shared
+       text and the extra source header are sent once.
+    2. Blocks are walked in rank order and sentences already seen in a
+       higher-ranked block are dropped.
+    3. Blocks are added until the token budget is spent; the block that
+       crosses it is cut at a sentence boundary if at least
+       `min_block_tokens` still fit.
+
+    `pack` returns the context text and a stats dict with the tokens the
+    unpacked context would have taken, the tokens used and saved, and how
+    many chunks were merged, sentences dropped and blocks cut or left out.
+    """
+
+    def __init__(self, min_overlap=20, min_sentence_chars=20, min_block_tokens=50):
+        self.min_overlap = min_overlap
+        self.min_sentence_chars = min_sentence_chars
+        self.min_block_tokens = min_block_tokens
+
+    @staticmethod
+    def header(source):
+        return f"### Source: {source}\n"
+
+    def merge(self, chunks):
+        """Merge overlapping chunks of the same source; blocks keep the order of their best chunk."""
+        blocks = []
+        for chunk in chunks:
+            content = (chunk.get("content") or "").strip()
+            if not content:
+                continue
+            block = {"source": chunk.get("source", "unknown"), "content": content, "chunks": 1}
+            position = len(blocks)
+            i = 0
+            while i < len(blocks):
+                other = blocks[i]
+                if other["source"] == block["source"]:
+                    text = (_overlap_merge(other["content"], block["content"], self.min_overlap)
+                            or _overlap_merge(block["content"], other["content"], self.min_overlap))
+                    if text is not None:
+                        block = {"source": block["source"], "content": text,
+                                 "chunks": other["chunks"] + block["chunks"]}
+                        del blocks[i]
+                        position = min(position, i)
+                        # The grown block may now bridge to blocks it did not overlap before
+                        i = 0
+                        continue
+                i += 1
+            blocks.insert(position, block)
+        return blocks
+
+    def pack(self, chunks, budget):
+        stats = {
+            "chunks": len(chunks),
+            "tokens_unpacked": sum(
+                estimate_tokens(self.header(c.get("source", "unknown")) + (c.get("content") or "")) for c in chunks
+            ),
+        }
+        blocks = self.merge(chunks)
+        stats["merged"] = sum(block["chunks"] - 1 for block in blocks)
+
+        seen = set()
+        dropped = 0
+        deduped = []
+        for block in blocks:
+            kept = []
+            for unit in _sentences(block["content"]):
+                key = _normalize(unit[0])
+                if len(key) >= self.min_sentence_chars:
+                    if key in seen:
+                        dropped += 1
+                        continue
+                    seen.add(key)
+                kept.append(unit)
+            if kept:
+                deduped.append((block["source"], kept))
+        stats["sentences_dropped"] = dropped
+
+        parts = []
+        used = 0
+        truncated = False
+        for source, units in deduped:
+            header = self.header(source)
+            cost = estimate_tokens(header + _join(units)) + 1
+            if used + cost <= budget:
+                parts.append(header + _join(units))
+                used += cost
+                continue
+            remaining = budget - used - estimate_tokens(header) - 1
+            if remaining >= self.min_block_tokens or not parts:
+                kept = []
+                for unit in units:
+                    if estimate_tokens(_join(kept + [unit])) > remaining:
+                        break
+                    kept.append(unit)
+                text = _join(kept)
+                if not text and not parts:
+                    # Not even one sentence of the best block fits: send its start
+                    text = _join(units)[:max(0, remaining) * 4]
+                if text:
+                    parts.append(header + text)
+                    truncated = True
+            break
+
+        context = "\n\n".join(parts)
+        stats.update({
+            "blocks": len(parts),
+            "blocks_dropped": len(deduped) - len(parts),
+            "truncated": truncated,
+            "budget": budget,
+            "tokens": estimate_tokens(context),
+        })
+        stats["tokens_saved"] = max(0, stats["tokens_unpacked"] - stats["tokens"])
+        return context, stats
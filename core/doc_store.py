@@ -0,0 +1,196 @@
+import os
+import json
+import sqlite3
+import hashlib
+import threading
+
+# Vector payloads live in the ANN indexes / token store, never in the doc store
+_VECTOR_KEYS = ("embedding", "colbert_tokens", "colbert_embedding")
+_COLUMNS = ("content", "source")
+# Stay under SQLite's default limit on bound parameters per statement
+_MAX_PARAMS = 500
+
+
+def _json_default(value):
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    return str(value)
+
+
+def content_hash(content):
+    """Short content fingerprint used to recognise chunks that are already indexed."""
+    return hashlib.sha256(content.encode()).hexdigest()[:16]
+
+
+def doc_filename(doc):
+    """Name of the file a chunk was parsed from."""
+    return doc.get('metadata', {}).get('filename') or (doc.get('source') or '').split(' p. ')[0]
+
+
+def _batches(values):
+    values = list(values)
+    for start in range(0, len(values), _MAX_PARAMS):
+        yield values[start:start + _MAX_PARAMS]
+
+
+class DocStore:
+    """
+    SQLite-backed document store keyed by integer label. Holds chunk text and
+    metadata separately from the vectors, so an index can map its top-k labels
+    back to documents by fetching just those rows. Behaves like a read-only
+    sequence (`len`, indexing) for callers that used to get a list of dicts.
+    Each row also records its content hash and file name (both indexed), so
+    incremental updates can find known and stale chunks without scanning.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS docs ("
+            "label INTEGER PRIMARY KEY, content TEXT, source TEXT, extra TEXT, deleted INTEGER DEFAULT 0)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._migrate()
+        self._conn.execute("CREATE INDEX IF NOT EXISTS docs_content_hash ON docs (content_hash)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS docs_filename ON docs (filename)")
+        self._conn.commit()
+
+    def _migrate(self):
+        """Add the content_hash/filename columns to stores written before they existed."""
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(docs)")}
+        if "content_hash" in columns and "filename" in columns:
+            return
+        for column in ("content_hash", "filename"):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE docs ADD COLUMN {column} TEXT")
+        rows = self._conn.execute("SELECT label, content, source, extra FROM docs").fetchall()
+        self._conn.executemany(
+            "UPDATE docs SET content_hash = ?, filename = ? WHERE label = ?",
+            [(content_hash(content or ""), doc_filename(self._from_row(content, source, extra)), label)
+             for label, content, source, extra in rows]
+        )
+
+    @staticmethod
+    def _to_row(label, doc):
+        extra = {k: v for k, v in doc.items() if k not in _COLUMNS and k not in _VECTOR_KEYS}
+        content = doc.get("content", "")
+        return (int(label), content, doc.get("source"), json.dumps(extra, default=_json_default),
+                content_hash(content), doc_filename(doc))
+
+    @staticmethod
+    def _from_row(content, source, extra):
+        doc = json.loads(extra) if extra else {}
+        doc["content"] = content
+        if source is not None:
+            doc["source"] = source
+        return doc
+
+    def put_many(self, start_label, docs):
+        rows = [self._to_row(start_label + i, doc) for i, doc in enumerate(docs)]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO docs (label, content, source, extra, content_hash, filename) "
+                "VALUES (?, ?, ?, ?, ?, ?)", rows
+            )
+            self._conn.commit()
+
+    def append(self, docs):
+        self.put_many(len(self), docs)
+
+    def replace_all(self, docs):
+        """Rewrite the store with `docs` labelled 0..n-1 (used after compaction)."""
+        with self._lock:
+            self._conn.execute("DELETE FROM docs")
+            self._conn.executemany(
+                "INSERT INTO docs (label, content, source, extra, content_hash, filename) VALUES (?, ?, ?, ?, ?, ?)",
+                [self._to_row(i, doc) for i, doc in enumerate(docs)]
+            )
+            self._conn.commit()
+
+    def get_many(self, labels, include_deleted=True):
+        """Documents for `labels`, in the same order; missing (or, optionally, deleted) labels give None."""
+        labels = [int(label) for label in labels]
+        if not labels:
+            return []
+        query = "SELECT label, content, source, extra FROM docs WHERE label IN ({})"
+        if not include_deleted:
+            query += " AND deleted = 0"
+        rows = []
+        with self._lock:
+            for batch in _batches(labels):
+                rows += self._conn.execute(query.format(",".join("?" * len(batch))), batch).fetchall()
+        by_label = {row[0]: self._from_row(*row[1:]) for row in rows}
+        return [by_label.get(label) for label in labels]
+
+    def labels_for_hashes(self, hashes):
+        """Live (label, content_hash) rows whose content hash is in `hashes`."""
+        rows = []
+        with self._lock:
+            for batch in _batches(set(hashes)):
+                rows += self._conn.execute(
+                    f"SELECT label, content_hash FROM docs WHERE deleted = 0 AND content_hash IN "
+                    f"({','.join('?' * len(batch))})", batch
+                ).fetchall()
+        return rows
+
+    def labels_for_files(self, filenames):
+        """Live (label, content_hash) rows parsed from any of `filenames`."""
+        rows = []
+        with self._lock:
+            for batch in _batches(set(filenames)):
+                rows += self._conn.execute(
+                    f"SELECT label, content_hash FROM docs WHERE deleted = 0 AND filename IN "
+                    f"({','.join('?' * len(batch))})", batch
+                ).fetchall()
+        return rows
+
+    def iter_documents(self, include_deleted=False):
+        """Yield (label, doc) pairs in label order."""
+        query = "SELECT label, content, source, extra FROM docs"
+        if not include_deleted:
+            query += " WHERE deleted = 0"
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY label").fetchall()
+        for row in rows:
+            yield row[0], self._from_row(*row[1:])
+
+    def set_deleted(self, labels):
+        with self._lock:
+            self._conn.executemany("UPDATE docs SET deleted = 1 WHERE label = ?", [(int(l),) for l in labels])
+            self._conn.commit()
+
+    def deleted_labels(self):
+        with self._lock:
+            return {row[0] for row in self._conn.execute("SELECT label FROM docs WHERE deleted = 1")}
+
+    def get_meta(self, key, default=None):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set_meta(self, key, value):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __len__(self):
+        with self._lock:
+            row = self._conn.execute("SELECT COALESCE(MAX(label) + 1, 0) FROM docs").fetchone()
+        return row[0]
+
+    def __getitem__(self, label):
+        doc = self.get_many([label])[0]
+        if doc is None:
+            raise IndexError(label)
+        return doc
+
+    def __iter__(self):
+        return (doc for _, doc in self.iter_documents(include_deleted=True))
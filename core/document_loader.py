@@ -1,9 +1,13 @@
 import os
+import json
 import pickle
 import hashlib
+import threading
+from collections import deque
 import pandas as pd
 import docx
 import pdfplumber
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pptx import Presentation
 from agents.chunking_agent import ChunkingAgent
 from core.config_manager import ConfigManager
@@ -11,9 +15,151 @@ from core.config_manager import ConfigManager
 ConfigManager.ensure_directories()
 
 
-def get_file_hash(filepath):
+try:
+    import xxhash
+
+    def _new_hasher():
+        return xxhash.xxh3_128()
+except ImportError:
+    def _new_hasher():
+        return hashlib.blake2b(digest_size=16)
+
+HASH_BLOCK_SIZE = 1 << 20
+HASH_MANIFEST_PATH = os.path.join(ConfigManager.CACHE_DIR, "hash_manifest.json")
+
+_manifest = None
+_manifest_dirty = False
+_manifest_lock = threading.Lock()
+
+
+def _load_manifest():
+    global _manifest
+    if _manifest is None:
+        try:
+            with open(HASH_MANIFEST_PATH, "r", encoding="utf-8") as f:
+                _manifest = json.load(f)
+        except (OSError, ValueError):
+            _manifest = {}
+    return _manifest
+
+
+def _save_manifest(manifest):
+    try:
+        tmp_path = f"{HASH_MANIFEST_PATH}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, HASH_MANIFEST_PATH)
+    except Exception as e:
+        print(f"⚠️ Hash manifest write failed: {str(e)}")
+
+
+def _flush_manifest():
+    """Write manifest entries deferred by `get_file_hash(..., save_manifest=False)`."""
+    global _manifest_dirty
+    with _manifest_lock:
+        if _manifest_dirty:
+            _save_manifest(_load_manifest())
+            _manifest_dirty = False
+
+
+def _hash_file_contents(filepath):
+    hasher = _new_hasher()
     with open(filepath, 'rb') as f:
-        return hashlib.md5(f.read()).hexdigest()
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def get_file_hash(filepath, save_manifest=True):
+    """
+    Content hash of a file. A manifest keyed by (path, size, mtime, inode)
+    lets unchanged files skip rehashing; otherwise the file is streamed
+    through the hasher in fixed-size blocks. With `save_manifest=False` a
+    new entry is only written by the next `_flush_manifest`, so a batch of
+    files rewrites the manifest once.
+    """
+    global _manifest_dirty
+    st = os.stat(filepath)
+    key = os.path.abspath(filepath)
+    stat_key = [st.st_size, st.st_mtime_ns, st.st_ino]
+
+    with _manifest_lock:
+        entry = _load_manifest().get(key)
+    if entry and entry[:3] == stat_key:
+        return entry[3]
+
+    file_hash = _hash_file_contents(filepath)
+    with _manifest_lock:
+        manifest = _load_manifest()
+        manifest[key] = stat_key + [file_hash]
+        if save_manifest:
+            _save_manifest(manifest)
+        else:
+            _manifest_dirty = True
+    return file_hash
+
+
+def _text_chunks(chunking_agent, text, base_name):
+    return [{"source": base_name, "content": chunk} for chunk in chunking_agent.chunk(text)]
+
+
+def _page_chunks(chunking_agent, page, page_no, base_name):
+    page_text = page.extract_text()
+    if not page_text:
+        return []
+    return [{
+        "source": f"{base_name} p. {page_no}",
+        "content": chunk,
+        "metadata": {"page": page_no, "filename": base_name}
+    } for chunk in chunking_agent.chunk(page_text)]
+
+
+def _parse_pdf_pages(path, start=0, end=None, chunking_agent=None):
+    """Parse pages [start, end) of a PDF into page-tagged chunks."""
+    chunking_agent = chunking_agent or ChunkingAgent()
+    base_name = os.path.basename(path)
+    parsed_chunks = []
+
+    with pdfplumber.open(path) as pdf:
+        for i, page in enumerate(pdf.pages[start:end], start=start):
+            parsed_chunks.extend(_page_chunks(chunking_agent, page, i + 1, base_name))
+    return parsed_chunks
+
+
+def _parse_file(path, chunking_agent=None):
+    """Parse a single file of any supported type into chunks."""
+    chunking_agent = chunking_agent or ChunkingAgent()
+    ext = os.path.splitext(path)[-1].lower()
+    base_name = os.path.basename(path)
+
+    if ext == ".pdf":
+        return _parse_pdf_pages(path, chunking_agent=chunking_agent)
+
+    elif ext == ".docx":
+        doc = docx.Document(path)
+        text = "\n".join([p.text for p in doc.paragraphs])
+        return _text_chunks(chunking_agent, text, base_name)
+
+    elif ext == ".pptx":
+        prs = Presentation(path)
+        text = ""
+        for slide in prs.slides:
+            for shape in slide.shapes:
+                if hasattr(shape, "text"):
+                    text += shape.text + "\n"
+        return _text_chunks(chunking_agent, text, base_name)
+
+    elif ext == ".csv":
+        df = pd.read_csv(path)
+        text = df.to_string(index=False)
+        return _text_chunks(chunking_agent, text, base_name)
+
+    elif ext in [".txt", ".md"]:
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+        return _text_chunks(chunking_agent, text, base_name)
+
+    return []
 
 
 def parse_documents(filepaths):
@@ -21,96 +167,250 @@ def parse_documents(filepaths):
     parsed_chunks = []
 
     for path in filepaths:
-        ext = os.path.splitext(path)[-1].lower()
-        base_name = os.path.basename(path)
+        parsed_chunks.extend(_parse_file(path, chunking_agent))
+    print(f"✅ Parsed {len(parsed_chunks)} chunks from {len(filepaths)} files")
+    return parsed_chunks
+
 
-        if ext == ".pdf":
+def _plan_parse_tasks(filepaths, pages_per_task):
+    """
+    Split files into (file_index, start_page, end_page) units of work.
+    Returns (tasks, failed): files whose page count cannot be read (e.g. a
+    corrupt PDF) get no tasks and are listed in `failed`.
+    """
+    tasks = []
+    failed = set()
+    for file_idx, path in enumerate(filepaths):
+        if os.path.splitext(path)[-1].lower() != ".pdf":
+            tasks.append((file_idx, None, None))
+            continue
+        try:
             with pdfplumber.open(path) as pdf:
-                for i, page in enumerate(pdf.pages):
-                    page_text = page.extract_text()
-                    if page_text:
-                        chunks = chunking_agent.chunk(page_text)
-                        for chunk in chunks:
-                            parsed_chunks.append({
-                                "source": f"{base_name} p. {i+1}",
-                                "content": chunk,
-                                "metadata": {"page": i+1, "filename": base_name}
-                            })
-
-        elif ext == ".docx":
-            doc = docx.Document(path)
-            text = "\n".join([p.text for p in doc.paragraphs])
-            chunks = chunking_agent.chunk(text)
-            for chunk in chunks:
-                parsed_chunks.append({
-                    "source": base_name,
-                    "content": chunk
-                })
-
-        elif ext == ".pptx":
-            prs = Presentation(path)
-            text = ""
-            for slide in prs.slides:
-                for shape in slide.shapes:
-                    if hasattr(shape, "text"):
-                        text += shape.text + "\n"
-            chunks = chunking_agent.chunk(text)
-            for chunk in chunks:
-                parsed_chunks.append({
-                    "source": base_name,
-                    "content": chunk
-                })
-
-        elif ext == ".csv":
-            df = pd.read_csv(path)
-            text = df.to_string(index=False)
-            chunks = chunking_agent.chunk(text)
-            for chunk in chunks:
-                parsed_chunks.append({
-                    "source": base_name,
-                    "content": chunk
-                })
-
-        elif ext in [".txt", ".md"]:
-            with open(path, "r", encoding="utf-8") as f:
-                text = f.read()
-            chunks = chunking_agent.chunk(text)
-            for chunk in chunks:
-                parsed_chunks.append({
-                    "source": base_name,
-                    "content": chunk
-                })
+                page_count = len(pdf.pages)
+        except Exception as e:
+            print(f"⚠️ Could not open {path}: {str(e)}")
+            failed.add(file_idx)
+            continue
+        for start in range(0, page_count, pages_per_task):
+            tasks.append((file_idx, start, min(start + pages_per_task, page_count)))
+    return tasks, failed
+
+
+def _run_parse_task(path, start, end):
+    if start is None:
+        return _parse_file(path)
+    return _parse_pdf_pages(path, start, end)
+
+
+def _parse_files_serial(filepaths):
+    chunking_agent = ChunkingAgent()
+    per_file = []
+    failed = set()
+    for file_idx, path in enumerate(filepaths):
+        try:
+            per_file.append(_parse_file(path, chunking_agent))
+        except Exception as e:
+            print(f"⚠️ Parsing failed for {path}: {str(e)}")
+            per_file.append([])
+            failed.add(file_idx)
+    return per_file, failed
+
+
+def _parse_files_parallel(filepaths, max_workers=None, pages_per_task=None):
+    """
+    Parse files in a process pool, fanning out across files and PDF page ranges.
+    Returns (per_file, failed): one chunk list per input file, in page order,
+    and the indices of files that are incomplete because a task failed. A
+    failed task is retried once in this process before its file is given up.
+    """
+    max_workers = max_workers or ConfigManager.INGESTION_WORKERS
+    pages_per_task = pages_per_task or ConfigManager.PDF_PAGES_PER_TASK
+
+    tasks, failed = _plan_parse_tasks(filepaths, pages_per_task)
+    if max_workers <= 1 or len(tasks) <= 1:
+        per_file, serial_failed = _parse_files_serial(filepaths)
+        return per_file, failed | serial_failed
+
+    results = {}
+    retries = []
+    with ProcessPoolExecutor(max_workers=min(max_workers, len(tasks))) as executor:
+        futures = {
+            executor.submit(_run_parse_task, filepaths[file_idx], start, end): (file_idx, start, end)
+            for file_idx, start, end in tasks
+        }
+        for future in as_completed(futures):
+            file_idx, start, end = futures[future]
+            try:
+                results[(file_idx, start or 0)] = future.result()
+            except Exception as e:
+                print(f"⚠️ Parse task failed for {filepaths[file_idx]} (page {(start or 0) + 1}): {str(e)}")
+                retries.append((file_idx, start, end))
+
+    for file_idx, start, end in retries:
+        try:
+            results[(file_idx, start or 0)] = _run_parse_task(filepaths[file_idx], start, end)
+        except Exception as e:
+            print(f"⚠️ Retry failed for {filepaths[file_idx]} (page {(start or 0) + 1}): {str(e)}")
+            failed.add(file_idx)
+
+    per_file = [[] for _ in filepaths]
+    for file_idx, start in sorted(results):
+        per_file[file_idx].extend(results[(file_idx, start)])
+    return per_file, failed
+
+
+def parse_documents_parallel(filepaths, max_workers=None, pages_per_task=None):
+    per_file, _ = _parse_files_parallel(filepaths, max_workers, pages_per_task)
+    parsed_chunks = [chunk for chunks in per_file for chunk in chunks]
     print(f"✅ Parsed {len(parsed_chunks)} chunks from {len(filepaths)} files")
     return parsed_chunks
 
 
+def _cache_path_for(filepath, save_manifest=True):
+    return os.path.join(ConfigManager.CACHE_DIR, f"{get_file_hash(filepath, save_manifest)}.pkl")
+
+
+def _read_cache(cache_path, filepath):
+    if os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'rb') as f:
+                cached_result = pickle.load(f)
+                print(f"✅ Loaded from cache: {os.path.basename(filepath)}")
+                return cached_result
+        except Exception as e:
+            print(f"⚠️ Cache read failed for {filepath}: {str(e)}")
+    return None
+
+
+def _write_cache(cache_path, filepath, parsed_chunks):
+    try:
+        with open(cache_path, 'wb') as f:
+            pickle.dump(parsed_chunks, f)
+    except Exception as e:
+        print(f"⚠️ Cache write failed for {filepath}: {str(e)}")
+
+
 def load_or_parse(filepath):
     try:
-        file_hash = get_file_hash(filepath)
-        cache_path = os.path.join(ConfigManager.CACHE_DIR, f"{file_hash}.pkl")
+        cache_path = _cache_path_for(filepath)
 
-        if os.path.exists(cache_path):
-            try:
-                with open(cache_path, 'rb') as f:
-                    cached_result = pickle.load(f)
-                    print(f"✅ Loaded from cache: {os.path.basename(filepath)}")
-                    return cached_result
-            except Exception as e:
-                print(f"⚠️ Cache read failed for {filepath}: {str(e)}")
+        cached_result = _read_cache(cache_path, filepath)
+        if cached_result is not None:
+            return cached_result
 
         parsed_chunks = parse_documents([filepath])
-        
+
         if not parsed_chunks:
             print(f"⚠️ No parsable content in: {filepath}")
             return [{"source": filepath, "content": ""}]
 
-        try:
-            with open(cache_path, 'wb') as f:
-                pickle.dump(parsed_chunks, f)
-        except Exception as e:
-            print(f"⚠️ Cache write failed for {filepath}: {str(e)}")
+        _write_cache(cache_path, filepath, parsed_chunks)
 
         return parsed_chunks
     except Exception as e:
         print(f"⚠️ Document loading failed for {filepath}: {str(e)}")
         return [{"source": filepath, "content": ""}]
+
+
+def iter_parse(filepaths, max_workers=None, pages_per_task=None, max_pending=None):
+    """
+    Streaming counterpart of `load_or_parse_many`: yields chunk batches (a
+    cached file, or the chunks of one parse task's page range) in input file
+    / page order as soon as each is ready, so the full chunk list never has
+    to be built before embedding starts. Cache misses are parsed in a process
+    pool with at most `max_pending` tasks submitted ahead of the consumer, so
+    finished batches cannot pile up while it is busy. A failed task is
+    retried once in this process. A file is written to the parse cache only
+    once every one of its tasks succeeded; the hash manifest is written once
+    for the whole batch.
+    """
+    max_workers = max_workers or ConfigManager.INGESTION_WORKERS
+    pages_per_task = pages_per_task or ConfigManager.PDF_PAGES_PER_TASK
+    max_pending = max_pending or max_workers + ConfigManager.STREAM_QUEUE_SIZE
+
+    files = []
+    misses = []
+    for filepath in filepaths:
+        try:
+            cache_path = _cache_path_for(filepath, save_manifest=False)
+            cached_result = _read_cache(cache_path, filepath)
+        except Exception as e:
+            print(f"⚠️ Document loading failed for {filepath}: {str(e)}")
+            cache_path, cached_result = None, [{"source": filepath, "content": ""}]
+        if cached_result is None:
+            misses.append(filepath)
+        files.append((filepath, cache_path, cached_result))
+    _flush_manifest()
+
+    tasks, failed = _plan_parse_tasks(misses, pages_per_task)
+    file_tasks = [[] for _ in misses]
+    for file_idx, start, end in tasks:
+        file_tasks[file_idx].append((start, end))
+
+    executor = None
+    if max_workers > 1 and len(tasks) > 1:
+        executor = ProcessPoolExecutor(max_workers=min(max_workers, len(tasks)))
+    pending = deque()
+    submitted = 0
+
+    def submit_ahead():
+        nonlocal submitted
+        while executor is not None and submitted < len(tasks) and len(pending) < max_pending:
+            file_idx, start, end = tasks[submitted]
+            pending.append(executor.submit(_run_parse_task, misses[file_idx], start, end))
+            submitted += 1
+
+    def run_task(path, start, end):
+        if executor is not None:
+            # Tasks are submitted and consumed in the same order
+            future = pending.popleft()
+            submit_ahead()
+            try:
+                return future.result()
+            except Exception as e:
+                print(f"⚠️ Parse task failed for {path} (page {(start or 0) + 1}): {str(e)}")
+        try:
+            return _run_parse_task(path, start, end)
+        except Exception as e:
+            print(f"⚠️ Parsing failed for {path} (page {(start or 0) + 1}): {str(e)}")
+            return None
+
+    try:
+        submit_ahead()
+        miss_idx = 0
+        for filepath, cache_path, cached_result in files:
+            if cached_result is not None:
+                yield cached_result
+                continue
+
+            parsed_chunks = []
+            incomplete = miss_idx in failed
+            for start, end in file_tasks[miss_idx]:
+                chunks = run_task(filepath, start, end)
+                if chunks is None:
+                    incomplete = True
+                elif chunks:
+                    parsed_chunks.extend(chunks)
+                    yield chunks
+            miss_idx += 1
+
+            print(f"✅ Parsed {len(parsed_chunks)} chunks from {os.path.basename(filepath)}")
+            if not parsed_chunks:
+                print(f"⚠️ No parsable content in: {filepath}")
+                yield [{"source": filepath, "content": ""}]
+            elif incomplete:
+                # Incomplete parse: use what we have, but parse again next time
+                print(f"⚠️ {filepath} was only partly parsed; not caching it")
+            else:
+                _write_cache(cache_path, filepath, parsed_chunks)
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def load_or_parse_many(filepaths, max_workers=None):
+    """
+    Cache-aware multi-file variant of `load_or_parse`. Cache misses are parsed
+    together in a process pool; results are returned in input file order.
+    """
+    return [chunk for batch in iter_parse(filepaths, max_workers=max_workers) for chunk in batch]
@@ -0,0 +1,155 @@
+import os
+import re
+import json
+import threading
+import numpy as np
+from core.config_manager import ConfigManager
+
+
+class EmbeddingStore:
+    """
+    Append-only embedding cache for a single model. Vectors are stored as
+    contiguous float32 rows in fixed-size shard files that are memory-mapped
+    for reads; an append-only key file maps content hashes to row numbers.
+    The store directory and its meta.json pin the model name and dimension,
+    so vectors from different models are never mixed.
+    """
+
+    SHARD_ROWS = 65536
+
+    def __init__(self, model_name, dim, base_dir=None):
+        self.model_name = model_name
+        self.dim = int(dim)
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+        base_dir = base_dir or os.path.join(ConfigManager.CACHE_DIR, "embeddings")
+        self.store_dir = os.path.join(base_dir, f"{slug}_{self.dim}")
+        os.makedirs(self.store_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._rows = {}
+        self._maps = {}
+        self._check_meta()
+        self._load_keys()
+
+    @property
+    def _keys_path(self):
+        return os.path.join(self.store_dir, "keys.txt")
+
+    def _shard_path(self, shard):
+        return os.path.join(self.store_dir, f"shard_{shard:05d}.f32")
+
+    def _check_meta(self):
+        meta_path = os.path.join(self.store_dir, "meta.json")
+        meta = {"model_name": self.model_name, "dim": self.dim, "dtype": "float32", "shard_rows": self.SHARD_ROWS}
+        if os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+            if stored != meta:
+                raise ValueError(f"Embedding store at {self.store_dir} was written for {stored}, not {meta}")
+        else:
+            with open(meta_path, "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+
+    def _load_keys(self):
+        keys = []
+        torn_key = False
+        if os.path.exists(self._keys_path):
+            with open(self._keys_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if not line.endswith("\n"):
+                        # A key line cut short by a crash; the next append would be glued onto it
+                        torn_key = True
+                    elif line.strip():
+                        keys.append(line.rstrip("\n"))
+
+        # Rows are written before keys; drop any rows whose key never landed.
+        stored_rows = 0
+        shard = 0
+        while os.path.exists(self._shard_path(shard)):
+            stored_rows += os.path.getsize(self._shard_path(shard)) // (self.dim * 4)
+            shard += 1
+        count = min(len(keys), stored_rows)
+        # Always cut the shards to exactly `count` rows: a partial trailing row
+        # would otherwise misalign every later append
+        self._truncate_rows(count)
+        if len(keys) > count or torn_key:
+            keys = keys[:count]
+            with open(self._keys_path, "w", encoding="utf-8") as f:
+                f.writelines(f"{key}\n" for key in keys)
+
+        self._rows = {key: row for row, key in enumerate(keys)}
+        self._count = count
+
+    def _truncate_rows(self, count):
+        shard = count // self.SHARD_ROWS
+        size = (count % self.SHARD_ROWS) * self.dim * 4
+        if os.path.exists(self._shard_path(shard)) and os.path.getsize(self._shard_path(shard)) != size:
+            with open(self._shard_path(shard), "r+b") as f:
+                f.truncate(size)
+        shard += 1
+        while os.path.exists(self._shard_path(shard)):
+            os.remove(self._shard_path(shard))
+            shard += 1
+
+    def _shard_map(self, shard):
+        rows = os.path.getsize(self._shard_path(shard)) // (self.dim * 4)
+        cached = self._maps.get(shard)
+        if cached is None or cached.shape[0] != rows:
+            cached = np.memmap(self._shard_path(shard), dtype=np.float32, mode="r", shape=(rows, self.dim))
+            self._maps[shard] = cached
+        return cached
+
+    def __len__(self):
+        return self._count
+
+    def get_many(self, keys):
+        """
+        Bulk lookup. Returns an (n, dim) float32 matrix and a boolean mask of
+        which keys were found; rows for missing keys are zero.
+        """
+        rows = np.fromiter((self._rows.get(key, -1) for key in keys), dtype=np.int64, count=len(keys))
+        found = rows >= 0
+        result = np.zeros((len(keys), self.dim), dtype=np.float32)
+        if not found.any():
+            return result, found
+
+        with self._lock:
+            shards = rows // self.SHARD_ROWS
+            for shard in np.unique(shards[found]):
+                selected = found & (shards == shard)
+                result[selected] = self._shard_map(int(shard))[rows[selected] % self.SHARD_ROWS]
+        return result, found
+
+    def put_many(self, keys, embeddings):
+        """Append embeddings for keys not already stored."""
+        embeddings = np.asarray(embeddings, dtype=np.float32).reshape(-1, self.dim)
+        with self._lock:
+            new_keys = []
+            new_rows = []
+            seen = set()
+            for key, embedding in zip(keys, embeddings):
+                if key in self._rows or key in seen:
+                    continue
+                seen.add(key)
+                new_keys.append(key)
+                new_rows.append(embedding)
+            if not new_keys:
+                return 0
+
+            data = np.vstack(new_rows)
+            written = 0
+            while written < len(data):
+                row = self._count + written
+                shard = row // self.SHARD_ROWS
+                take = min(len(data) - written, self.SHARD_ROWS - row % self.SHARD_ROWS)
+                with open(self._shard_path(shard), "ab") as f:
+                    f.write(data[written:written + take].tobytes())
+                written += take
+
+            with open(self._keys_path, "a", encoding="utf-8") as f:
+                f.writelines(f"{key}\n" for key in new_keys)
+
+            for offset, key in enumerate(new_keys):
+                self._rows[key] = self._count + offset
+            self._count += len(new_keys)
+            return len(new_keys)
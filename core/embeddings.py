@@ -1,33 +1,125 @@
 import os
+import json
+import threading
 import faiss
 import pickle
 import numpy as np
+from collections import OrderedDict
 from sentence_transformers import SentenceTransformer
 from core.config_manager import ConfigManager
+from core.doc_store import DocStore, content_hash
+from core.utils import normalize_query
 
 os.environ["SENTENCE_TRANSFORMERS_HOME"] = "./models"
 os.environ["TRANSFORMERS_NO_ONNX"] = "1"
 
+EMBEDDING_MODEL_NAME = None
+
 try:
-    embedding_model = SentenceTransformer("BAAI/bge-base-en-v1.5", device="cpu")
+    EMBEDDING_MODEL_NAME = "BAAI/bge-base-en-v1.5"
+    embedding_model = SentenceTransformer(EMBEDDING_MODEL_NAME, device="cpu")
     print("✅ Loaded BGE-base embedding model for enhanced semantic search")
 except Exception:
     try:
-        embedding_model = SentenceTransformer("intfloat/e5-base-v2", device="cpu")
+        EMBEDDING_MODEL_NAME = "intfloat/e5-base-v2"
+        embedding_model = SentenceTransformer(EMBEDDING_MODEL_NAME, device="cpu")
         print("✅ Loaded E5-base embedding model as fallback")
     except Exception:
         try:
-            embedding_model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2", device="cpu")
+            EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+            embedding_model = SentenceTransformer(EMBEDDING_MODEL_NAME, device="cpu")
             print("⚠️ Using original MiniLM model as final fallback")
         except Exception as e3:
             print(f"⚠️ Failed to load any embedding model: {str(e3)}")
+            EMBEDDING_MODEL_NAME = None
             embedding_model = None
 
 from core.model_manager import get_embedding_model
+from core.embedding_store import EmbeddingStore
+from core.faiss_tuning import (
+    FLAT_MAX_VECTORS, HNSW_MAX_VECTORS, apply_search_params, build_tuned_index,
+    choose_faiss_params, create_index, is_id_mapped, tune_search_params
+)
+
+_embedding_store = None
+
+
+def get_embedding_store():
+    """Lazily open the consolidated embedding cache for the loaded model."""
+    global _embedding_store
+    if _embedding_store is None and embedding_model is not None:
+        try:
+            _embedding_store = EmbeddingStore(
+                EMBEDDING_MODEL_NAME,
+                embedding_model.get_sentence_embedding_dimension()
+            )
+        except Exception as e:
+            print(f"⚠️ Embedding cache unavailable: {str(e)}")
+    return _embedding_store
 
 VECTOR_STORE_PATH = "vector_store/faiss_store.pkl"
 
 
+def _token_lengths(texts, model):
+    tokenizer = getattr(model, "tokenizer", None)
+    if tokenizer is not None:
+        try:
+            input_ids = tokenizer(
+                texts, truncation=True, max_length=model.max_seq_length
+            )["input_ids"]
+            return np.array([len(ids) for ids in input_ids])
+        except Exception:
+            pass
+    return np.array([len(text.split()) for text in texts])
+
+
+def _length_buckets(lengths, batch_size, max_batch_tokens):
+    """
+    Group indices, sorted by length, into batches holding at most `batch_size`
+    texts and at most `max_batch_tokens` padded tokens.
+    """
+    order = np.argsort(lengths, kind="stable")
+    batch = []
+    for idx in order:
+        padded_tokens = (len(batch) + 1) * max(int(lengths[idx]), 1)
+        if batch and (len(batch) >= batch_size or padded_tokens > max_batch_tokens):
+            yield batch
+            batch = []
+        batch.append(idx)
+    if batch:
+        yield batch
+
+
+def encode_bucketed(texts, model=None, batch_size=None, max_batch_tokens=None, num_threads=None):
+    """
+    Encode texts in length-sorted buckets so each batch pads to a similar
+    length, then return the normalized embeddings in the original order.
+    """
+    model = model or embedding_model
+    batch_size = batch_size or ConfigManager.EMBED_BATCH_SIZE
+    max_batch_tokens = max_batch_tokens or ConfigManager.EMBED_MAX_BATCH_TOKENS
+    num_threads = num_threads or ConfigManager.EMBED_TORCH_THREADS
+
+    if num_threads:
+        import torch
+        torch.set_num_threads(num_threads)
+
+    lengths = _token_lengths(texts, model)
+    embeddings = None
+    for batch in _length_buckets(lengths, batch_size, max_batch_tokens):
+        encoded = model.encode(
+            [texts[i] for i in batch],
+            batch_size=len(batch),
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+        if embeddings is None:
+            embeddings = np.empty((len(texts), encoded.shape[1]), dtype=np.float32)
+        embeddings[batch] = encoded
+    return embeddings
+
+
 def compute_embeddings(docs, doc_type=None, use_cache=True):
     if not embedding_model:
         print("⚠️ Embedding model not available")
@@ -41,30 +133,22 @@ def compute_embeddings(docs, doc_type=None, use_cache=True):
 
 
     try:
-        import hashlib
-
-        cache_dir = os.path.join(ConfigManager.CACHE_DIR, "embeddings")
-        os.makedirs(cache_dir, exist_ok=True)
+        contents = [doc['content'] for doc in filtered_docs]
+        content_hashes = [content_hash(content) for content in contents]
 
-        texts = []
-        cached_embeddings = {}
-
-        for i, doc in enumerate(filtered_docs):
-            content = doc['content']
-            content_hash = hashlib.sha256(content.encode()).hexdigest()[:16]
-            cache_file = os.path.join(cache_dir, f"{content_hash}.npy")
+        store = get_embedding_store() if use_cache else None
+        if store is not None:
+            embeddings_np, found = store.get_many(content_hashes)
+        else:
+            embeddings_np = None
+            found = np.zeros(len(filtered_docs), dtype=bool)
 
-            if use_cache and os.path.exists(cache_file):
-                try:
-                    cached_embeddings[i] = np.load(cache_file)
-                    print(f"✅ Using cached embedding for chunk {i}")
-                except Exception:
-                    texts.append((i, content))
-            else:
-                texts.append((i, content))
+        missing = np.flatnonzero(~found)
+        if len(found) - len(missing):
+            print(f"✅ Using cached embeddings for {len(found) - len(missing)}/{len(found)} chunks")
 
-        if texts:
-            indices, text_contents = zip(*texts)
+        if len(missing):
+            text_contents = [contents[i] for i in missing]
 
             model_name = getattr(embedding_model, 'model_name', '') or str(embedding_model)
             if "bge" in model_name.lower():
@@ -72,19 +156,17 @@ def compute_embeddings(docs, doc_type=None, use_cache=True):
             elif "e5" in model_name.lower():
                 text_contents = [f"passage: {text}" for text in text_contents]
 
-            embeddings = embedding_model.encode(text_contents, normalize_embeddings=True)
+            new_embeddings = encode_bucketed(text_contents)
 
-            if use_cache:
-                for idx, (orig_idx, orig_content) in enumerate(texts):
-                    content_hash = hashlib.sha256(orig_content.encode()).hexdigest()[:16]
-                    cache_file = os.path.join(cache_dir, f"{content_hash}.npy")
-                    try:
-                        np.save(cache_file, embeddings[idx])
-                    except Exception as e:
-                        print(f"⚠️ Failed to cache embedding: {str(e)}")
+            if store is not None:
+                try:
+                    store.put_many([content_hashes[i] for i in missing], new_embeddings)
+                except Exception as e:
+                    print(f"⚠️ Failed to cache embeddings: {str(e)}")
 
-            for idx, (orig_idx, _) in enumerate(texts):
-                cached_embeddings[orig_idx] = embeddings[idx]
+            if embeddings_np is None:
+                embeddings_np = np.zeros((len(filtered_docs), new_embeddings.shape[1]), dtype=np.float32)
+            embeddings_np[missing] = new_embeddings
 
         # Apply doc_type specific adjustments if provided
         if doc_type:
@@ -92,10 +174,7 @@ def compute_embeddings(docs, doc_type=None, use_cache=True):
                 doc['doc_type'] = doc_type
 
         for i, doc in enumerate(filtered_docs):
-            if i in cached_embeddings:
-                doc['embedding'] = cached_embeddings[i]
-            else:
-                print(f"⚠️ No embedding found for document {i}")
+            doc['embedding'] = embeddings_np[i]
 
         return filtered_docs
     except Exception as e:
@@ -103,41 +182,327 @@ def compute_embeddings(docs, doc_type=None, use_cache=True):
         return []
 
 
-def save_faiss_index(docs, save_path=None):
+# Retrieval instruction each model was trained with for queries (documents get none)
+QUERY_PREFIXES = {
+    "BAAI/bge-base-en-v1.5": "Represent this sentence for searching relevant passages: ",
+    "intfloat/e5-base-v2": "query: ",
+}
+
+_query_cache = OrderedDict()
+_query_cache_lock = threading.Lock()
+
+
+def encode_query(query):
+    """
+    Embed a search query with the model's query instruction prefix. Results
+    are kept in a bounded in-process LRU keyed by (model, normalized query),
+    so the retrievers of one request share a single encode and nothing is
+    written to disk. Returns a read-only float32 vector, or None.
+    """
+    if not embedding_model or not query or not query.strip():
+        return None
+
+    key = (EMBEDDING_MODEL_NAME, normalize_query(query))
+    with _query_cache_lock:
+        embedding = _query_cache.get(key)
+        if embedding is not None:
+            _query_cache.move_to_end(key)
+            return embedding
+
+    try:
+        text = QUERY_PREFIXES.get(EMBEDDING_MODEL_NAME, "") + key[1]
+        embedding = embedding_model.encode(
+            [text], normalize_embeddings=True, convert_to_numpy=True, show_progress_bar=False
+        )[0].astype(np.float32)
+        embedding.flags.writeable = False
+    except Exception as e:
+        print(f"⚠️ Query encoding failed: {str(e)}")
+        return None
+
+    with _query_cache_lock:
+        _query_cache[key] = embedding
+        while len(_query_cache) > ConfigManager.QUERY_CACHE_SIZE:
+            _query_cache.popitem(last=False)
+    return embedding
+
+
+def iter_embed(batches, doc_type=None, use_cache=True):
+    """Embed chunk batches as they arrive, yielding each embedded batch."""
+    for batch in batches:
+        embedded = compute_embeddings(batch, doc_type=doc_type, use_cache=use_cache)
+        if embedded:
+            yield embedded
+
+
+class FaissIndexBuilder:
+    """
+    Builds a FAISS index from streamed embedding batches. Up to
+    `FLAT_MAX_VECTORS` vectors are buffered; if the stream ends there the
+    index is built and tuned by `build_tuned_index`. Past that point an HNSW
+    index (no training needed) is created and later batches are added to it
+    directly, so the raw vectors are never stacked into one matrix. A
+    reservoir sample of up to `sample_size` vectors is held out of the HNSW
+    index until `save`, where efSearch is tuned on it against exact search
+    and it is then added. Streams past `HNSW_MAX_VECTORS` stay on HNSW, the
+    tier `build_tuned_index` also falls back to: IVF-PQ would need every
+    vector up front to train. The saved doc payload carries no `embedding`
+    arrays; a `source` (what the index was built from) is saved in its params.
+    """
+
+    def __init__(self, save_path=None, k=10, target_recall=None, sample_size=200, seed=0, source=None):
+        self.save_path = save_path or os.path.join(ConfigManager.VECTOR_STORE_BASE, "faiss_store.pkl")
+        self.source = source
+        self.k = k
+        self.target_recall = target_recall or ConfigManager.FAISS_TARGET_RECALL
+        self.sample_size = sample_size
+        self.index = None
+        self.params = None
+        self.docs = []
+        self._pending = []
+        self._pending_count = 0
+        self._held = []
+        self._seen = 0
+        self._rng = np.random.default_rng(seed)
+
+    def add(self, docs):
+        valid_docs = [doc for doc in docs if doc.get('embedding') is not None]
+        if not valid_docs:
+            return
+
+        embeddings_np = np.array([doc['embedding'] for doc in valid_docs]).astype("float32")
+        labels = np.arange(len(self.docs), len(self.docs) + len(valid_docs), dtype="int64")
+        self.docs.extend({k: v for k, v in doc.items() if k != 'embedding'} for doc in valid_docs)
+
+        if self.index is not None:
+            self._add_streamed(embeddings_np, labels)
+            return
+
+        self._pending.append(embeddings_np)
+        self._pending_count += len(embeddings_np)
+        if self._pending_count > FLAT_MAX_VECTORS:
+            pending = np.vstack(self._pending)
+            self._pending = []
+            self._pending_count = 0
+            # Past the flat tier; HNSW is the largest tier that can grow without training
+            self.params = choose_faiss_params(HNSW_MAX_VECTORS - 1, pending.shape[1])
+            self.index = create_index(self.params, pending.shape[1])
+            self._add_streamed(pending, np.arange(len(pending), dtype="int64"))
+
+    def _add_streamed(self, vectors, labels):
+        """Add rows to the HNSW index, reservoir-sampling `sample_size` of them out for tuning."""
+        positions = self._seen + np.arange(len(vectors))
+        self._seen += len(vectors)
+        free = min(len(vectors), self.sample_size - len(self._held))
+        slots = np.full(len(vectors), -1, dtype=np.int64)
+        slots[:free] = len(self._held) + np.arange(free)
+        draws = self._rng.integers(0, positions[free:] + 1)
+        slots[free:] = np.where(draws < self.sample_size, draws, -1)
+
+        index_rows = slots < 0
+        evicted = []
+        for row in np.flatnonzero(~index_rows):
+            slot = slots[row]
+            if slot == len(self._held):
+                self._held.append((vectors[row], labels[row]))
+            else:
+                evicted.append(self._held[slot])
+                self._held[slot] = (vectors[row], labels[row])
+
+        if index_rows.any():
+            self.index.add_with_ids(vectors[index_rows], labels[index_rows])
+        if evicted:
+            self.index.add_with_ids(np.array([v for v, _ in evicted]), np.array([l for _, l in evicted]))
+
+    def _tune_streamed(self):
+        queries = np.array([v for v, _ in self._held], dtype="float32")
+        held_ids = np.array([l for _, l in self._held], dtype="int64")
+        self._held = []
+        # IndexHNSWFlat keeps the raw vectors, so its storage doubles as the exact index
+        exact = faiss.downcast_index(faiss.downcast_index(self.index.index).storage)
+        ids = faiss.vector_to_array(self.index.id_map)
+        self.params = tune_search_params(self.index, self.params, queries, exact, self.k, self.target_recall, ids=ids)
+        if len(queries):
+            self.index.add_with_ids(queries, held_ids)
+        print(f"✅ Built FAISS {self.params['type']} index over {self.index.ntotal} streamed embeddings")
+
+    def save(self):
+        try:
+            if self.index is None:
+                if not self._pending:
+                    print("⚠️ No embeddings available to save FAISS index.")
+                    return False
+                self.index, self.params = build_tuned_index(
+                    np.vstack(self._pending), k=self.k, target_recall=self.target_recall,
+                    sample_size=self.sample_size
+                )
+                self._pending = []
+                self._pending_count = 0
+            else:
+                self._tune_streamed()
+            if self.source is not None:
+                self.params["source"] = self.source
+
+            write_faiss_index(self.index, self.docs, self.save_path, params=self.params)
+            return True
+        except Exception as e:
+            print(f"⚠️ Failed to save FAISS index: {str(e)}")
+            return False
+
+
+def save_faiss_index(docs, save_path=None, embeddings=None):
+    """
+    Build and save a FAISS index over `docs`. Vectors come from each doc's
+    `embedding`, or from the row-aligned `embeddings` matrix when given.
+    """
     if save_path is None:
         save_path = os.path.join(ConfigManager.VECTOR_STORE_BASE, "faiss_store.pkl")
 
     try:
-        embeddings = [doc['embedding'] for doc in docs if 'embedding' in doc]
+        if embeddings is None:
+            embeddings = [doc['embedding'] for doc in docs if 'embedding' in doc]
         if len(embeddings) == 0:
             print("⚠️ No embeddings available to save FAISS index.")
             return
 
         embeddings_np = np.array(embeddings).astype("float32")
-        d = embeddings_np.shape[1]
+        index, params = build_tuned_index(embeddings_np)
 
-        if len(embeddings) < 400:
-            print(f"⚠️ Too few embeddings ({len(embeddings)}) for quantized FAISS. Using FlatL2 fallback.")
-            index = faiss.IndexFlatL2(d)
-        else:
-            print(f"✅ Using IVFPQ with {len(embeddings)} embeddings")
-            quantizer = faiss.IndexFlatL2(d)
-            index = faiss.IndexIVFPQ(quantizer, d, 100, 8, 8)
-            index.train(embeddings_np)
+        write_faiss_index(index, docs, save_path, params=params)
+    except Exception as e:
+        print(f"⚠️ Failed to save FAISS index: {str(e)}")
 
-        index.add(embeddings_np)
+def update_faiss_index(docs, save_path=None, removed=(), compaction_threshold=0.25):
+    """
+    Apply an incremental change to a saved FAISS index: `docs` are added
+    under new doc store labels and the indexed docs with the same content as
+    `removed` are deleted, so only the changed rows are written to the doc
+    store. Removed rows are tombstoned in the store (and dropped from the
+    index where the index type supports `remove_ids`; HNSW does not, so
+    searches skip them). Returns False when the change cannot be applied in
+    place and the caller should rebuild from the live documents: no index
+    yet, a legacy positional index, or tombstones past `compaction_threshold`.
+    """
+    if save_path is None:
+        save_path = os.path.join(ConfigManager.VECTOR_STORE_BASE, "faiss_store.pkl")
 
-        os.makedirs(os.path.dirname(save_path), exist_ok=True)
-        with open(save_path, "wb") as f:
-            pickle.dump((index, docs), f)
+    # A memory-mapped index is read-only, so load a private copy to extend it
+    index, doc_store = load_faiss_index(save_path, mmap=False)
+    if index is None or not isinstance(doc_store, DocStore) or not is_id_mapped(index):
+        return False
+
+    try:
+        removed_labels = [label for label, _ in doc_store.labels_for_hashes(
+            {content_hash(doc.get("content", "")) for doc in removed}
+        )]
+        total = len(doc_store)
+        if total and (len(doc_store.deleted_labels()) + len(removed_labels)) / total > compaction_threshold:
+            return False
+
+        valid_docs = [doc for doc in docs if doc.get('embedding') is not None]
+        if not valid_docs and not removed_labels:
+            return True
+        if valid_docs:
+            labels = np.arange(total, total + len(valid_docs), dtype="int64")
+            index.add_with_ids(np.array([doc['embedding'] for doc in valid_docs]).astype("float32"), labels)
+        if removed_labels:
+            try:
+                index.remove_ids(np.array(removed_labels, dtype="int64"))
+            except RuntimeError:
+                pass
+
+        index_path, _ = faiss_index_paths(save_path)
+        faiss.write_index(index, f"{index_path}.tmp")
+        doc_store.put_many(total, valid_docs)
+        doc_store.set_deleted(removed_labels)
+        os.replace(f"{index_path}.tmp", index_path)
+        print(f"✅ Updated FAISS index: {len(valid_docs)} added, {len(removed_labels)} removed")
+        return True
     except Exception as e:
-        print(f"⚠️ Failed to save FAISS index: {str(e)}")
+        print(f"⚠️ Failed to update FAISS index: {str(e)}")
+        return False
+    finally:
+        doc_store.close()
+
+
+def faiss_index_paths(path):
+    """Native FAISS index file and doc store file for a `faiss_*.pkl` path."""
+    base = os.path.splitext(path)[0]
+    return f"{base}.index", f"{base}.docs.sqlite"
 
-def load_faiss_index(path=None):
+
+def _legacy_faiss_docs_path(path):
+    return f"{os.path.splitext(path)[0]}.docs.pkl"
+
+
+def _faiss_params_path(path):
+    return f"{os.path.splitext(path)[0]}.params.json"
+
+
+def load_faiss_params(path):
+    """Index type and tuned search parameters saved alongside a FAISS index."""
+    try:
+        with open(_faiss_params_path(path), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_faiss_index(index, docs, save_path, params=None):
+    """
+    Persist with FAISS's own serializer plus a SQLite doc store (keyed by
+    FAISS id) and the index parameters. The index and params files are
+    written to temp names and swapped in. The doc store is rewritten in place
+    in a single transaction: swapping a WAL-mode database file under open
+    connections would leave them on the old file with stale -wal/-shm files
+    next to the new one.
+    """
+    index_path, docs_path = faiss_index_paths(save_path)
+    os.makedirs(os.path.dirname(index_path) or ".", exist_ok=True)
+
+    if params is not None:
+        params_path = _faiss_params_path(save_path)
+        with open(f"{params_path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(params, f)
+        os.replace(f"{params_path}.tmp", params_path)
+
+    faiss.write_index(index, f"{index_path}.tmp")
+    doc_store = DocStore(docs_path)
+    try:
+        doc_store.replace_all(docs)
+    finally:
+        doc_store.close()
+    os.replace(f"{index_path}.tmp", index_path)
+
+
+def load_faiss_index(path=None, mmap=True):
+    """
+    Load a FAISS index and its docs. Native indexes are opened with
+    memory-mapped, read-only I/O when `mmap` is set, so cold starts don't read
+    the whole file and several processes share the same pages. Docs come back
+    as a `DocStore` that fetches rows on demand. Pickled doc payloads and
+    legacy pickled `(index, docs)` files are still readable.
+    """
     if path is None:
         path = os.path.join(ConfigManager.VECTOR_STORE_BASE, "faiss_store.pkl")
-        
+
+    index_path, docs_path = faiss_index_paths(path)
+    legacy_docs_path = _legacy_faiss_docs_path(path)
     try:
+        if os.path.exists(index_path) and (os.path.exists(docs_path) or os.path.exists(legacy_docs_path)):
+            index = None
+            if mmap:
+                try:
+                    index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+                except Exception:
+                    index = None
+            if index is None:
+                index = faiss.read_index(index_path)
+            apply_search_params(index, load_faiss_params(path))
+            if os.path.exists(docs_path):
+                return index, DocStore(docs_path)
+            with open(legacy_docs_path, "rb") as f:
+                return index, pickle.load(f)
+
         if os.path.exists(path):
             with open(path, "rb") as f:
                 return pickle.load(f)
@@ -145,5 +510,3 @@ def load_faiss_index(path=None):
         print(f"⚠️ Failed to load FAISS index: {str(e)}")
 
     return None, []
-
-
@@ -0,0 +1,164 @@
+import math
+import time
+import faiss
+import numpy as np
+from core.config_manager import ConfigManager
+
+FLAT_MAX_VECTORS = 10000
+HNSW_MAX_VECTORS = 200000
+
+
+def choose_faiss_params(n, d):
+    """
+    Pick an index type and starting parameters from corpus size:
+    exact search for small corpora, HNSW for mid-sized ones, and IVF-PQ
+    (compressed) once the raw vectors get expensive to hold in RAM.
+    """
+    if n < FLAT_MAX_VECTORS:
+        return {"type": "flat"}
+
+    if n < HNSW_MAX_VECTORS:
+        return {"type": "hnsw", "M": 32, "ef_construction": 200, "ef_search": 64}
+
+    # ~4*sqrt(n) lists, keeping at least 39 training points per centroid
+    nlist = int(min(4 * math.sqrt(n), n // 39))
+    # 8 sub-vector dims per PQ code is a good recall/size trade-off; m must divide d
+    pq_m = max(m for m in range(1, d + 1) if d % m == 0 and m <= max(1, d // 8))
+    return {"type": "ivfpq", "nlist": nlist, "pq_m": pq_m, "pq_bits": 8, "nprobe": max(1, nlist // 64)}
+
+
+def create_index(params, d):
+    """
+    Empty index for `params`. Every tier takes explicit ids (`add_with_ids`),
+    so FAISS ids are doc store labels and survive appends and removals:
+    IVF-PQ maps ids natively, flat and HNSW are wrapped in an `IndexIDMap2`.
+    """
+    if params["type"] == "hnsw":
+        index = faiss.IndexHNSWFlat(d, params["M"])
+        index.hnsw.efConstruction = params["ef_construction"]
+        return faiss.IndexIDMap2(index)
+    if params["type"] == "ivfpq":
+        quantizer = faiss.IndexFlatL2(d)
+        return faiss.IndexIVFPQ(quantizer, d, params["nlist"], params["pq_m"], params["pq_bits"])
+    return faiss.IndexIDMap2(faiss.IndexFlatL2(d))
+
+
+def is_id_mapped(index):
+    """True if the index's ids are labels it was given, not insertion positions."""
+    return isinstance(index, (faiss.IndexIDMap, faiss.IndexIVF))
+
+
+def apply_search_params(index, params):
+    """Set query-time knobs (nprobe / efSearch) recorded with the index."""
+    if not params:
+        return
+    try:
+        if params.get("type") == "ivfpq" and "nprobe" in params:
+            faiss.ParameterSpace().set_index_parameter(index, "nprobe", params["nprobe"])
+        elif params.get("type") == "hnsw" and "ef_search" in params:
+            faiss.ParameterSpace().set_index_parameter(index, "efSearch", params["ef_search"])
+    except Exception as e:
+        print(f"⚠️ Failed to apply FAISS search params: {str(e)}")
+
+
+def holdout_split(n, sample_size, seed=0):
+    """
+    Split row positions into (indexed, held_out). Held-out rows are real
+    embeddings kept out of the index while it is tuned, so recall is measured
+    on vectors the index has not seen; they are added once tuning is done.
+    At most a tenth of the rows is held out.
+    """
+    rng = np.random.default_rng(seed)
+    size = min(sample_size, n // 10)
+    held_out = np.sort(rng.choice(n, size=size, replace=False)) if size else np.empty(0, dtype="int64")
+    mask = np.ones(n, dtype=bool)
+    mask[held_out] = False
+    return np.flatnonzero(mask).astype("int64"), held_out.astype("int64")
+
+
+def measure_recall(index, queries, ground_truth, k):
+    _, found = index.search(queries, k)
+    hits = sum(len(set(row) & set(truth)) for row, truth in zip(found, ground_truth))
+    return hits / float(ground_truth.size)
+
+
+def build_tuned_index(embeddings, k=10, target_recall=None, sample_size=200):
+    """
+    Build a FAISS index for `embeddings` and tune its search parameter until
+    recall@k against exact search reaches `target_recall` (or the knob is
+    maxed out). Recall is measured on a slice of the embeddings held out of
+    the index during tuning (see `holdout_split`). Returns (index, params);
+    params records the chosen settings and the measured recall/latency so
+    they persist with the index.
+    """
+    target_recall = target_recall or ConfigManager.FAISS_TARGET_RECALL
+    embeddings = np.ascontiguousarray(embeddings, dtype="float32")
+    n, d = embeddings.shape
+    params = choose_faiss_params(n, d)
+
+    index, params = _build_and_tune(embeddings, params, k, target_recall, sample_size)
+    if params["type"] == "ivfpq" and params.get("recall_at_k", 0) < target_recall:
+        # PQ compression can cap recall; trade memory for accuracy
+        print("⚠️ IVF-PQ cannot reach the recall target, falling back to HNSW")
+        index, params = _build_and_tune(
+            embeddings, {"type": "hnsw", "M": 32, "ef_construction": 200, "ef_search": 64},
+            k, target_recall, sample_size
+        )
+    return index, params
+
+
+def _build_and_tune(embeddings, params, k, target_recall, sample_size):
+    n, d = embeddings.shape
+    index = create_index(params, d)
+    if params["type"] == "ivfpq":
+        index.train(embeddings)
+
+    if params["type"] == "flat":
+        index.add_with_ids(embeddings, np.arange(n, dtype="int64"))
+        print(f"✅ Built FAISS {params['type']} index over {n} embeddings")
+        params.update({"recall_at_k": 1.0, "k": k, "validated": True})
+        return index, params
+
+    indexed, held_out = holdout_split(n, sample_size)
+    index.add_with_ids(embeddings[indexed], indexed)
+    print(f"✅ Built FAISS {params['type']} index over {n} embeddings")
+
+    exact = faiss.IndexFlatL2(d)
+    exact.add(embeddings[indexed])
+    params = tune_search_params(index, params, embeddings[held_out], exact, k, target_recall, ids=indexed)
+    # Tuned on unseen vectors; now make them searchable too
+    index.add_with_ids(embeddings[held_out], held_out)
+    return index, params
+
+
+def tune_search_params(index, params, queries, exact, k, target_recall, ids=None):
+    """
+    Raise the index's search knob (nprobe / efSearch) until recall@k of
+    `queries` against the exact index `exact` reaches `target_recall`, or the
+    knob is maxed out. `ids` maps `exact`'s positions to the index's ids.
+    Records the knob, recall and latency in `params` and returns it.
+    """
+    k = min(k, exact.ntotal)
+    knob, limit = ("nprobe", params.get("nlist", 1)) if params["type"] == "ivfpq" else ("ef_search", 1024)
+    if not len(queries) or not k:
+        params.update({"k": k, "validated": False})
+        return params
+
+    _, ground_truth = exact.search(queries, k)
+    if ids is not None:
+        ground_truth = ids[ground_truth]
+    while True:
+        apply_search_params(index, params)
+        start = time.perf_counter()
+        recall = measure_recall(index, queries, ground_truth, k)
+        latency_ms = (time.perf_counter() - start) * 1000 / len(queries)
+        if recall >= target_recall or params[knob] >= limit:
+            break
+        params[knob] = min(params[knob] * 2, limit)
+
+    params.update({"recall_at_k": round(recall, 4), "k": k, "latency_ms": round(latency_ms, 4), "validated": True})
+    if recall < target_recall:
+        print(f"⚠️ FAISS {params['type']} reached recall@{k}={recall:.3f}, below target {target_recall}")
+    else:
+        print(f"✅ FAISS tuned: {knob}={params[knob]}, recall@{k}={recall:.3f}, {latency_ms:.3f} ms/query")
+    return params
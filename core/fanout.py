@@ -0,0 +1,73 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from core.config_manager import ConfigManager
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Process-wide thread pool shared by retriever fan-outs."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=ConfigManager.RETRIEVER_WORKERS, thread_name_prefix="retriever"
+            )
+        return _executor
+
+
+def fan_out(tasks, deadline_ms=None, deadlines=None, executor=None):
+    """
+    Run named zero-argument callables concurrently and collect what finishes
+    in time. Each task gets `deadlines[name]` ms (default `deadline_ms`),
+    measured from submission, so total latency is the slowest task in budget
+    rather than the sum of all of them. A task that raises counts as failed.
+
+    Returns (results, report): results maps name -> return value for tasks
+    that completed; report has `timed_out`, `failed` and per-task `latency_ms`.
+    Timed-out tasks are abandoned, not interrupted: they finish in the
+    background and their results are discarded.
+    """
+    deadline_ms = deadline_ms or ConfigManager.RETRIEVER_DEADLINE_MS
+    deadlines = deadlines or {}
+    executor = executor or get_executor()
+
+    start = time.perf_counter()
+    futures = {}
+    for name, task in tasks.items():
+        futures[executor.submit(_timed, task)] = name
+    expires = {future: start + deadlines.get(name, deadline_ms) / 1000.0 for future, name in futures.items()}
+
+    results = {}
+    report = {"timed_out": [], "failed": [], "latency_ms": {}}
+    pending = set(futures)
+    while pending:
+        now = time.perf_counter()
+        for future in [f for f in pending if expires[f] <= now and not f.done()]:
+            pending.discard(future)
+            report["timed_out"].append(futures[future])
+        if not pending:
+            break
+
+        done, pending = wait(pending, timeout=max(0.0, min(expires[f] for f in pending) - now),
+                             return_when=FIRST_COMPLETED)
+        for future in done:
+            name = futures[future]
+            try:
+                value, elapsed = future.result()
+                results[name] = value
+                report["latency_ms"][name] = round(elapsed * 1000, 2)
+            except Exception as e:
+                print(f"⚠️ Retriever {name} failed: {str(e)}")
+                report["failed"].append(name)
+
+    if report["timed_out"]:
+        print(f"⏱️ Retrievers past their deadline: {', '.join(report['timed_out'])}")
+    return results, report
+
+
+def _timed(task):
+    start = time.perf_counter()
+    return task(), time.perf_counter() - start
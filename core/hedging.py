@@ -0,0 +1,36 @@
+import threading
+from collections import defaultdict, deque
+import numpy as np
+
+
+class LatencyTracker:
+    """
+    Recent per-model latencies (seconds), used to time hedged requests: the
+    next model is tried once the current one runs past its own p95. Until a
+    model has `min_samples` observations, `default_delay` is used.
+    """
+
+    def __init__(self, window=200, min_samples=5, default_delay=2.0, min_delay=0.25, max_delay=None):
+        self.window = window
+        self.min_samples = min_samples
+        self.default_delay = default_delay
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self._samples = defaultdict(lambda: deque(maxlen=self.window))
+        self._lock = threading.Lock()
+
+    def record(self, model, seconds):
+        with self._lock:
+            self._samples[model].append(seconds)
+
+    def percentile(self, model, q=95):
+        with self._lock:
+            samples = list(self._samples.get(model, ()))
+        if len(samples) < self.min_samples:
+            return None
+        return float(np.percentile(samples, q))
+
+    def hedge_delay(self, model):
+        p95 = self.percentile(model)
+        delay = self.default_delay if p95 is None else max(p95, self.min_delay)
+        return min(delay, self.max_delay) if self.max_delay else delay
@@ -3,18 +3,94 @@ import numpy as np
 import pickle
 import os
 from core.config_manager import ConfigManager
+from core.doc_store import DocStore, content_hash, doc_filename
 
 
 class HNSWSearch:
-    def __init__(self, dim=768, max_elements=10000, ef_construction=200, M=16):
+    """
+    HNSW vector index plus a label -> document mapping. Documents added since
+    the last save are held in memory; saved documents live in a SQLite
+    `DocStore` next to the index and are fetched only for search hits.
+    """
+
+    def __init__(self, dim=768, max_elements=10000, ef_construction=200, M=16, compaction_threshold=0.25):
         self.dim = dim
         self.max_elements = max_elements
+        self.ef_construction = ef_construction
+        self.M = M
+        self.compaction_threshold = compaction_threshold
         self.index = hnswlib.Index(space='cosine', dim=dim)
         self.index.init_index(max_elements=max_elements, ef_construction=ef_construction, M=M)
         self.index.set_ef(50)  # ef should be > k for good recall
-        self.documents = []
+        self.doc_store = None
+        self.doc_count = 0
+        self._unsaved = {}
+        self._rewrite_store = False
+        self.deleted = set()
         self.is_trained = False
 
+    @property
+    def live_count(self):
+        return self.doc_count - len(self.deleted)
+
+    def get_documents(self, labels):
+        """Documents for `labels` (None for unknown ones), unsaved first, then the store."""
+        docs = [self._unsaved.get(int(label)) for label in labels]
+        missing = [i for i, doc in enumerate(docs) if doc is None]
+        if missing and self.doc_store is not None and not self._rewrite_store:
+            fetched = self.doc_store.get_many([labels[i] for i in missing])
+            for i, doc in zip(missing, fetched):
+                docs[i] = doc
+        return docs
+
+    def iter_documents(self, include_deleted=False):
+        """Yield (label, doc) for every live document (or every document)."""
+        if self.doc_store is not None and not self._rewrite_store:
+            for label, doc in self.doc_store.iter_documents(include_deleted=True):
+                if label not in self._unsaved and (include_deleted or label not in self.deleted):
+                    yield label, doc
+        for label in sorted(self._unsaved):
+            if include_deleted or label not in self.deleted:
+                yield label, self._unsaved[label]
+
+    def live_documents(self):
+        return [doc for _, doc in self.iter_documents()]
+
+    def _lookup(self, store_query, keep):
+        """
+        Live (label, content_hash) pairs selected by `store_query` on the
+        saved doc store and by `keep(doc)` on unsaved documents. Before the
+        store is in sync (legacy or compacted index) every document is scanned.
+        """
+        if self.doc_store is None or self._rewrite_store:
+            return [(label, content_hash(doc.get("content", ""))) for label, doc in self.iter_documents()
+                    if keep(doc)]
+        found = [(label, h) for label, h in store_query(self.doc_store)
+                 if label not in self._unsaved and label not in self.deleted]
+        found += [(label, content_hash(doc.get("content", ""))) for label, doc in self._unsaved.items()
+                  if label not in self.deleted and keep(doc)]
+        return found
+
+    def live_hashes(self, hashes):
+        """The subset of content `hashes` that live documents already have."""
+        hashes = set(hashes)
+        found = self._lookup(lambda store: store.labels_for_hashes(hashes),
+                             lambda doc: content_hash(doc.get("content", "")) in hashes)
+        return {h for _, h in found}
+
+    def file_hashes(self, filenames):
+        """Live (label, content_hash) pairs of documents parsed from `filenames`."""
+        filenames = set(filenames)
+        return self._lookup(lambda store: store.labels_for_files(filenames),
+                            lambda doc: self.doc_filename(doc) in filenames)
+
+    def _ensure_capacity(self, extra):
+        """Grow the index (doubling) so `extra` more items fit."""
+        needed = self.index.get_current_count() + extra
+        if needed > self.max_elements:
+            self.max_elements = max(needed, self.max_elements * 2)
+            self.index.resize_index(self.max_elements)
+
     def add_documents(self, docs_with_embeddings):
         """Add documents with embeddings to the HNSW index."""
         try:
@@ -35,10 +111,13 @@ class HNSWSearch:
             norms = np.linalg.norm(embeddings_np, axis=1, keepdims=True)
             embeddings_np = embeddings_np / (norms + 1e-8)
 
-            labels = np.arange(len(self.documents), len(self.documents) + len(valid_docs))
+            self._ensure_capacity(len(valid_docs))
+            labels = np.arange(self.doc_count, self.doc_count + len(valid_docs))
             self.index.add_items(embeddings_np, labels)
 
-            self.documents.extend(valid_docs)
+            for label, doc in zip(labels, valid_docs):
+                self._unsaved[int(label)] = doc
+            self.doc_count += len(valid_docs)
             self.is_trained = True
 
             print(f"✅ Added {len(valid_docs)} documents to HNSW index")
@@ -47,9 +126,58 @@ class HNSWSearch:
             print(f"⚠️ Failed to add documents to HNSW index: {str(e)}")
             return False
 
+    def mark_deleted(self, labels):
+        """Soft-delete labels; compacts once the deleted fraction passes the threshold."""
+        labels = [int(label) for label in labels if label not in self.deleted and label < self.doc_count]
+        for label in labels:
+            self.index.mark_deleted(label)
+            self.deleted.add(label)
+
+        if labels:
+            print(f"✅ Marked {len(labels)} documents deleted in HNSW index")
+        if self.doc_count and len(self.deleted) / self.doc_count > self.compaction_threshold:
+            self.compact()
+        return len(labels)
+
+    @staticmethod
+    def doc_filename(doc):
+        return doc_filename(doc)
+
+    def delete_file(self, filename):
+        """Soft-delete every document that was parsed from `filename`."""
+        return self.mark_deleted([label for label, _ in self.file_hashes([filename])])
+
+    def live_vectors(self):
+        """Live documents and their (normalized) vectors, read back from the index."""
+        live = list(self.iter_documents())
+        if not live:
+            return [], np.zeros((0, self.dim), dtype='float32')
+        vectors = np.array(self.index.get_items([label for label, _ in live])).astype('float32')
+        return [doc for _, doc in live], vectors
+
+    def compact(self):
+        """Rebuild the index from live items only, relabelling them 0..n-1."""
+        live_docs, vectors = self.live_vectors()
+
+        index = hnswlib.Index(space='cosine', dim=self.dim)
+        self.max_elements = max(len(live_docs) * 2, 1000)
+        index.init_index(max_elements=self.max_elements, ef_construction=self.ef_construction, M=self.M)
+        index.set_ef(50)
+        if live_docs:
+            index.add_items(vectors, np.arange(len(live_docs)))
+
+        # Labels changed, so the doc store is rewritten wholesale on the next save
+        self.index = index
+        self._unsaved = dict(enumerate(live_docs))
+        self._rewrite_store = True
+        self.doc_count = len(live_docs)
+        self.deleted = set()
+        self.is_trained = self.doc_count > 0
+        print(f"✅ Compacted HNSW index to {self.doc_count} documents")
+
     def search(self, query_embedding, k=10):
         """Search for similar documents using HNSW index."""
-        if not self.is_trained or len(self.documents) == 0:
+        if not self.is_trained or self.live_count == 0:
             print("⚠️ HNSW index not trained or empty")
             return []
 
@@ -60,20 +188,41 @@ class HNSWSearch:
             if norm > 0:
                 query_embedding = query_embedding / norm
 
-            labels, distances = self.index.knn_query(query_embedding, k=min(k, len(self.documents)))
+            labels, distances = self.index.knn_query(query_embedding, k=min(k, self.live_count))
+
+            hits = [(int(label), distance) for label, distance in zip(labels[0], distances[0])
+                    if label < self.doc_count and label not in self.deleted]
+            docs = self.get_documents([label for label, _ in hits])
 
             results = []
-            for label, distance in zip(labels[0], distances[0]):
-                if label < len(self.documents):
-                    doc = self.documents[label].copy()
-                    doc['similarity_score'] = 1.0 - distance  # Convert distance to similarity
-                    results.append(doc)
+            for (label, distance), doc in zip(hits, docs):
+                if doc is None:
+                    continue
+                # Store rows are fresh dicts; only unsaved in-memory docs need copying
+                doc = dict(doc) if label in self._unsaved else doc
+                doc['similarity_score'] = 1.0 - distance  # Convert distance to similarity
+                results.append(doc)
 
             return results
         except Exception as e:
             print(f"⚠️ HNSW search failed: {str(e)}")
             return []
 
+    def nearest_similarities(self, embeddings):
+        """
+        Cosine similarity of each embedding to its nearest live document (0.0
+        when there is none), from one batched knn query; no documents are read.
+        """
+        embeddings = np.array(embeddings).astype('float32').reshape(len(embeddings), -1)
+        similarities = np.zeros(len(embeddings), dtype=np.float32)
+        if not len(embeddings) or self.live_count == 0:
+            return similarities
+        embeddings = embeddings / (np.linalg.norm(embeddings, axis=1, keepdims=True) + 1e-8)
+        labels, distances = self.index.knn_query(embeddings, k=1)
+        live = np.array([label < self.doc_count and label not in self.deleted for label in labels[:, 0]])
+        similarities[live] = 1.0 - distances[live, 0]
+        return similarities
+
     def save(self, file_id):
         if not file_id:
             print("⚠️ No file_id provided, cannot save HNSW index.")
@@ -81,21 +230,41 @@ class HNSWSearch:
         try:
             index_dir = os.path.join(ConfigManager.VECTOR_STORE_BASE, file_id)
             os.makedirs(index_dir, exist_ok=True)
-            
+
+            # Stage the index first: if that fails the saved store and index stay a matching pair
             index_path = os.path.join(index_dir, "hnsw_index.bin")
-            self.index.save_index(index_path)
-            
-            docs_path = os.path.join(index_dir, "hnsw_docs.pkl")
-            with open(docs_path, 'wb') as f:
-                pickle.dump(self.documents, f)
-            
+            self.index.save_index(f"{index_path}.tmp")
+
+            store_path = os.path.join(index_dir, "hnsw_docs.sqlite")
+            if self.doc_store is None or self.doc_store.path != store_path:
+                # First save (or saving under a new id): every document goes into the store
+                self._unsaved.update(
+                    {label: doc for label, doc in self.iter_documents(include_deleted=True)
+                     if label not in self._unsaved}
+                )
+                self._rewrite_store = True
+                self.doc_store = DocStore(store_path)
+
+            if self._rewrite_store:
+                self.doc_store.replace_all(
+                    [self._unsaved.get(label, {"content": ""}) for label in range(self.doc_count)]
+                )
+            elif self._unsaved:
+                labels = sorted(self._unsaved)
+                self.doc_store.put_many(labels[0], [self._unsaved[label] for label in labels])
+            self.doc_store.set_deleted(self.deleted - self.doc_store.deleted_labels())
+            self.doc_store.set_meta("dim", self.dim)
+            self._unsaved = {}
+            self._rewrite_store = False
+            os.replace(f"{index_path}.tmp", index_path)
+
             print(f"✅ Saved HNSW index for session {file_id}")
             return True
-            
+
         except Exception as e:
             print(f"⚠️ Failed to save HNSW index: {str(e)}")
             return False
-    
+
     def load(self, file_id):
         if not file_id:
             print("⚠️ No session_id provided, cannot save HNSW index.")
@@ -103,20 +272,43 @@ class HNSWSearch:
         try:
             index_dir = os.path.join(ConfigManager.VECTOR_STORE_BASE, file_id)
             index_path = os.path.join(index_dir, "hnsw_index.bin")
-            docs_path = os.path.join(index_dir, "hnsw_docs.pkl")
-            
-            if not os.path.exists(index_path) or not os.path.exists(docs_path):
+            store_path = os.path.join(index_dir, "hnsw_docs.sqlite")
+            legacy_docs_path = os.path.join(index_dir, "hnsw_docs.pkl")
+
+            if not os.path.exists(index_path):
+                return False
+
+            if os.path.exists(store_path):
+                self.doc_store = DocStore(store_path)
+                self.doc_count = len(self.doc_store)
+                self.deleted = self.doc_store.deleted_labels()
+                self.dim = self.doc_store.get_meta("dim", self.dim)
+            elif os.path.exists(legacy_docs_path):
+                # Older saves pickled the full document list; migrate on next save
+                with open(legacy_docs_path, 'rb') as f:
+                    payload = pickle.load(f)
+                if isinstance(payload, dict):
+                    documents = payload["documents"]
+                    self.deleted = set(payload.get("deleted", []))
+                    self.dim = payload.get("dim", self.dim)
+                else:
+                    documents = payload
+                    self.deleted = set()
+                self._unsaved = dict(enumerate(documents))
+                self._rewrite_store = True
+                self.doc_count = len(documents)
+            else:
                 return False
-            
+
+            self.index = hnswlib.Index(space='cosine', dim=self.dim)
             self.index.load_index(index_path)
-            
-            with open(docs_path, 'rb') as f:
-                self.documents = pickle.load(f)
-            
-            self.is_trained = len(self.documents) > 0
+            self.index.set_ef(50)
+            self.max_elements = self.index.get_max_elements()
+
+            self.is_trained = self.live_count > 0
             print(f"✅ Loaded HNSW index for session {file_id}")
             return True
-            
+
         except Exception as e:
             print(f"⚠️ Failed to load HNSW index: {str(e)}")
             return False
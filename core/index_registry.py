@@ -0,0 +1,153 @@
+import os
+import threading
+from collections import OrderedDict
+from core.config_manager import ConfigManager
+from core.embeddings import load_faiss_index, faiss_index_paths
+from core.hnswlib_search import HNSWSearch
+from core.bm25_index import BM25Index
+
+
+class IndexRegistry:
+    """
+    Process-wide cache of loaded HNSW, FAISS, BM25 and Chroma handles keyed by
+    (kind, file_id). Entries are invalidated when the files behind them change
+    (mtime/size version) and evicted least-recently-used once the estimated
+    footprint exceeds `memory_budget` bytes. Safe for concurrent readers: each
+    key is loaded at most once, under its own lock. Dropping an entry never
+    closes its handle, since another reader may still be searching it; the
+    handle's SQLite connection is closed when the last reference goes away.
+    """
+
+    def __init__(self, memory_budget=None, chroma_client=None):
+        self.memory_budget = memory_budget or ConfigManager.INDEX_CACHE_BYTES
+        self.chroma_client = chroma_client
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._used_bytes = 0
+
+    @staticmethod
+    def _hnsw_files(file_id):
+        index_dir = os.path.join(ConfigManager.VECTOR_STORE_BASE, file_id)
+        # The index file is rewritten on every save, so it versions the doc store too
+        return [os.path.join(index_dir, "hnsw_index.bin")]
+
+    @staticmethod
+    def _faiss_files(file_id):
+        path = ConfigManager.get_faiss_path(file_id)
+        # The native index is swapped in after its doc store, so it versions both
+        index_path, _ = faiss_index_paths(path)
+        return [index_path] if os.path.exists(index_path) else [path]
+
+    @staticmethod
+    def _version(paths):
+        """(mtime_ns, size) of each file, or None if any is missing."""
+        try:
+            return tuple((os.stat(p).st_mtime_ns, os.stat(p).st_size) for p in paths)
+        except OSError:
+            return None
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def _drop(self, key):
+        """Remove an entry and its key lock; caller holds `_lock`."""
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._used_bytes -= entry["size"]
+        lock = self._key_locks.get(key)
+        # A held lock belongs to a load in progress, which stores the key again
+        if lock is not None and not lock.locked():
+            del self._key_locks[key]
+
+    def _lookup(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry["version"] == version:
+                self._entries.move_to_end(key)
+                return entry["value"]
+        return None
+
+    def _store(self, key, version, value, size):
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._used_bytes -= previous["size"]
+            self._entries[key] = {"version": version, "value": value, "size": size}
+            self._used_bytes += size
+
+            # Evict least-recently-used entries, always keeping the newest one
+            while self._used_bytes > self.memory_budget and len(self._entries) > 1:
+                evicted_key = next(iter(self._entries))
+                self._drop(evicted_key)
+                print(f"♻️ Evicted {evicted_key[0]} index for {evicted_key[1]} from registry")
+
+    def _get(self, kind, file_id, paths, loader):
+        key = (kind, file_id)
+        version = self._version(paths)
+        if version is None:
+            return None
+
+        value = self._lookup(key, version)
+        if value is not None:
+            return value
+
+        with self._key_lock(key):
+            # Another reader may have loaded it while we waited
+            value = self._lookup(key, version)
+            if value is not None:
+                return value
+            value = loader()
+            if value is not None:
+                self._store(key, version, value, sum(size for _, size in version))
+        if value is None:
+            with self._lock:
+                if key not in self._entries:
+                    self._drop(key)
+        return value
+
+    def get_hnsw(self, file_id):
+        def _load():
+            hnsw_search = HNSWSearch()
+            return hnsw_search if hnsw_search.load(file_id) else None
+        return self._get("hnsw", file_id, self._hnsw_files(file_id), _load)
+
+    def get_faiss(self, file_id):
+        def _load():
+            index, docs = load_faiss_index(ConfigManager.get_faiss_path(file_id))
+            return (index, docs) if index is not None and docs else None
+        return self._get("faiss", file_id, self._faiss_files(file_id), _load) or (None, [])
+
+    def get_bm25(self, file_id):
+        def _load():
+            bm25 = BM25Index(file_id)
+            return bm25 if bm25.load() else None
+        return self._get("bm25", file_id, [BM25Index(file_id).index_path], _load)
+
+    def get_chroma(self, file_id, dim):
+        """
+        Chroma collection handle for `dim`-dimensional query vectors; Chroma
+        manages its own storage, so only the handle is cached.
+        """
+        key = (f"chroma_d{dim}", file_id)
+        value = self._lookup(key, None)
+        if value is not None or self.chroma_client is None:
+            return value
+        with self._key_lock(key):
+            value = self._lookup(key, None)
+            if value is None:
+                value = self.chroma_client.get_or_create_collection(
+                    name=ConfigManager.get_chroma_collection_name(file_id, dim),
+                    embedding_function=None,
+                    metadata={"hnsw:space": "cosine"}
+                )
+                self._store(key, None, value, 0)
+            return value
+
+    def invalidate(self, file_id=None):
+        """Drop cached handles for one file, or for every file."""
+        with self._lock:
+            for key in list(self._entries):
+                if file_id is None or key[1] == file_id:
+                    self._drop(key)
@@ -0,0 +1,231 @@
+import time
+import json
+import queue
+import socket
+import hashlib
+import threading
+from concurrent.futures import Future
+import httpx
+import openai
+from config import (
+    OPENROUTER_API_KEY, OPENROUTER_BASE_URL, TEMPERATURE, API_TIMEOUT,
+    LLM_MAX_CONNECTIONS, LLM_MAX_CONCURRENCY, LLM_RATE_LIMIT_RPM
+)
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway():
+    """Process-wide LLM gateway shared by every agent."""
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            _gateway = LLMGateway()
+        return _gateway
+
+
+class RateLimiter:
+    """Token bucket: `rate_per_minute` requests, bursting up to `burst`. A rate of 0 disables it."""
+
+    def __init__(self, rate_per_minute=0, burst=None):
+        self.rate = rate_per_minute / 60.0
+        self.burst = (burst or max(1, int(self.rate))) if self.rate else 0
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout=None):
+        """Block until a request may go out; returns the seconds waited, raises TimeoutError past `timeout`."""
+        if not self.rate:
+            return 0.0
+        start = time.monotonic()
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return now - start
+                wait = (1 - self._tokens) / self.rate
+            if timeout is not None and now + wait - start > timeout:
+                raise TimeoutError("LLM rate limit wait exceeds the request timeout")
+            time.sleep(wait)
+
+
+class LLMGateway:
+    """
+    Single entry point for chat completions. All agents share one OpenAI
+    client on top of a keep-alive httpx connection pool, so TLS handshakes
+    are paid once per connection rather than once per agent object. Every
+    request passes a global concurrency limit (`max_concurrency` requests in
+    flight) and a token-bucket rate limit. Identical blocking requests (same
+    model, temperature and messages) that are already in flight are
+    coalesced: later callers wait for the first one's answer instead of
+    sending their own. Streams are never coalesced.
+    """
+
+    # How often a waiting stream checks whether it was cancelled
+    POLL_INTERVAL = 0.05
+
+    def __init__(self, api_key=None, base_url=None, timeout=None, max_connections=None, max_concurrency=None,
+                 rate_per_minute=None):
+        self.timeout = timeout or API_TIMEOUT
+        self.http_client = httpx.Client(
+            timeout=self.timeout,
+            limits=httpx.Limits(
+                max_connections=max_connections or LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=max_connections or LLM_MAX_CONNECTIONS
+            )
+        )
+        # Retries are handled by the callers (tenacity / model fallback), so the client itself never retries
+        self.client = openai.OpenAI(
+            api_key=api_key or OPENROUTER_API_KEY,
+            base_url=base_url or OPENROUTER_BASE_URL,
+            timeout=self.timeout,
+            max_retries=0,
+            http_client=self.http_client
+        )
+        self._slots = threading.BoundedSemaphore(max_concurrency or LLM_MAX_CONCURRENCY)
+        self.rate_limiter = RateLimiter(LLM_RATE_LIMIT_RPM if rate_per_minute is None else rate_per_minute)
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "streams": 0, "coalesced": 0, "errors": 0, "rate_limited_s": 0.0}
+
+    def _count(self, key, value=1):
+        with self._lock:
+            self._stats[key] += value
+
+    def _acquire(self):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise TimeoutError(f"no LLM request slot free within {self.timeout}s")
+        try:
+            waited = self.rate_limiter.acquire(timeout=self.timeout)
+        except Exception:
+            self._slots.release()
+            raise
+        if waited:
+            self._count("rate_limited_s", waited)
+
+    @staticmethod
+    def _key(model, messages, temperature):
+        return hashlib.sha1(json.dumps([model, temperature, messages], sort_keys=True).encode()).hexdigest()
+
+    def complete(self, prompt, model, temperature=TEMPERATURE, messages=None):
+        """Blocking completion; returns the message content."""
+        messages = messages or [{"role": "user", "content": prompt}]
+        key = self._key(model, messages, temperature)
+        with self._lock:
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = self._in_flight[key] = Future()
+            else:
+                self._stats["coalesced"] += 1
+        if not owner:
+            return future.result(timeout=self.timeout)
+
+        try:
+            self._acquire()
+            try:
+                self._count("requests")
+                response = self.client.chat.completions.create(
+                    model=model, messages=messages, temperature=temperature
+                )
+            finally:
+                self._slots.release()
+            content = response.choices[0].message.content
+            future.set_result(content)
+            return content
+        except Exception as e:
+            self._count("errors")
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def stream(self, prompt, model, temperature=TEMPERATURE, messages=None, cancel=None):
+        """
+        Streaming completion; yields content deltas. The HTTP stream is read
+        on a helper thread, so setting the `cancel` event (or closing the
+        generator) ends the stream within POLL_INTERVAL even while the server
+        is stalled: the request slot is released and the connection is shut
+        down instead of waiting for the next byte or the timeout. A cancelled
+        stream simply stops yielding.
+        """
+        self._acquire()
+        stop = threading.Event()
+        state = {"stream": None}
+        events = queue.Queue()
+        reader = threading.Thread(
+            target=self._read_stream, name="llm-stream", daemon=True,
+            args=(dict(model=model, messages=messages or [{"role": "user", "content": prompt}],
+                       temperature=temperature), stop, state, events)
+        )
+        try:
+            self._count("streams")
+            reader.start()
+            while True:
+                try:
+                    kind, value = events.get(timeout=self.POLL_INTERVAL)
+                except queue.Empty:
+                    kind, value = None, None
+                if cancel is not None and cancel.is_set():
+                    return
+                if kind == "delta":
+                    yield value
+                elif kind == "done":
+                    return
+                elif kind == "error":
+                    raise value
+        except Exception:
+            self._count("errors")
+            raise
+        finally:
+            stop.set()
+            if reader.is_alive() and state["stream"] is not None:
+                self._abort(state["stream"])
+            self._slots.release()
+
+    def _read_stream(self, kwargs, stop, state, events):
+        stream = None
+        try:
+            stream = state["stream"] = self.client.chat.completions.create(stream=True, **kwargs)
+            for chunk in stream:
+                if stop.is_set():
+                    break
+                if chunk.choices and chunk.choices[0].delta.content:
+                    events.put(("delta", chunk.choices[0].delta.content))
+            events.put(("done", None))
+        except Exception as e:
+            events.put(("error", e))
+        finally:
+            if stream is not None:
+                # Headers may arrive after the consumer gave up; drop the connection then
+                self._abort(stream) if stop.is_set() else stream.close()
+
+    @staticmethod
+    def _abort(stream):
+        """Close an HTTP stream another thread may be blocked reading: shutting the socket down wakes the read."""
+        try:
+            network_stream = stream.response.extensions.get("network_stream")
+            sock = network_stream.get_extra_info("socket") if network_stream is not None else None
+            if sock is not None:
+                sock.shutdown(socket.SHUT_RDWR)
+        except Exception:
+            pass
+        try:
+            stream.close()
+        except Exception:
+            pass
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, in_flight=len(self._in_flight))
+        stats["rate_limited_s"] = round(stats["rate_limited_s"], 3)
+        return stats
+
+    def close(self):
+        self.http_client.close()
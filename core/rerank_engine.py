@@ -0,0 +1,103 @@
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+from sentence_transformers import CrossEncoder
+from core.config_manager import ConfigManager
+from core.utils import chunk_id
+
+DEFAULT_RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+
+def quantize_int8(cross_encoder):
+    """Dynamic int8 quantization of the model's Linear layers for CPU inference."""
+    import torch
+    cross_encoder.model = torch.quantization.quantize_dynamic(
+        cross_encoder.model, {torch.nn.Linear}, dtype=torch.qint8
+    )
+    return cross_encoder
+
+
+class CrossEncoderEngine:
+    """
+    CrossEncoder scoring with batched inference and an LRU of pair scores
+    keyed by (model, quantization mode, query hash, chunk id), so repeated or
+    overlapping queries only score the pairs they haven't seen and scores
+    from a different model or precision are never reused. With `quantize=True` the model's Linear
+    layers run as dynamic int8 on CPU. Scoring never mutates the input docs.
+    """
+
+    def __init__(self, model_name=DEFAULT_RERANK_MODEL, batch_size=None, cache_size=None, quantize=None, model=None):
+        self.model_name = model_name
+        self.batch_size = batch_size or ConfigManager.RERANK_BATCH_SIZE
+        self.cache_size = cache_size if cache_size is not None else ConfigManager.RERANK_CACHE_SIZE
+        self.quantize = ConfigManager.RERANK_INT8 if quantize is None else quantize
+        self.model = model or CrossEncoder(model_name, device="cpu")
+        if self.quantize:
+            try:
+                quantize_int8(self.model)
+                print("✅ Reranker running with dynamic int8 quantization")
+            except Exception as e:
+                print(f"⚠️ int8 quantization unavailable, using float model: {str(e)}")
+                self.quantize = False
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def score(self, query, docs):
+        """Raw CrossEncoder scores for each (query, doc) pair, in doc order."""
+        if not docs:
+            return np.zeros(0, dtype=np.float32)
+
+        query_hash = hashlib.sha1(query.encode()).hexdigest()
+        keys = [(self.model_name, self.quantize, query_hash, chunk_id(doc)) for doc in docs]
+        scores = np.zeros(len(docs), dtype=np.float32)
+
+        missing = []
+        with self._lock:
+            for i, key in enumerate(keys):
+                cached = self._cache.get(key)
+                if cached is None:
+                    missing.append(i)
+                else:
+                    self._cache.move_to_end(key)
+                    scores[i] = cached
+            self.hits += len(docs) - len(missing)
+            self.misses += len(missing)
+
+        if missing:
+            pairs = [(query, docs[i].get("content", "")) for i in missing]
+            predicted = self.model.predict(pairs, batch_size=self.batch_size, show_progress_bar=False)
+            scores[missing] = predicted
+            with self._lock:
+                for i, value in zip(missing, predicted):
+                    self._cache[keys[i]] = float(value)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return scores
+
+    def rerank(self, query, docs, top_k=10, normalize=True):
+        """
+        Copies of the top-k docs ordered by CrossEncoder score, each with a
+        `score` (min-max scaled to [0, 1] across `docs` when `normalize`; all
+        0.0 when every doc scores the same, as with sklearn's `minmax_scale`).
+        """
+        docs = [doc for doc in docs if doc.get("content")]
+        if not docs:
+            return []
+        scores = self.score(query, docs)
+        if normalize:
+            spread = scores.max() - scores.min()
+            scores = (scores - scores.min()) / spread if spread > 0 else np.zeros_like(scores)
+        order = np.argsort(-scores, kind="stable")[:top_k]
+        return [dict(docs[i], score=float(scores[i])) for i in order]
+
+    def cache_stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "size": len(self._cache),
+        }
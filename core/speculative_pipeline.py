@@ -0,0 +1,108 @@
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from config import API_TIMEOUT
+from core.bm25_index import reciprocal_rank_fusion
+from core.embeddings import encode_query
+from core.utils import normalize_query
+
+
+def _timed(fn):
+    start = time.perf_counter()
+    return fn(), (time.perf_counter() - start) * 1000
+
+
+class SpeculativePipeline:
+    """
+    Query pipeline that overlaps the rewrite LLM call with retrieval. The
+    rewrite runs on a worker thread while candidates are retrieved for the
+    raw query on the calling thread (which owns the Streamlit session). When
+    the rewrite arrives, candidates for it are retrieved too and the two
+    candidate lists are fused with RRF. If the rewrite is unchanged, fails,
+    or embeds within `reuse_similarity` of the raw query, the raw results
+    are used as they are and the second retrieval is skipped. Reranking then
+    runs once, on the chosen candidates.
+    Per-stage timings are returned with the result message.
+
+    The rewrite gets its own small pool rather than the shared retriever
+    pool: retrieval fans out onto that pool while this thread waits, so a
+    rewrite queued behind busy retrievers would stall every request.
+    """
+
+    def __init__(self, query_agent, retrieval_agent, executor=None, reuse_similarity=0.9):
+        self.query_agent = query_agent
+        self.retrieval_agent = retrieval_agent
+        self.executor = executor or ThreadPoolExecutor(max_workers=4, thread_name_prefix="query-rewrite")
+        self.reuse_similarity = reuse_similarity
+
+    def _similar(self, query, refined):
+        raw_embedding, refined_embedding = encode_query(query), encode_query(refined)
+        if raw_embedding is None or refined_embedding is None:
+            return False
+        return float(raw_embedding @ refined_embedding) >= self.reuse_similarity
+
+    def _rewrite(self, query):
+        try:
+            return self.query_agent.rewrite(query) or query
+        except Exception as e:
+            print(f"⚠️ Query rewriting failed: {str(e)}")
+            return query
+
+    def run(self, query, docs=None, top_k=5, filter_doc_type=None, file_id=None):
+        start = time.perf_counter()
+        timings = {}
+        report = {"timed_out": [], "failed": [], "latency_ms": {}}
+        retrieval = self.retrieval_agent
+        try:
+            rewrite_future = self.executor.submit(_timed, lambda: self._rewrite(query))
+
+            (raw_chunks, raw_keyword), timings["retrieve_raw_ms"] = _timed(
+                lambda: retrieval.retrieve(query, docs=docs, top_k=top_k, filter_doc_type=filter_doc_type,
+                                           file_id=file_id, report=report)
+            )
+
+            try:
+                refined, timings["rewrite_ms"] = rewrite_future.result(timeout=API_TIMEOUT)
+            except Exception as e:
+                print(f"⚠️ Query rewrite unavailable, using the raw query: {str(e)}")
+                refined, timings["rewrite_ms"] = query, (time.perf_counter() - start) * 1000
+
+            if normalize_query(refined).lower() == normalize_query(query).lower() or self._similar(query, refined):
+                strategy, chunks = "raw", raw_chunks
+            else:
+                (rewritten_chunks, rewritten_keyword), timings["retrieve_rewritten_ms"] = _timed(
+                    lambda: retrieval.retrieve(refined, docs=docs, top_k=top_k, filter_doc_type=filter_doc_type,
+                                               file_id=file_id, report=report)
+                )
+                # An exact identifier match beats fusion; prefer the rewritten query's
+                if rewritten_keyword:
+                    strategy, chunks = "rewritten", rewritten_chunks
+                elif raw_keyword:
+                    strategy, chunks = "raw", raw_chunks
+                else:
+                    strategy = "fused"
+                    chunks = reciprocal_rank_fusion([rewritten_chunks, raw_chunks], top_k=top_k * 2)
+
+            reranked, timings["rerank_ms"] = _timed(
+                lambda: retrieval.rerank(refined, chunks, top_k=top_k)
+            )
+
+            timings["total_ms"] = (time.perf_counter() - start) * 1000
+            # What rewrite -> retrieve -> rerank would have cost run back to back
+            timings["sequential_ms"] = (
+                timings["rewrite_ms"]
+                + timings.get("retrieve_rewritten_ms", timings["retrieve_raw_ms"])
+                + timings["rerank_ms"]
+            )
+            timings["saved_ms"] = timings["sequential_ms"] - timings["total_ms"]
+            timings = {name: round(value, 1) for name, value in timings.items()}
+            print(f"⏱️ Pipeline ({strategy}): {timings}")
+
+            msg = retrieval.result_message(refined, reranked, report)
+            msg["payload"].update({"timings": timings, "strategy": strategy, "original_query": query})
+            return msg
+        except Exception as e:
+            print(f"⚠️ SpeculativePipeline.run failed: {str(e)}")
+            print("Full traceback:")
+            traceback.print_exc()
+            return retrieval.result_message(query, [], report)
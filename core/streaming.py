@@ -0,0 +1,62 @@
+import queue
+import threading
+
+_DONE = object()
+
+
+class _ProducerError:
+    def __init__(self, error):
+        self.error = error
+
+
+def prefetch(iterable, maxsize=4):
+    """
+    Run `iterable` in a background thread and yield its items through a
+    bounded queue. The producer blocks once `maxsize` items are waiting, so a
+    slow consumer applies backpressure instead of letting batches pile up.
+    Exceptions raised by the producer are re-raised in the consumer. When
+    the consumer stops early, the producer stops too and closes `iterable`,
+    so a chain of stages shuts down from the end.
+    """
+    buffer = queue.Queue(maxsize=max(1, maxsize))
+    stop = threading.Event()
+
+    def _put(item):
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce():
+        try:
+            for item in iterable:
+                if not _put(item):
+                    return
+        except Exception as e:
+            _put(_ProducerError(e))
+            return
+        finally:
+            # A generator source (e.g. an upstream stage) is closed on this thread, which runs it
+            close = getattr(iterable, "close", None)
+            if close is not None:
+                close()
+        _put(_DONE)
+
+    producer = threading.Thread(target=_produce, daemon=True)
+    producer.start()
+
+    try:
+        while True:
+            item = buffer.get()
+            if item is _DONE:
+                break
+            if isinstance(item, _ProducerError):
+                raise item.error
+            yield item
+    finally:
+        # Unblock the producer if the consumer stops early
+        stop.set()
+        producer.join(timeout=1.0)
@@ -1,5 +1,7 @@
 import os
+import re
 from collections import defaultdict
+from core.doc_store import content_hash
 
 def extract_page_chunks(chunks):
     """Extract page-specific chunks from document chunks."""
@@ -28,3 +30,14 @@ def safe_execute(func, fallback=None, error_msg="Operation failed"):
     except Exception as e:
         print(f"⚠️ {error_msg}: {str(e)}")
         return fallback
+
+def normalize_query(query):
+    """Collapse whitespace so trivially different spellings of a query share cache keys."""
+    return re.sub(r"\s+", " ", query).strip()
+
+def chunk_id(doc):
+    """Stable id for a chunk: an explicit `chunk_id`, else a hash of source + content."""
+    if doc.get("chunk_id") is not None:
+        return str(doc["chunk_id"])
+    key = f"{doc.get('source', '')}\x00{doc.get('content', '')}"
+    return content_hash(key)
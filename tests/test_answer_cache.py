@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+from core.answer_cache import AnswerCache
+
+VECTORS = {
+    "how did revenue develop?": [1.0, 0.0, 0.0],
+    "how did the revenue develop?": [0.99, 0.141, 0.0],
+    "what are the main risks?": [0.0, 1.0, 0.0],
+}
+
+
+def _embed(query):
+    return np.array(VECTORS[query], dtype=np.float32)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return AnswerCache(path=str(tmp_path / "answers.sqlite"), ttl=3600, max_entries=100,
+                       similarity_threshold=0.95, embed_fn=_embed)
+
+
+def test_exact_hit_without_context(cache):
+    cache.put("doc", "How did  revenue develop?", "It grew.", ["c1", "c2"])
+    hit = cache.get("doc", "how did revenue develop?")
+    assert hit["answer"] == "It grew." and hit["match"] == "exact"
+    assert cache.get("other-doc", "how did revenue develop?") is None
+
+
+def test_semantic_hit_requires_the_same_context(cache):
+    cache.put("doc", "How did revenue develop?", "It grew.", ["c1", "c2"])
+    # Before retrieval (no chunk ids) a paraphrase must not be served
+    assert cache.get("doc", "How did the revenue develop?") is None
+    assert cache.get("doc", "How did the revenue develop?", chunk_ids=["c3"]) is None
+    hit = cache.get("doc", "How did the revenue develop?", chunk_ids=["c2", "c1"])
+    assert hit["match"] == "semantic" and hit["similarity"] >= 0.95
+    assert cache.get("doc", "What are the main risks?", chunk_ids=["c1", "c2"]) is None
+
+
+def test_each_question_counts_once(cache):
+    cache.put("doc", "How did revenue develop?", "It grew.", ["c1"])
+    # A miss before retrieval followed by the context-aware lookup is one question
+    assert cache.get("doc", "What are the main risks?", count_miss=False) is None
+    assert cache.get("doc", "What are the main risks?", chunk_ids=["c1"]) is None
+    assert cache.get("doc", "How did revenue develop?", count_miss=False)["match"] == "exact"
+    stats = cache.stats()
+    assert (stats["misses"], stats["hits_exact"], stats["hits_semantic"]) == (1, 1, 0)
+    assert stats["hit_rate"] == 0.5
+
+
+def test_invalidate_and_expiry(tmp_path):
+    cache = AnswerCache(path=str(tmp_path / "answers.sqlite"), ttl=0, embed_fn=_embed)
+    cache.put("doc", "How did revenue develop?", "It grew.", ["c1"])
+    assert cache.get("doc", "How did revenue develop?") is None
+
+    cache = AnswerCache(path=str(tmp_path / "fresh.sqlite"), ttl=3600, embed_fn=_embed)
+    cache.put("doc", "How did revenue develop?", "It grew.", ["c1"])
+    cache.invalidate("doc")
+    assert cache.get("doc", "How did revenue develop?") is None
@@ -0,0 +1,113 @@
+import pytest
+from core.bm25_index import BM25Index, identifier_tokens, reciprocal_rank_fusion, tokenize
+from core.config_manager import ConfigManager
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("status of invoice INV-2023-001?", ["inv-2023-001"]),
+    ("where is sku4471 stocked", ["sku4471"]),
+    ("order 2023-00481", ["2023-00481"]),
+    ("account 00481236", ["00481236"]),
+    ("revenue in 2023?", []),
+    ("q4 2022 results", []),
+    ("FY2023 guidance", []),
+    ("grew 12.5% to 340", []),
+])
+def test_identifier_tokens(query, expected):
+    assert identifier_tokens(query) == expected
+
+
+def test_tokenize_keeps_compounds_and_parts():
+    tokens = tokenize("Invoice INV-2023-001 was paid")
+    assert "inv-2023-001" in tokens
+    assert {"inv", "2023", "001"} <= set(tokens)
+    assert "was" not in tokens
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    a, b, c = ({"content": text} for text in ("alpha", "beta", "gamma"))
+    fused = reciprocal_rank_fusion([[a, b], [c, b]], top_k=3)
+    assert [doc["content"] for doc in fused] == ["beta", "alpha", "gamma"]
+    assert fused[0]["rrf_score"] == pytest.approx(2 / 62)
+    assert "rrf_score" not in b
+
+
+def test_reciprocal_rank_fusion_top_k():
+    docs = [{"content": str(i)} for i in range(10)]
+    assert len(reciprocal_rank_fusion([docs], top_k=3)) == 3
+
+
+def test_bm25_search_save_load(tmp_path, monkeypatch):
+    monkeypatch.setattr(ConfigManager, "VECTOR_STORE_BASE", str(tmp_path))
+    index = BM25Index("report")
+    index.add_documents([
+        {"content": "Revenue grew 12% in 2023.", "source": "p. 1"},
+        {"content": "Invoice INV-2023-001 is overdue.", "source": "p. 2"},
+        {"content": "Operating margin improved.", "source": "p. 3"},
+    ])
+    index.save()
+
+    loaded = BM25Index("report")
+    assert loaded.load()
+    results = loaded.search("INV-2023-001", k=2)
+    assert results[0]["source"] == "p. 2"
+
+
+def test_bm25_rekeys_md5_hashes_from_older_saves(tmp_path, monkeypatch):
+    import hashlib
+    import pickle
+    from core.doc_store import content_hash
+    monkeypatch.setattr(ConfigManager, "VECTOR_STORE_BASE", str(tmp_path))
+    index = BM25Index("report")
+    index.add_documents([{"content": "alpha", "source": "p. 1"}, {"content": "beta", "source": "p. 2"}])
+    index.save()
+    assert set(index.hashes) == {content_hash("alpha"), content_hash("beta")}
+
+    with open(index.index_path, "rb") as f:
+        payload = pickle.load(f)
+    payload["hashes"] = {hashlib.md5(c.encode()).hexdigest(): label for label, c in enumerate(("alpha", "beta"))}
+    with open(index.index_path, "wb") as f:
+        pickle.dump(payload, f)
+
+    loaded = BM25Index("report")
+    assert loaded.load()
+    assert loaded.hashes == {content_hash("alpha"): 0, content_hash("beta"): 1}
+    assert loaded.add_documents([{"content": "alpha"}]) == 0
+
+
+def test_bm25_delete_file_uses_the_filename_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(ConfigManager, "VECTOR_STORE_BASE", str(tmp_path))
+    index = BM25Index("report", compaction_threshold=1.0)
+    index.add_documents([
+        {"content": "alpha revenue", "source": "a.pdf p. 1"},
+        {"content": "beta revenue", "source": "b.pdf p. 1"},
+    ])
+    index.save()
+
+    loaded = BM25Index("report", compaction_threshold=1.0)
+    assert loaded.load()
+    loaded.add_documents([{"content": "gamma revenue", "source": "a.pdf p. 2"}])
+    monkeypatch.setattr(loaded, "iter_documents", None)
+    assert loaded.delete_file("a.pdf") == 2
+    assert [doc["source"] for doc in loaded.search("revenue")] == ["b.pdf p. 1"]
+    # Deleted content can be indexed again
+    assert loaded.add_documents([{"content": "alpha revenue", "source": "a.pdf p. 1"}]) == 1
+
+
+def test_deleted_chunks_do_not_skew_idf_or_avgdl():
+    docs = [
+        {"content": "revenue revenue revenue grew strongly across every region this year", "source": "a.pdf p. 1"},
+        {"content": "revenue fell", "source": "b.pdf p. 1"},
+        {"content": "margin improved on revenue mix", "source": "b.pdf p. 2"},
+        {"content": "cash flow was stable", "source": "b.pdf p. 3"},
+    ]
+    index = BM25Index("report", compaction_threshold=1.0)
+    index.add_documents(docs)
+    index.search("revenue")
+    assert index.delete_file("a.pdf") == 1
+
+    rebuilt = BM25Index("rebuilt")
+    rebuilt.add_documents(docs[1:])
+    for query in ("revenue", "margin revenue", "cash"):
+        expected = {doc["source"]: doc["bm25_score"] for doc in rebuilt.search(query)}
+        assert {doc["source"]: doc["bm25_score"] for doc in index.search(query)} == pytest.approx(expected)
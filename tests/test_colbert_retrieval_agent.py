@@ -0,0 +1,108 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("sentence_transformers")
+torch = pytest.importorskip("torch")
+
+import agents.colbert_retrieval_agent as colbert
+from agents.colbert_retrieval_agent import ColBERTRetrievalAgent
+
+DIM = 8
+
+
+class StubTokenModel:
+    """
+    Token embeddings from a whitespace tokenizer, truncated at
+    `max_seq_length` like the real tokenizer; records every encode call.
+    """
+
+    def __init__(self, max_seq_length=1024):
+        self.max_seq_length = max_seq_length
+        self.calls = []
+
+    @staticmethod
+    def token_vector(token):
+        return 3.0 * np.random.default_rng(sum(map(ord, token))).standard_normal(DIM).astype(np.float32)
+
+    def encode(self, texts, output_value=None, batch_size=32, show_progress_bar=False):
+        self.calls.append((len(texts), batch_size, output_value))
+        return [torch.from_numpy(np.array([self.token_vector(t) for t in text.split()[:self.max_seq_length]]))
+                for text in texts]
+
+
+def _encoding_agent(monkeypatch, max_seq_length=1024):
+    monkeypatch.setattr(colbert, "SentenceTransformer", lambda name: StubTokenModel(max_seq_length))
+    return ColBERTRetrievalAgent()
+
+
+def _maxsim(query_tokens, doc_tokens):
+    """Per-document MaxSim: each query token's best cosine match, summed."""
+    if len(doc_tokens) == 0:
+        return 0.0
+    query_norm = query_tokens / np.linalg.norm(query_tokens, axis=1, keepdims=True)
+    doc_norm = doc_tokens / np.linalg.norm(doc_tokens, axis=1, keepdims=True)
+    return float((query_norm @ doc_norm.T).max(axis=1).sum())
+
+
+def _unit(tokens):
+    return (tokens / np.linalg.norm(tokens, axis=1, keepdims=True)).astype(np.float32)
+
+
+@pytest.fixture
+def agent():
+    # Scoring needs no model
+    return ColBERTRetrievalAgent.__new__(ColBERTRetrievalAgent)
+
+
+def test_batched_scores_match_per_document_scoring(agent):
+    rng = np.random.default_rng(0)
+    query = rng.standard_normal((5, 16)).astype(np.float32)
+    docs = [_unit(rng.standard_normal((n, 16))) for n in (7, 0, 1, 12, 0, 3)]
+    scores = agent.batch_late_interaction_scores(query, docs)
+    assert scores == pytest.approx([_maxsim(query, doc) for doc in docs], abs=1e-5)
+    assert scores[1] == scores[4] == 0.0
+
+
+def test_single_candidate_and_all_empty(agent):
+    rng = np.random.default_rng(1)
+    query = rng.standard_normal((4, 8)).astype(np.float32)
+    doc = _unit(rng.standard_normal((6, 8)))
+    assert agent.batch_late_interaction_scores(query, [doc]) == pytest.approx([_maxsim(query, doc)], abs=1e-5)
+    empty = np.zeros((0, 8), dtype=np.float32)
+    assert agent.batch_late_interaction_scores(query, [empty, empty]).tolist() == [0.0, 0.0]
+
+
+@pytest.mark.parametrize("model_limit, expected", [(1024, 512), (128, 128), (None, 512)])
+def test_documents_are_truncated_by_the_tokenizer(monkeypatch, model_limit, expected):
+    agent = _encoding_agent(monkeypatch, model_limit)
+    assert agent.model.max_seq_length == expected
+    long_doc = " ".join(f"w{i}" for i in range(600))
+    encoded, = agent.encode_documents([{"content": long_doc}])
+    assert encoded["token_count"] == min(600, expected)
+
+
+def test_token_batches_keep_text_order(monkeypatch):
+    agent = _encoding_agent(monkeypatch)
+    agent.batch_size = 2
+    texts = ["alpha beta gamma", "delta", "epsilon zeta", "eta theta iota kappa", "lambda"]
+    tokens = agent.encode_token_batches(texts)
+    assert [len(t) for t in tokens] == [3, 1, 2, 4, 1]
+    assert agent.model.calls == [(5, 2, "token_embeddings")]
+    assert np.allclose(tokens[1].cpu().numpy()[0], StubTokenModel.token_vector("delta"))
+
+
+def test_tokens_are_unit_normalized_at_ingestion(monkeypatch):
+    agent = _encoding_agent(monkeypatch)
+    dense = np.ones(DIM, dtype=np.float32)
+    docs = [{"content": "revenue grew strongly", "embedding": dense}, {"content": "  "}, {"content": "margin fell"}]
+    encoded = agent.encode_documents(docs)
+
+    assert [doc["content"] for doc in encoded] == ["revenue grew strongly", "margin fell"]
+    raw = np.array([StubTokenModel.token_vector(t) for t in ("revenue", "grew", "strongly")])
+    assert np.allclose(np.linalg.norm(encoded[0]["colbert_tokens"], axis=1), 1.0)
+    assert np.allclose(encoded[0]["colbert_tokens"], raw / np.linalg.norm(raw, axis=1, keepdims=True))
+    assert np.allclose(encoded[0]["colbert_embedding"], raw.mean(axis=0))
+    # The dense vector the indexes use is kept; a missing one is filled from the tokens
+    assert encoded[0]["embedding"] is dense
+    assert np.allclose(encoded[1]["embedding"], encoded[1]["colbert_embedding"])
+    assert "colbert_tokens" not in docs[0]
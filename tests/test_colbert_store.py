@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+from core.config_manager import ConfigManager
+from core.colbert_store import ColBERTTokenStore
+
+DIM = 4
+
+
+@pytest.fixture(autouse=True)
+def vector_store_base(tmp_path, monkeypatch):
+    monkeypatch.setattr(ConfigManager, "VECTOR_STORE_BASE", str(tmp_path))
+
+
+def _docs(lengths, start=0):
+    return [{"content": f"doc {start + i}", "colbert_tokens": np.full((n, DIM), start + i, dtype=np.float32)}
+            for i, n in enumerate(lengths)]
+
+
+def test_append_and_read_back():
+    store = ColBERTTokenStore("file")
+    first = store.build(_docs([2, 3]))
+    second = store.build(_docs([1], start=2), append=True)
+    assert [doc["colbert_id"] for doc in first + second] == [0, 1, 2]
+
+    reader = ColBERTTokenStore("file")
+    assert reader.load()
+    assert reader.get(1).shape == (3, DIM)
+    assert (reader.get(2) == 2).all()
+
+
+def test_delete_compacts_and_keeps_ids_stable():
+    store = ColBERTTokenStore("file", compaction_threshold=0.25)
+    store.build(_docs([4, 4, 4, 4]))
+    reader = ColBERTTokenStore("file")
+    assert reader.load()
+
+    assert store.delete([0]) == 1
+    assert reader.is_stale()
+    # One of four rows dead is not past the threshold: same files, row just emptied
+    assert store._read_meta().get("generation", 0) == 0
+
+    assert store.delete([2, 2]) == 1
+    assert store._read_meta()["generation"] == 1
+    fresh = ColBERTTokenStore("file")
+    assert fresh.load()
+    assert fresh.tokens.shape == (8, DIM)
+    assert (fresh.get(1) == 1).all() and (fresh.get(3) == 3).all()
+    assert len(fresh.get(0)) == 0
+
+    # New documents go after the live rows of the compacted generation
+    added = store.build(_docs([2], start=4), append=True)
+    assert added[0]["colbert_id"] == 4
+    fresh.load()
+    assert (fresh.get(4) == 4).all() and (fresh.get(3) == 3).all()
+
+
+def test_append_after_deleting_the_last_document_reuses_its_rows():
+    store = ColBERTTokenStore("file", compaction_threshold=0.9)
+    store.build(_docs([2, 2, 2]))
+    store.delete([2])
+    added = store.build(_docs([2], start=3), append=True)
+
+    reader = ColBERTTokenStore("file")
+    assert reader.load()
+    assert reader.offsets[added[0]["colbert_id"]].tolist() == [4, 2]
+    assert reader.tokens.shape == (6, DIM)
+
+
+def test_rebuild_leaves_mapped_files_intact_and_marks_readers_stale():
+    store = ColBERTTokenStore("file")
+    store.build(_docs([3, 3]))
+    reader = ColBERTTokenStore("file")
+    assert reader.load()
+    old_tokens = reader.tokens
+
+    store.build(_docs([1], start=7))
+    # The reader's mapping still shows the data it loaded, not a truncated file
+    assert old_tokens.shape == (6, DIM)
+    assert (old_tokens[3:] == 1).all()
+    assert reader.is_stale()
+
+    assert reader.load()
+    assert reader.tokens.shape == (1, DIM)
+    assert (reader.get(0) == 7).all()
+    assert not reader.is_stale()
@@ -0,0 +1,58 @@
+from core.context_packer import ContextPacker, estimate_tokens
+
+PAGE = ("Revenue grew twelve percent in the third quarter. Margins widened on lower freight costs. "
+        "The outlook for next year was raised. Cash generation reached a record level.")
+
+
+def test_overlapping_chunks_of_a_page_are_merged_once():
+    first, second = PAGE[:120], PAGE[80:]
+    context, stats = ContextPacker().pack(
+        [{"content": first, "source": "p. 3"}, {"content": second, "source": "p. 3"}], budget=1000
+    )
+    assert context == f"### Source: p. 3\n{PAGE}"
+    assert stats["merged"] == 1
+    assert stats["blocks"] == 1
+    assert stats["tokens_saved"] > 0
+
+
+def test_chunks_of_different_pages_are_not_merged():
+    _, stats = ContextPacker().pack(
+        [{"content": PAGE[:120], "source": "p. 3"}, {"content": PAGE[80:], "source": "p. 4"}], budget=1000
+    )
+    assert stats["merged"] == 0
+    assert stats["blocks"] == 2
+
+
+def test_sentences_seen_in_a_higher_ranked_block_are_dropped():
+    repeated = "The outlook for next year was raised."
+    context, stats = ContextPacker().pack(
+        [{"content": f"Revenue grew twelve percent. {repeated}", "source": "p. 1"},
+         {"content": f"{repeated} Headcount stayed flat all year.", "source": "p. 9"}], budget=1000
+    )
+    assert context.count(repeated) == 1
+    assert "Headcount stayed flat all year." in context
+    assert stats["sentences_dropped"] == 1
+
+
+def test_budget_cuts_at_a_sentence_boundary_and_drops_the_rest():
+    chunks = [{"content": PAGE, "source": "p. 1"}, {"content": "Other page text that will not fit.", "source": "p. 2"}]
+    budget = estimate_tokens("### Source: p. 1\n" + PAGE) - 5
+    context, stats = ContextPacker(min_block_tokens=10).pack(chunks, budget)
+    assert stats["truncated"]
+    assert stats["blocks"] == 1
+    assert stats["blocks_dropped"] == 1
+    assert context.endswith(".")
+    assert stats["tokens"] <= budget
+
+
+def test_best_block_is_sent_even_when_nothing_fits():
+    context, stats = ContextPacker().pack([{"content": PAGE, "source": "p. 1"}], budget=8)
+    assert context.startswith("### Source: p. 1\n")
+    assert stats["blocks"] == 1
+    assert stats["truncated"]
+
+
+def test_empty_chunks_are_skipped():
+    context, stats = ContextPacker().pack([{"content": "  ", "source": "p. 1"}, {"source": "p. 2"}], budget=100)
+    assert context == ""
+    assert stats["blocks"] == 0
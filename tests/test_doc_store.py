@@ -0,0 +1,59 @@
+import sqlite3
+from core.doc_store import DocStore, content_hash
+
+
+def test_put_get_and_deleted(tmp_path):
+    store = DocStore(str(tmp_path / "docs.sqlite"))
+    store.put_many(0, [{"content": "a", "source": "p. 1", "page": 1}, {"content": "b", "embedding": [0.1]}])
+    assert len(store) == 2
+    assert store.get_many([1, 0, 7]) == [{"content": "b"}, {"content": "a", "source": "p. 1", "page": 1}, None]
+
+    store.set_deleted([0])
+    assert store.deleted_labels() == {0}
+    assert [label for label, _ in store.iter_documents()] == [1]
+    assert len(list(store.iter_documents(include_deleted=True))) == 2
+
+
+def test_replace_all_in_place_is_seen_by_open_readers(tmp_path):
+    path = str(tmp_path / "docs.sqlite")
+    writer = DocStore(path)
+    writer.replace_all([{"content": "old 0"}, {"content": "old 1"}, {"content": "old 2"}])
+    reader = DocStore(path)
+    assert reader[2]["content"] == "old 2"
+
+    writer.replace_all([{"content": "new 0"}])
+    assert len(reader) == 1
+    assert reader[0]["content"] == "new 0"
+    writer.close()
+    reader.close()
+
+
+def test_lookup_by_content_hash_and_file(tmp_path):
+    store = DocStore(str(tmp_path / "docs.sqlite"))
+    store.put_many(0, [
+        {"content": "alpha", "source": "a.pdf p. 1"},
+        {"content": "beta", "source": "a.pdf p. 2"},
+        {"content": "gamma", "source": "b.pdf p. 1", "metadata": {"filename": "b.pdf"}},
+    ])
+    store.set_deleted([1])
+    assert store.labels_for_hashes([content_hash("alpha"), content_hash("beta")]) == [(0, content_hash("alpha"))]
+    assert store.labels_for_files(["a.pdf"]) == [(0, content_hash("alpha"))]
+    assert store.labels_for_files(["b.pdf"]) == [(2, content_hash("gamma"))]
+    assert store.get_many([0, 1], include_deleted=False) == [{"content": "alpha", "source": "a.pdf p. 1"}, None]
+    store.close()
+
+
+def test_stores_without_lookup_columns_are_migrated(tmp_path):
+    path = str(tmp_path / "docs.sqlite")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE docs (label INTEGER PRIMARY KEY, content TEXT, source TEXT, extra TEXT, deleted INTEGER DEFAULT 0)"
+    )
+    conn.execute("INSERT INTO docs (label, content, source, extra) VALUES (0, 'alpha', 'a.pdf p. 1', '{}')")
+    conn.commit()
+    conn.close()
+
+    store = DocStore(path)
+    assert store.labels_for_hashes([content_hash("alpha")]) == [(0, content_hash("alpha"))]
+    assert store.labels_for_files(["a.pdf"]) == [(0, content_hash("alpha"))]
+    store.close()
@@ -0,0 +1,159 @@
+import os
+import pytest
+
+for module in ("pdfplumber", "docx", "pandas", "pptx", "langchain"):
+    pytest.importorskip(module)
+
+import core.document_loader as loader
+from core.config_manager import ConfigManager
+
+
+class _Page:
+    def __init__(self, text):
+        self.text = text
+
+    def extract_text(self):
+        if self.text.startswith("BAD"):
+            raise ValueError("unreadable page")
+        return self.text
+
+
+class _PDF:
+    """Reads a "PDF" whose pages are separated by form feeds."""
+
+    def __init__(self, path):
+        with open(path, encoding="utf-8") as f:
+            self.pages = [_Page(text) for text in f.read().split("\f")]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _Pdfplumber:
+    open = _PDF
+
+
+@pytest.fixture
+def tmp_cache(tmp_path, monkeypatch):
+    # Worker processes are forked, so they see the patched module too
+    monkeypatch.setattr(loader, "pdfplumber", _Pdfplumber)
+    monkeypatch.setattr(ConfigManager, "CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(loader, "HASH_MANIFEST_PATH", str(tmp_path / "cache" / "hash_manifest.json"))
+    monkeypatch.setattr(loader, "_manifest", None)
+    os.makedirs(tmp_path / "cache")
+    return tmp_path
+
+
+def _pdf(directory, name, pages):
+    path = directory / name
+    path.write_text("\f".join(pages), encoding="utf-8")
+    return str(path)
+
+
+def _files(directory):
+    return [
+        _pdf(directory, "a.pdf", [f"a page {i}" for i in range(1, 6)]),
+        _pdf(directory, "b.pdf", ["b page 1"]),
+        _pdf(directory, "c.pdf", [f"c page {i}" for i in range(1, 8)]),
+    ]
+
+
+def _cached(path):
+    return os.path.exists(loader._cache_path_for(path))
+
+
+def test_pdfs_are_split_into_page_ranges(tmp_cache):
+    tasks, failed = loader._plan_parse_tasks(_files(tmp_cache), pages_per_task=2)
+    assert tasks == [(0, 0, 2), (0, 2, 4), (0, 4, 5), (1, 0, 1), (2, 0, 2), (2, 2, 4), (2, 4, 6), (2, 6, 7)]
+    assert failed == set()
+
+
+@pytest.mark.parametrize("max_workers", [1, 3])
+def test_parallel_parse_preserves_file_and_page_order(tmp_cache, max_workers):
+    files = _files(tmp_cache)
+    per_file, failed = loader._parse_files_parallel(files, max_workers=max_workers, pages_per_task=2)
+    assert failed == set()
+    assert [[chunk["content"] for chunk in chunks] for chunks in per_file] == [
+        [f"a page {i}" for i in range(1, 6)], ["b page 1"], [f"c page {i}" for i in range(1, 8)]]
+
+    chunks = loader.load_or_parse_many(files, max_workers=max_workers)
+    assert [chunk["source"] for chunk in chunks] == (
+        [f"a.pdf p. {i}" for i in range(1, 6)] + ["b.pdf p. 1"] + [f"c.pdf p. {i}" for i in range(1, 8)])
+
+
+def test_a_failing_page_range_only_affects_its_file(tmp_cache, monkeypatch):
+    monkeypatch.setattr(ConfigManager, "PDF_PAGES_PER_TASK", 2)
+    a, _, c = _files(tmp_cache)
+    b = _pdf(tmp_cache, "b.pdf", ["b page 1", "b page 2", "BAD page 3", "b page 4"])
+    per_file, failed = loader._parse_files_parallel([a, b, c], max_workers=3, pages_per_task=2)
+    assert failed == {1}
+    assert len(per_file[0]) == 5 and len(per_file[2]) == 7
+
+    chunks = loader.load_or_parse_many([a, b, c], max_workers=3)
+    assert [chunk["content"] for chunk in chunks if chunk["source"].startswith("b.pdf")] == ["b page 1", "b page 2"]
+    assert len(chunks) == 5 + 2 + 7
+
+
+def test_partial_parses_are_never_cached(tmp_cache, monkeypatch):
+    monkeypatch.setattr(ConfigManager, "PDF_PAGES_PER_TASK", 2)
+    a, _, c = _files(tmp_cache)
+    b = _pdf(tmp_cache, "b.pdf", ["b page 1", "BAD page 2", "b page 3"])
+    loader.load_or_parse_many([a, b, c], max_workers=3)
+    assert _cached(a) and _cached(c)
+    assert not _cached(b)
+
+    # The complete files come from the cache; the partial one is parsed again
+    b = _pdf(tmp_cache, "b.pdf", ["b page 1", "b page 2", "b page 3"])
+    chunks = loader.load_or_parse_many([a, b, c], max_workers=3)
+    assert [chunk["content"] for chunk in chunks if chunk["source"].startswith("b.pdf")] == [
+        "b page 1", "b page 2", "b page 3"]
+    assert _cached(b)
+
+
+def test_manifest_is_written_once_per_batch(tmp_cache, monkeypatch):
+    writes = []
+    save = loader._save_manifest
+    monkeypatch.setattr(loader, "_save_manifest", lambda manifest: writes.append(len(manifest)) or save(manifest))
+    files = _files(tmp_cache)
+    loader.load_or_parse_many(files, max_workers=3)
+    assert writes == [3]
+
+    loader.load_or_parse_many(files, max_workers=3)
+    assert writes == [3]
+
+
+def test_unchanged_files_are_not_rehashed(tmp_cache, monkeypatch):
+    hashed = []
+    hash_contents = loader._hash_file_contents
+    monkeypatch.setattr(loader, "_hash_file_contents", lambda path: hashed.append(path) or hash_contents(path))
+    path = tmp_cache / "notes.txt"
+    path.write_text("quarterly notes", encoding="utf-8")
+
+    first = loader.get_file_hash(str(path))
+    assert loader.get_file_hash(str(path)) == first
+    assert hashed == [str(path)]
+
+    # A fresh process reads the same entry back from the manifest file
+    monkeypatch.setattr(loader, "_manifest", None)
+    assert loader.get_file_hash(str(path)) == first
+    assert len(hashed) == 1
+
+    # Touching changes the mtime: rehashed, same content hash
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert loader.get_file_hash(str(path)) == first
+    assert len(hashed) == 2
+
+    # A renamed file is a new manifest key
+    renamed = tmp_cache / "renamed.txt"
+    os.rename(path, renamed)
+    assert loader.get_file_hash(str(renamed)) == first
+    assert hashed[-1] == str(renamed) and len(hashed) == 3
+
+    # Rewriting the content in place gives a new hash
+    renamed.write_text("quarterly NOTES", encoding="utf-8")
+    assert loader.get_file_hash(str(renamed)) != first
+    assert len(hashed) == 4
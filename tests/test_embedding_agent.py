@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("chromadb")
+pytest.importorskip("streamlit")
+pytest.importorskip("sentence_transformers")
+
+from agents.embedding_agent import EmbeddingAgent
+
+
+def _agent():
+    # Only the dedup settings are needed; skip the Chroma client and ColBERT model
+    agent = EmbeddingAgent.__new__(EmbeddingAgent)
+    agent.sim_threshold = 0.92
+    agent.dedup_neighbors = 32
+    return agent
+
+
+def _greedy_filter(embeddings, threshold):
+    """The original n x n filter: each kept doc drops every later doc above the threshold."""
+    unit = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    similarity = unit @ unit.T
+    dropped = set()
+    keep = []
+    for i in range(len(unit)):
+        if i in dropped:
+            continue
+        dropped.update(j for j in range(i + 1, len(unit)) if similarity[i, j] > threshold)
+        keep.append(i)
+    return keep
+
+
+def test_large_duplicate_clusters_match_the_n_by_n_filter():
+    rng = np.random.default_rng(0)
+    boilerplate = rng.standard_normal(64)
+    clustered = boilerplate + 0.05 * rng.standard_normal((100, 64))
+    unrelated = rng.standard_normal((50, 64))
+    embeddings = np.vstack([clustered, unrelated]).astype(np.float32)
+    order = rng.permutation(len(embeddings))
+    embeddings = embeddings[order]
+    docs = [{"content": f"chunk {i}", "embedding": e} for i, e in enumerate(embeddings)]
+
+    kept = _agent()._filter_duplicates(docs)
+    expected = _greedy_filter(embeddings, 0.92)
+    assert len(expected) == 51
+    assert [doc["content"] for doc in kept] == [f"chunk {i}" for i in expected]
+
+
+def test_chained_near_duplicates_follow_the_greedy_order():
+    rng = np.random.default_rng(1)
+    embeddings = rng.standard_normal((300, 32)).astype(np.float32)
+    # Pairs and triples of close copies scattered through the list
+    for i in range(0, 300, 7):
+        embeddings[i + 1:i + 3] = embeddings[i] + 0.1 * rng.standard_normal((2, 32))
+    docs = [{"content": f"chunk {i}", "embedding": e} for i, e in enumerate(embeddings)]
+    kept = _agent()._filter_duplicates(docs)
+    assert [doc["content"] for doc in kept] == [f"chunk {i}" for i in _greedy_filter(embeddings, 0.92)]
+
+
+def test_indexed_duplicates_are_dropped_with_one_batched_query():
+    from core.hnswlib_search import HNSWSearch
+    rng = np.random.default_rng(2)
+    indexed = rng.standard_normal((40, 16)).astype(np.float32)
+    search = HNSWSearch(dim=16, max_elements=100)
+    search.add_documents([{"content": f"old {i}", "embedding": e} for i, e in enumerate(indexed)])
+    search.mark_deleted([3])
+
+    incoming = np.vstack([indexed[:6] + 0.01 * rng.standard_normal((6, 16)),
+                          rng.standard_normal((6, 16))]).astype(np.float32)
+    docs = [{"content": f"new {i}", "embedding": e} for i, e in enumerate(incoming)]
+    search.search = None  # no per-doc searches and no document reads
+    search.get_documents = None
+
+    kept = _agent()._drop_indexed_duplicates(search, docs)
+    # Copies of live docs go; the copy of the deleted doc and the unrelated docs stay
+    assert [doc["content"] for doc in kept] == ["new 3"] + [f"new {i}" for i in range(6, 12)]
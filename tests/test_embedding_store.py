@@ -0,0 +1,72 @@
+import os
+import numpy as np
+import pytest
+from core.embedding_store import EmbeddingStore
+
+DIM = 4
+
+
+def _vectors(n, offset=0):
+    return np.arange(offset * DIM, (offset + n) * DIM, dtype=np.float32).reshape(n, DIM)
+
+
+def test_put_get_roundtrip(tmp_path):
+    store = EmbeddingStore("model", DIM, base_dir=str(tmp_path))
+    assert store.put_many(["a", "b", "a"], _vectors(3)) == 2
+    matrix, found = store.get_many(["b", "missing", "a"])
+    assert found.tolist() == [True, False, True]
+    np.testing.assert_array_equal(matrix[0], _vectors(3)[1])
+    np.testing.assert_array_equal(matrix[1], np.zeros(DIM))
+
+
+def test_reload_keeps_rows(tmp_path):
+    EmbeddingStore("model", DIM, base_dir=str(tmp_path)).put_many(["a", "b"], _vectors(2))
+    store = EmbeddingStore("model", DIM, base_dir=str(tmp_path))
+    assert len(store) == 2
+    matrix, found = store.get_many(["a", "b"])
+    assert found.all()
+    np.testing.assert_array_equal(matrix, _vectors(2))
+
+
+def test_torn_row_is_truncated_before_next_append(tmp_path):
+    store = EmbeddingStore("model", DIM, base_dir=str(tmp_path))
+    store.put_many(["a", "b"], _vectors(2))
+    # Crash mid-write: half a row lands in the shard, its key never does
+    with open(store._shard_path(0), "ab") as f:
+        f.write(b"\x00" * (DIM * 2))
+
+    store = EmbeddingStore("model", DIM, base_dir=str(tmp_path))
+    assert os.path.getsize(store._shard_path(0)) == 2 * DIM * 4
+    store.put_many(["c"], _vectors(1, offset=2))
+
+    store = EmbeddingStore("model", DIM, base_dir=str(tmp_path))
+    matrix, found = store.get_many(["a", "b", "c"])
+    assert found.all()
+    np.testing.assert_array_equal(matrix, _vectors(3))
+
+
+def test_orphan_rows_and_torn_key_are_dropped(tmp_path):
+    store = EmbeddingStore("model", DIM, base_dir=str(tmp_path))
+    store.put_many(["a"], _vectors(1))
+    # Crash after the row of "b" was written but while its key was half written
+    with open(store._shard_path(0), "ab") as f:
+        f.write(_vectors(1, offset=1).tobytes())
+    with open(store._keys_path, "a", encoding="utf-8") as f:
+        f.write("b-partial")
+
+    store = EmbeddingStore("model", DIM, base_dir=str(tmp_path))
+    assert len(store) == 1
+    store.put_many(["c"], _vectors(1, offset=2))
+
+    store = EmbeddingStore("model", DIM, base_dir=str(tmp_path))
+    matrix, found = store.get_many(["a", "c", "b-partial"])
+    assert found.tolist() == [True, True, False]
+    np.testing.assert_array_equal(matrix[:2], np.vstack([_vectors(1), _vectors(1, offset=2)]))
+
+
+def test_model_mismatch_is_rejected(tmp_path):
+    store = EmbeddingStore("model", DIM, base_dir=str(tmp_path))
+    with open(os.path.join(store.store_dir, "meta.json"), "w", encoding="utf-8") as f:
+        f.write('{"model_name": "other", "dim": 4}')
+    with pytest.raises(ValueError):
+        EmbeddingStore("model", DIM, base_dir=str(tmp_path))
@@ -0,0 +1,123 @@
+from collections import OrderedDict
+import numpy as np
+import pytest
+
+pytest.importorskip("sentence_transformers")
+
+import core.embeddings as embeddings
+from core.config_manager import ConfigManager
+
+DIM = 8
+
+
+class StubEncoder:
+    """Deterministic unit vectors per text; records every text it encodes."""
+
+    def __init__(self):
+        self.texts = []
+
+    @staticmethod
+    def vector(text):
+        v = np.random.default_rng(sum(map(ord, text))).standard_normal(DIM).astype(np.float32)
+        return v / np.linalg.norm(v)
+
+    def encode(self, texts, normalize_embeddings=True, convert_to_numpy=True, show_progress_bar=False,
+               batch_size=32):
+        self.texts.extend(texts)
+        return np.array([self.vector(text) for text in texts])
+
+
+@pytest.fixture
+def model(monkeypatch):
+    stub = StubEncoder()
+    monkeypatch.setattr(embeddings, "embedding_model", stub)
+    monkeypatch.setattr(embeddings, "EMBEDDING_MODEL_NAME", "BAAI/bge-base-en-v1.5")
+    monkeypatch.setattr(embeddings, "_query_cache", OrderedDict())
+    return stub
+
+
+def test_query_cache_hits_on_the_normalized_query(model):
+    first = embeddings.encode_query("revenue  growth in 2023 ")
+    assert embeddings.encode_query("revenue growth in 2023") is first
+    assert len(model.texts) == 1
+
+    embeddings.encode_query("operating margin")
+    assert len(model.texts) == 2
+    assert embeddings.encode_query("   ") is None and embeddings.encode_query("") is None
+    assert len(model.texts) == 2
+
+
+def test_query_cache_is_a_bounded_lru(model, monkeypatch):
+    monkeypatch.setattr(ConfigManager, "QUERY_CACHE_SIZE", 2)
+    for query in ("a", "b", "a", "c"):
+        embeddings.encode_query(query)
+    # "a" was used more recently than "b", so "b" was evicted
+    assert len(embeddings._query_cache) == 2
+    embeddings.encode_query("a")
+    assert len(model.texts) == 3
+    embeddings.encode_query("b")
+    assert len(model.texts) == 4
+
+
+def test_cached_query_vectors_are_read_only(model):
+    vector = embeddings.encode_query("revenue")
+    assert vector.dtype == np.float32
+    with pytest.raises(ValueError):
+        vector[0] = 1.0
+    assert embeddings.encode_query("revenue")[0] == vector[0]
+
+
+@pytest.mark.parametrize("model_name, prefix", [
+    ("BAAI/bge-base-en-v1.5", "Represent this sentence for searching relevant passages: "),
+    ("intfloat/e5-base-v2", "query: "),
+    ("sentence-transformers/all-MiniLM-L6-v2", ""),
+])
+def test_query_prefix_follows_the_model(model, monkeypatch, model_name, prefix):
+    monkeypatch.setattr(embeddings, "EMBEDDING_MODEL_NAME", model_name)
+    vector = embeddings.encode_query("revenue growth")
+    assert model.texts == [prefix + "revenue growth"]
+    assert np.allclose(vector, StubEncoder.vector(prefix + "revenue growth"))
+
+
+def test_models_do_not_share_cached_queries(model, monkeypatch):
+    embeddings.encode_query("revenue growth")
+    monkeypatch.setattr(embeddings, "EMBEDDING_MODEL_NAME", "intfloat/e5-base-v2")
+    embeddings.encode_query("revenue growth")
+    assert model.texts == ["Represent this sentence for searching relevant passages: revenue growth",
+                           "query: revenue growth"]
+
+
+class StubTokenizer:
+    def __call__(self, texts, truncation=True, max_length=512):
+        return {"input_ids": [text.split()[:max_length] for text in texts]}
+
+
+def _texts(n=40, seed=0):
+    rng = np.random.default_rng(seed)
+    return [" ".join(f"w{j}" for j in range(int(length))) for length in rng.integers(1, 120, n)]
+
+
+def test_length_buckets_cover_every_text_within_limits():
+    lengths = np.array([len(text.split()) for text in _texts()])
+    batches = list(embeddings._length_buckets(lengths, batch_size=8, max_batch_tokens=300))
+    assert sorted(i for batch in batches for i in batch) == list(range(len(lengths)))
+    for batch in batches:
+        assert len(batch) <= 8
+        assert len(batch) == 1 or len(batch) * lengths[batch].max() <= 300
+    # Sorted by length, so each batch pads to similar lengths
+    flat = [lengths[i] for batch in batches for i in batch]
+    assert flat == sorted(flat)
+
+
+@pytest.mark.parametrize("tokenizer", [StubTokenizer(), None])
+def test_bucketed_encode_matches_a_single_encode_in_input_order(tokenizer):
+    texts = _texts()
+    model = StubEncoder()
+    model.tokenizer = tokenizer
+    model.max_seq_length = 64
+    bucketed = embeddings.encode_bucketed(texts, model=model, batch_size=8, max_batch_tokens=300)
+    assert sorted(model.texts) == sorted(texts) and model.texts != texts
+
+    single = StubEncoder().encode(texts)
+    assert bucketed.dtype == np.float32
+    assert np.allclose(bucketed, single, atol=1e-6)
@@ -0,0 +1,57 @@
+import numpy as np
+import faiss
+from core.faiss_tuning import build_tuned_index, create_index, holdout_split, is_id_mapped, tune_search_params
+
+
+def test_indexes_use_explicit_ids():
+    rng = np.random.default_rng(0)
+    vectors = rng.random((50, 8), dtype=np.float32)
+    index, params = build_tuned_index(vectors)
+    assert params["type"] == "flat"
+    assert is_id_mapped(index)
+
+    index.add_with_ids(vectors[:2] + 10, np.array([100, 101], dtype="int64"))
+    index.remove_ids(np.array([3], dtype="int64"))
+    _, found = index.search(vectors[3:4], 1)
+    assert found[0][0] != 3
+    _, found = index.search(vectors[:1] + 10, 1)
+    assert found[0][0] == 100
+
+
+def test_hnsw_tier_is_id_mapped():
+    index = create_index({"type": "hnsw", "M": 8, "ef_construction": 40}, 8)
+    assert is_id_mapped(index)
+    index.add_with_ids(np.eye(8, dtype=np.float32), np.arange(10, 18, dtype="int64"))
+    _, found = index.search(np.eye(8, dtype=np.float32)[2:3], 1)
+    assert found[0][0] == 12
+
+
+def test_holdout_rows_are_tuned_on_unseen_then_indexed():
+    rng = np.random.default_rng(1)
+    vectors = rng.standard_normal((12000, 16)).astype(np.float32)
+    indexed, held_out = holdout_split(len(vectors), 200)
+    assert len(held_out) == 200
+    assert not set(indexed) & set(held_out)
+    assert len(indexed) + len(held_out) == len(vectors)
+
+    index, params = build_tuned_index(vectors, target_recall=0.9)
+    assert params["type"] == "hnsw" and params["validated"]
+    assert index.ntotal == len(vectors)
+    # A held-out row is searchable once the build is done
+    _, found = index.search(vectors[held_out[:5]], 1)
+    assert list(found[:, 0]) == list(held_out[:5])
+
+
+def test_tuning_on_held_out_queries_reports_real_recall():
+    rng = np.random.default_rng(2)
+    vectors = rng.standard_normal((2000, 16)).astype(np.float32)
+    indexed, held_out = holdout_split(len(vectors), 100)
+    index = create_index({"type": "hnsw", "M": 4, "ef_construction": 8}, 16)
+    index.add_with_ids(vectors[indexed], indexed)
+    exact = faiss.IndexFlatL2(16)
+    exact.add(vectors[indexed])
+    params = tune_search_params(index, {"type": "hnsw", "ef_search": 1}, vectors[held_out], exact, 10, 2.0,
+                                ids=indexed)
+    # An unreachable target maxes the knob out and records the recall it measured
+    assert params["ef_search"] == 1024
+    assert 0.5 < params["recall_at_k"] <= 1.0
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("sentence_transformers")
+
+from core.embeddings import load_faiss_index, save_faiss_index, update_faiss_index
+from core.doc_store import DocStore
+
+DIM = 8
+
+
+def _docs(contents, seed=0):
+    rng = np.random.default_rng(seed)
+    return [{"content": content, "source": "a.pdf p. 1", "embedding": rng.random(DIM).astype(np.float32)}
+            for content in contents]
+
+
+def test_update_appends_rows_and_removes_by_content(tmp_path):
+    path = str(tmp_path / "faiss_file.pkl")
+    base = _docs([f"chunk {i}" for i in range(10)])
+    save_faiss_index(base, save_path=path)
+
+    added = _docs(["new chunk"], seed=1)
+    assert update_faiss_index(added, save_path=path, removed=[base[3]])
+
+    index, docs = load_faiss_index(path)
+    assert isinstance(docs, DocStore)
+    assert len(docs) == 11
+    assert docs.deleted_labels() == {3}
+    _, found = index.search(added[0]["embedding"][None, :], 1)
+    assert docs[int(found[0][0])]["content"] == "new chunk"
+    _, found = index.search(base[3]["embedding"][None, :], 11)
+    assert 3 not in found[0]
+    docs.close()
+
+
+def test_update_asks_for_a_rebuild_past_the_tombstone_threshold(tmp_path):
+    path = str(tmp_path / "faiss_file.pkl")
+    base = _docs([f"chunk {i}" for i in range(4)])
+    save_faiss_index(base, save_path=path)
+    assert not update_faiss_index([], save_path=path, removed=base[:2])
+    assert not update_faiss_index([], save_path=str(tmp_path / "missing.pkl"))
+
+
+def test_streamed_builder_switches_to_hnsw_and_tunes_on_held_out_rows(tmp_path, monkeypatch):
+    import core.embeddings as embeddings
+    monkeypatch.setattr(embeddings, "FLAT_MAX_VECTORS", 300)
+    rng = np.random.default_rng(3)
+    vectors = rng.standard_normal((1000, DIM)).astype(np.float32)
+    path = str(tmp_path / "faiss_file.pkl")
+    builder = embeddings.FaissIndexBuilder(save_path=path, sample_size=50, target_recall=0.9)
+    for start in range(0, len(vectors), 64):
+        builder.add([{"content": f"chunk {i}", "embedding": vectors[i]}
+                     for i in range(start, min(start + 64, len(vectors)))])
+    assert builder.index is not None
+    assert builder.index.ntotal == len(vectors) - 50
+    assert builder.save()
+
+    index, docs = load_faiss_index(path)
+    params = embeddings.load_faiss_params(path)
+    assert params["type"] == "hnsw" and params["validated"]
+    assert index.ntotal == len(vectors)
+    _, found = index.search(vectors[[5, 500, 999]], 1)
+    assert [docs[int(label)]["content"] for label in found[:, 0]] == ["chunk 5", "chunk 500", "chunk 999"]
+    docs.close()
+
+
+def test_small_streamed_build_uses_the_tuned_flat_tier(tmp_path):
+    import core.embeddings as embeddings
+    path = str(tmp_path / "faiss_file.pkl")
+    builder = embeddings.FaissIndexBuilder(save_path=path)
+    builder.add(_docs([f"chunk {i}" for i in range(5)]))
+    builder.add(_docs([f"chunk {i}" for i in range(5, 9)], seed=1))
+    assert builder.save()
+    index, docs = load_faiss_index(path)
+    assert embeddings.load_faiss_params(path)["type"] == "flat"
+    assert index.ntotal == 9 and len(docs) == 9
+    docs.close()
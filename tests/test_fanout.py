@@ -0,0 +1,53 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from core.fanout import fan_out
+
+
+@pytest.fixture
+def executor():
+    pool = ThreadPoolExecutor(max_workers=4)
+    yield pool
+    pool.shutdown(wait=False)
+
+
+def _sleep(seconds, value):
+    def task():
+        time.sleep(seconds)
+        return value
+    return task
+
+
+def test_tasks_run_concurrently(executor):
+    start = time.perf_counter()
+    results, report = fan_out({"a": _sleep(0.2, 1), "b": _sleep(0.2, 2)}, deadline_ms=1000, executor=executor)
+    assert time.perf_counter() - start < 0.35
+    assert results == {"a": 1, "b": 2}
+    assert report["timed_out"] == [] and report["failed"] == []
+    assert set(report["latency_ms"]) == {"a", "b"}
+
+
+def test_slow_task_is_abandoned_at_its_deadline(executor):
+    start = time.perf_counter()
+    results, report = fan_out({"fast": _sleep(0.01, "f"), "slow": _sleep(1.0, "s")}, deadline_ms=150,
+                              executor=executor)
+    assert time.perf_counter() - start < 0.5
+    assert results == {"fast": "f"}
+    assert report["timed_out"] == ["slow"]
+
+
+def test_per_task_deadlines_override_the_default(executor):
+    results, report = fan_out({"a": _sleep(0.2, 1), "b": _sleep(0.2, 2)}, deadline_ms=50,
+                              deadlines={"b": 1000}, executor=executor)
+    assert results == {"b": 2}
+    assert report["timed_out"] == ["a"]
+
+
+def test_failing_task_is_reported_without_failing_the_rest(executor):
+    def boom():
+        raise RuntimeError("index missing")
+
+    results, report = fan_out({"ok": _sleep(0, "x"), "bad": boom}, deadline_ms=1000, executor=executor)
+    assert results == {"ok": "x"}
+    assert report["failed"] == ["bad"]
+    assert report["timed_out"] == []
@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+from core.config_manager import ConfigManager
+from core.doc_store import content_hash
+from core.hnswlib_search import HNSWSearch
+
+DIM = 8
+
+
+@pytest.fixture(autouse=True)
+def vector_store_base(tmp_path, monkeypatch):
+    monkeypatch.setattr(ConfigManager, "VECTOR_STORE_BASE", str(tmp_path))
+
+
+def _docs(names):
+    rng = np.random.default_rng(len(names))
+    return [{"content": content, "source": f"{filename} p. 1", "embedding": rng.random(DIM)}
+            for filename, content in names]
+
+
+def test_known_and_file_lookups_use_saved_and_unsaved_docs():
+    search = HNSWSearch(dim=DIM, max_elements=100)
+    search.add_documents(_docs([("a.pdf", "alpha"), ("a.pdf", "beta"), ("b.pdf", "gamma")]))
+    search.save("file")
+
+    loaded = HNSWSearch(dim=DIM)
+    assert loaded.load("file")
+    loaded.add_documents(_docs([("a.pdf", "delta")]))
+    loaded.mark_deleted([1])
+
+    assert loaded.live_hashes([content_hash(c) for c in ("alpha", "beta", "delta", "zeta")]) == {
+        content_hash("alpha"), content_hash("delta")
+    }
+    assert sorted(loaded.file_hashes(["a.pdf"])) == [(0, content_hash("alpha")), (3, content_hash("delta"))]
+
+
+def test_failed_index_write_keeps_the_saved_pair(monkeypatch):
+    search = HNSWSearch(dim=DIM, max_elements=100)
+    search.add_documents(_docs([("a.pdf", "alpha")]))
+    assert search.save("file")
+
+    search.add_documents(_docs([("a.pdf", "beta"), ("a.pdf", "gamma")]))
+
+    class Unwritable:
+        def __getattr__(self, name):
+            return getattr(search_index, name)
+
+        def save_index(self, path):
+            raise OSError("disk full")
+
+    search_index = search.index
+    monkeypatch.setattr(search, "index", Unwritable())
+    assert not search.save("file")
+
+    loaded = HNSWSearch(dim=DIM)
+    assert loaded.load("file")
+    assert loaded.doc_count == loaded.index.get_current_count() == 1
+    assert [doc["content"] for doc in loaded.live_documents()] == ["alpha"]
+
+
+def test_nearest_similarities_match_single_searches():
+    search = HNSWSearch(dim=DIM, max_elements=100)
+    docs = _docs([("a.pdf", f"chunk {i}") for i in range(20)])
+    search.add_documents(docs)
+    search.mark_deleted([0])
+    rng = np.random.default_rng(5)
+    queries = rng.random((8, DIM))
+
+    expected = [search.search(query, k=1)[0]["similarity_score"] for query in queries]
+    assert search.nearest_similarities(queries) == pytest.approx(expected, abs=1e-5)
+    assert HNSWSearch(dim=DIM).nearest_similarities(queries).tolist() == [0.0] * 8
+
+
+def test_delete_file_uses_the_filename_index(monkeypatch):
+    search = HNSWSearch(dim=DIM, max_elements=100)
+    search.add_documents(_docs([("a.pdf", "alpha"), ("b.pdf", "beta"), ("a.pdf", "gamma")]))
+    search.save("file")
+
+    loaded = HNSWSearch(dim=DIM, compaction_threshold=1.0)
+    assert loaded.load("file")
+    loaded.add_documents(_docs([("a.pdf", "delta")]))
+    monkeypatch.setattr(loaded, "iter_documents", None)
+    assert loaded.delete_file("a.pdf") == 3
+    assert loaded.deleted == {0, 2, 3}
@@ -0,0 +1,76 @@
+import threading
+import numpy as np
+import pytest
+
+pytest.importorskip("sentence_transformers")
+
+from core.config_manager import ConfigManager
+from core.hnswlib_search import HNSWSearch
+from core.index_registry import IndexRegistry
+
+
+class FakeChromaClient:
+    def __init__(self):
+        self.names = []
+
+    def get_or_create_collection(self, name, **kwargs):
+        self.names.append(name)
+        return object()
+
+
+def test_chroma_handles_are_per_embedding_dimension():
+    client = FakeChromaClient()
+    registry = IndexRegistry(chroma_client=client)
+    first = registry.get_chroma("report", 768)
+    assert registry.get_chroma("report", 768) is first
+    assert registry.get_chroma("report", 384) is not first
+    assert client.names == ["chroma_report_d768", "chroma_report_d384"]
+
+
+def _save_hnsw(file_id, vectors):
+    search = HNSWSearch(dim=vectors.shape[1])
+    search.add_documents([{"content": f"{file_id} chunk {i}", "embedding": v} for i, v in enumerate(vectors)])
+    assert search.save(file_id)
+
+
+def test_evicting_a_handle_does_not_break_readers_still_using_it(monkeypatch, tmp_path):
+    monkeypatch.setattr(ConfigManager, "VECTOR_STORE_BASE", str(tmp_path))
+    rng = np.random.default_rng(0)
+    vectors = rng.random((20, 8), dtype=np.float32)
+    for file_id in ("a", "b", "c"):
+        _save_hnsw(file_id, vectors)
+    # Any second handle pushes the budget over, so every load evicts the others
+    registry = IndexRegistry(memory_budget=1)
+    held = registry.get_hnsw("a")
+    failures = []
+    stop = threading.Event()
+
+    def reader():
+        while not stop.is_set():
+            for search in (held, registry.get_hnsw("a")):
+                if len(search.search(vectors[3], 3)) != 3:
+                    failures.append(search)
+
+    thread = threading.Thread(target=reader)
+    thread.start()
+    try:
+        for _ in range(50):
+            registry.get_hnsw("b")
+            registry.get_hnsw("c")
+            registry.invalidate("a")
+    finally:
+        stop.set()
+        thread.join()
+    assert failures == []
+    assert held.search(vectors[3], 1)[0]["content"] == "a chunk 3"
+
+
+def test_key_locks_are_pruned_with_their_entries(monkeypatch, tmp_path):
+    monkeypatch.setattr(ConfigManager, "VECTOR_STORE_BASE", str(tmp_path))
+    _save_hnsw("a", np.eye(8, dtype=np.float32))
+    registry = IndexRegistry()
+    assert registry.get_hnsw("a") is not None
+    assert registry.get_hnsw("missing") is None
+    assert set(registry._key_locks) == {("hnsw", "a")}
+    registry.invalidate()
+    assert registry._key_locks == {}
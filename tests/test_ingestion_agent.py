@@ -0,0 +1,110 @@
+import time
+import numpy as np
+import pytest
+
+pytest.importorskip("streamlit")
+pytest.importorskip("sentence_transformers")
+pytest.importorskip("pdfplumber")
+
+import agents.ingestion_agent as ingestion
+from core.config_manager import ConfigManager
+
+STEP = 0.03
+BATCHES = 8
+
+
+class _Session:
+    session_state = {"current_file": "report.pdf"}
+
+
+def _pipeline(monkeypatch, queue_size):
+    monkeypatch.setattr(ingestion, "st", _Session)
+    monkeypatch.setattr(ConfigManager, "STREAM_QUEUE_SIZE", queue_size)
+    trace = {"parsed": 0, "indexed": 0, "ahead": [], "embed_started": [], "parse_done": [], "saved": []}
+
+    def iter_parse(file_paths, max_workers=None):
+        for i in range(BATCHES):
+            time.sleep(STEP)
+            trace["parsed"] += 1
+            trace["parse_done"].append(time.perf_counter())
+            yield [{"content": f"chunk {i}", "source": f"report.pdf p. {i + 1}"}]
+
+    def iter_embed(batches, doc_type=None):
+        for batch in batches:
+            trace["embed_started"].append(time.perf_counter())
+            time.sleep(STEP)
+            yield [dict(doc, embedding=[0.0]) for doc in batch]
+
+    class Builder:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def add(self, batch):
+            trace["ahead"].append(trace["parsed"] - trace["indexed"])
+            time.sleep(STEP)
+            trace["indexed"] += 1
+
+        def add_documents(self, batch):
+            pass
+
+        def save(self):
+            trace["saved"].append(type(self).__name__)
+
+    monkeypatch.setattr(ingestion, "iter_parse", iter_parse)
+    monkeypatch.setattr(ingestion, "iter_embed", iter_embed)
+    monkeypatch.setattr(ingestion, "FaissIndexBuilder", Builder)
+    monkeypatch.setattr(ingestion, "BM25Index", Builder)
+    return trace
+
+
+def test_parse_embed_and_index_stages_overlap(monkeypatch):
+    trace = _pipeline(monkeypatch, queue_size=2)
+    start = time.perf_counter()
+    message = ingestion.IngestionAgent().handle(["data/report.pdf"])
+    elapsed = time.perf_counter() - start
+
+    documents = message["payload"]["documents"]
+    assert [doc["content"] for doc in documents] == [f"chunk {i}" for i in range(BATCHES)]
+    assert len(trace["saved"]) == 2
+    # Serially this takes 3 * BATCHES steps
+    assert elapsed < 2 * BATCHES * STEP
+    assert trace["embed_started"][0] < trace["parse_done"][-1]
+
+
+def test_queue_bound_holds_when_indexing_is_the_slow_stage(monkeypatch):
+    trace = _pipeline(monkeypatch, queue_size=1)
+    ingestion.IngestionAgent().handle(["data/report.pdf"])
+    # Parsed but not yet indexed: one queued and one held per queue, the batch
+    # being embedded and the one being indexed
+    assert max(trace["ahead"]) <= 2 * 1 + 3
+
+
+def test_indexes_built_from_the_same_source_are_reused(monkeypatch):
+    trace = _pipeline(monkeypatch, queue_size=2)
+    monkeypatch.setattr(ingestion.IngestionAgent, "_indexes_current", staticmethod(lambda *args: True))
+    message = ingestion.IngestionAgent().handle(["data/report.pdf"])
+    assert len(message["payload"]["documents"]) == BATCHES
+    assert trace["ahead"] == [] and trace["saved"] == []
+
+
+def test_indexes_are_current_only_for_the_source_they_were_built_from(monkeypatch, tmp_path):
+    from core.bm25_index import BM25Index
+    from core.embeddings import FaissIndexBuilder
+    monkeypatch.setattr(ConfigManager, "VECTOR_STORE_BASE", str(tmp_path))
+    source = {"files": ["abc"], "model": "bge"}
+    faiss_path = str(tmp_path / "faiss_report.pdf.pkl")
+    bm25 = BM25Index("report")
+    check = ingestion.IngestionAgent._indexes_current
+    assert not check(faiss_path, bm25, source)
+
+    docs = [{"content": f"chunk {i}", "embedding": np.full(4, i, dtype=np.float32)} for i in range(3)]
+    builder = FaissIndexBuilder(save_path=faiss_path, source=source)
+    builder.add(docs)
+    assert builder.save()
+    assert not check(faiss_path, bm25, source)
+
+    bm25.add_documents(docs)
+    assert bm25.save()
+    assert check(faiss_path, bm25, source)
+    assert not check(faiss_path, bm25, {"files": ["changed"], "model": "bge"})
+    assert not check(faiss_path, bm25, None)
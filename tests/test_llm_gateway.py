@@ -0,0 +1,106 @@
+import threading
+import time
+import pytest
+
+pytest.importorskip("httpx")
+pytest.importorskip("openai")
+pytest.importorskip("dotenv")
+
+from core.llm_gateway import LLMGateway, RateLimiter
+from benchmarks.fake_openrouter import FakeOpenRouter, start_server
+
+
+@pytest.fixture
+def fake_server():
+    fake = FakeOpenRouter(ttft_ms=50, token_ms=1)
+    server, base_url = start_server(fake)
+    yield fake, base_url
+    server.shutdown()
+
+
+def _stream_in_thread(gateway, cancel):
+    result = {}
+
+    def run():
+        start = time.perf_counter()
+        result["deltas"] = list(gateway.stream("prompt", "model", cancel=cancel))
+        result["seconds"] = time.perf_counter() - start
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread, result
+
+
+def test_stream_yields_the_answer(fake_server):
+    fake, base_url = fake_server
+    gateway = LLMGateway(api_key="fake", base_url=base_url)
+    assert "".join(gateway.stream("prompt", "model")) == fake.answer
+    gateway.close()
+
+
+@pytest.mark.parametrize("ttft_ms,token_ms", [(5000, 1), (50, 5000)])
+def test_cancelled_stalled_stream_frees_its_slot_promptly(fake_server, ttft_ms, token_ms):
+    fake, base_url = fake_server
+    fake.ttft_ms, fake.token_ms = ttft_ms, token_ms
+    gateway = LLMGateway(api_key="fake", base_url=base_url, max_concurrency=1)
+    cancel = threading.Event()
+    thread, result = _stream_in_thread(gateway, cancel)
+    time.sleep(0.3)
+    cancel.set()
+    thread.join(2)
+
+    assert not thread.is_alive()
+    assert result["seconds"] < 1.5
+    # The only request slot is free again
+    assert gateway._slots.acquire(timeout=0.5)
+    gateway._slots.release()
+    gateway.close()
+
+
+def test_rate_limiter_disabled_never_waits():
+    limiter = RateLimiter(0)
+    assert all(limiter.acquire() == 0.0 for _ in range(100))
+
+
+def test_rate_limiter_allows_a_burst_then_paces():
+    limiter = RateLimiter(rate_per_minute=600, burst=3)
+    assert sum(limiter.acquire() for _ in range(3)) < 0.05
+    waited = limiter.acquire()
+    assert 0.05 < waited < 0.3
+
+
+def test_rate_limiter_wait_past_the_timeout_raises():
+    limiter = RateLimiter(rate_per_minute=6, burst=1)
+    limiter.acquire()
+    with pytest.raises(TimeoutError):
+        limiter.acquire(timeout=0.1)
+
+
+def test_identical_in_flight_requests_are_coalesced(fake_server):
+    fake, base_url = fake_server
+    gateway = LLMGateway(api_key="fake", base_url=base_url)
+    before = fake.stats()["requests"]
+    answers = []
+    threads = [threading.Thread(target=lambda: answers.append(gateway.complete("same prompt", "model")))
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert answers == [fake.answer] * 4
+    assert fake.stats()["requests"] - before < 4
+    assert gateway.stats()["coalesced"] >= 1
+    gateway.close()
+
+
+def test_max_concurrency_bounds_requests_in_flight(fake_server):
+    fake, base_url = fake_server
+    gateway = LLMGateway(api_key="fake", base_url=base_url, max_concurrency=2)
+    threads = [threading.Thread(target=gateway.complete, args=(f"prompt {i}", "model")) for i in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert fake.peak_concurrency <= 2
+    assert gateway.stats()["requests"] == 6
+    gateway.close()
@@ -0,0 +1,61 @@
+import pytest
+
+pytest.importorskip("openai")
+pytest.importorskip("tenacity")
+pytest.importorskip("dotenv")
+pytest.importorskip("sentence_transformers")
+
+from agents.llm_response_agent import LLMResponseAgent, RED_FLAGS
+
+MESSAGE = {"payload": {"query": "How did revenue develop?",
+                       "retrieved_context": [{"content": "Revenue grew 12%.", "source": "report.pdf p. 3"}]}}
+
+
+def _agent(answers):
+    agent = LLMResponseAgent()
+    agent.models = list(answers)
+    agent.hedging = True
+    agent.answer_cache = None
+
+    def stream_llm(prompt, model, cancel=None):
+        text = answers[model]
+        for i in range(0, len(text), 20):
+            yield text[i:i + 20]
+
+    agent.stream_llm = stream_llm
+    return agent
+
+
+def test_guardrail_miss_after_the_window_falls_back_to_the_next_model():
+    agent = _agent({"flaky": "x" * 300 + " " + RED_FLAGS[0], "good": "Revenue grew 12% year over year."})
+    assert agent.handle(MESSAGE) == "Revenue grew 12% year over year."
+
+
+def test_every_model_tripping_the_guardrail_gives_the_sorry_message():
+    agent = _agent({"a": "y" * 300 + RED_FLAGS[0], "b": "z" * 300 + RED_FLAGS[1]})
+    assert agent.handle(MESSAGE).startswith("⚠️ Sorry")
+
+
+def test_each_model_gets_context_packed_to_its_own_budget(monkeypatch):
+    import agents.llm_response_agent as module
+    monkeypatch.setattr(module, "MODEL_TOKEN_BUDGETS", {"small": 60, "large": 4000})
+    page = " ".join(f"Sentence number {i} talks about quarterly revenue." for i in range(40))
+    message = {"payload": {"query": "How did revenue develop?",
+                           "retrieved_context": [{"content": page, "source": "report.pdf p. 3"}]}}
+    prompts = {}
+    agent = LLMResponseAgent()
+    agent.models = ["small", "large"]
+    agent.hedging = False
+    agent.answer_cache = None
+
+    def call_llm(prompt, model):
+        prompts[model] = prompt
+        if model == "small":
+            raise RuntimeError("down")
+        return "Revenue grew."
+
+    agent.call_llm = call_llm
+    assert agent.handle(message) == "Revenue grew."
+    assert len(prompts["large"]) > len(prompts["small"])
+    assert message["payload"]["context_stats"]["budget"] > 60
+    assert "step by step" not in prompts["large"]
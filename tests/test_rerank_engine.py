@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("sentence_transformers")
+
+from core.rerank_engine import CrossEncoderEngine
+
+DOCS = [{"content": f"chunk {i}", "source": f"p. {i}"} for i in range(10)]
+
+
+class StubCrossEncoder:
+    """Scores a pair by a fixed per-chunk value; records every predict call."""
+
+    def __init__(self, scores=None):
+        self.scores = scores or {}
+        self.calls = []
+
+    def predict(self, pairs, batch_size=32, show_progress_bar=False):
+        self.calls.append((len(pairs), batch_size))
+        out = []
+        for start in range(0, len(pairs), batch_size):
+            out.extend(self.scores.get(content, float(len(content) % 7) - 3)
+                       for _, content in pairs[start:start + batch_size])
+        return np.array(out, dtype=np.float32)
+
+
+def _engine(model=None, **kwargs):
+    kwargs.setdefault("batch_size", 4)
+    kwargs.setdefault("cache_size", 100)
+    return CrossEncoderEngine(model=model or StubCrossEncoder(), quantize=False, **kwargs)
+
+
+def test_cache_scores_only_unseen_pairs():
+    engine = _engine()
+    engine.score("revenue", DOCS[:6])
+    assert engine.cache_stats()["misses"] == 6
+
+    engine.score("revenue", DOCS[3:9])
+    stats = engine.cache_stats()
+    assert (stats["hits"], stats["misses"]) == (3, 9)
+    assert [n for n, _ in engine.model.calls] == [6, 3]
+
+    engine.score("margin", DOCS[:2])
+    assert engine.cache_stats()["misses"] == 11
+
+
+def test_cache_key_includes_model_and_quantization():
+    engine = _engine()
+    engine.score("revenue", DOCS[:3])
+    key = next(iter(engine._cache))
+    assert key[:2] == ("cross-encoder/ms-marco-MiniLM-L-6-v2", False)
+
+    # Same cache contents, different model or precision: nothing is reused
+    for attr, value in (("model_name", "other-model"), ("quantize", True)):
+        other = _engine()
+        other._cache.update(engine._cache)
+        setattr(other, attr, value)
+        other.score("revenue", DOCS[:3])
+        assert other.cache_stats()["hits"] == 0
+
+
+def test_cache_is_bounded():
+    engine = _engine(cache_size=5)
+    engine.score("revenue", DOCS)
+    assert engine.cache_stats()["size"] == 5
+    engine.score("revenue", DOCS[-5:])
+    assert engine.cache_stats()["hits"] == 5
+
+
+def test_misses_are_predicted_in_batch_size_chunks():
+    engine = _engine(batch_size=3)
+    engine.score("revenue", DOCS)
+    assert engine.model.calls == [(10, 3)]
+
+
+def test_cached_ranking_matches_uncached():
+    scores = {doc["content"]: float(s) for doc, s in zip(DOCS, np.random.default_rng(0).standard_normal(10))}
+    cached = _engine(StubCrossEncoder(scores))
+    cached.rerank("revenue", DOCS[:5])
+    first = cached.rerank("revenue", DOCS, top_k=6)
+    assert cached.cache_stats()["hits"] == 5
+
+    uncached = _engine(StubCrossEncoder(scores), cache_size=0)
+    expected = uncached.rerank("revenue", DOCS, top_k=6)
+    assert [doc["content"] for doc in first] == [doc["content"] for doc in expected]
+    assert [doc["score"] for doc in first] == pytest.approx([doc["score"] for doc in expected])
+    assert "score" not in DOCS[0]
+
+
+def test_constant_scores_normalize_to_zero():
+    engine = _engine(StubCrossEncoder({doc["content"]: 2.5 for doc in DOCS}))
+    ranked = engine.rerank("revenue", DOCS[:4])
+    assert [doc["score"] for doc in ranked] == [0.0] * 4
+    assert [doc["content"] for doc in ranked] == [doc["content"] for doc in DOCS[:4]]
@@ -0,0 +1,62 @@
+import time
+import pytest
+
+pytest.importorskip("chromadb")
+pytest.importorskip("streamlit")
+pytest.importorskip("sentence_transformers")
+
+import agents.retrieval_agent as retrieval
+from agents.retrieval_agent import RetrievalAgent
+
+DELAY = 0.1
+
+
+def _agent(monkeypatch, bm25=(), hnsw=(), faiss=(), chroma=()):
+    monkeypatch.setattr(retrieval, "encode_query", lambda query: None)
+    # Only the retrievers are needed; skip the Chroma client, registry and models
+    agent = RetrievalAgent.__new__(RetrievalAgent)
+    agent.retriever_deadlines = {}
+    calls = []
+
+    def retriever(name, results):
+        def run(*args, **kwargs):
+            calls.append(name)
+            time.sleep(DELAY)
+            return [{"content": content, "source": name} for content in results]
+        return run
+
+    agent._retrieve_bm25 = retriever("bm25", bm25)
+    agent._retrieve_hnsw = retriever("hnsw", hnsw)
+    agent._retrieve_faiss = retriever("faiss", faiss)
+    agent._retrieve_chroma = retriever("chroma", chroma)
+    return agent, calls
+
+
+def test_all_retrievers_run_in_one_fan_out(monkeypatch):
+    agent, calls = _agent(monkeypatch, bm25=["alpha", "beta"], hnsw=["beta", "gamma"])
+    report = {"timed_out": [], "failed": [], "latency_ms": {}}
+    start = time.perf_counter()
+    chunks, keyword = agent.retrieve("revenue growth", file_id="report.pdf", report=report)
+    # Sequentially this is at least two round trips (BM25, then HNSW)
+    assert time.perf_counter() - start < 1.8 * DELAY
+    assert sorted(calls) == ["bm25", "chroma", "faiss", "hnsw"]
+    assert set(report["latency_ms"]) == set(calls)
+    assert not keyword
+    assert [chunk["content"] for chunk in chunks] == ["beta", "alpha", "gamma"]
+
+
+def test_identifier_shortcut_returns_bm25_results(monkeypatch):
+    agent, _ = _agent(monkeypatch, bm25=["invoice INV-2023-001 is overdue"], hnsw=["unrelated"])
+    chunks, keyword = agent.retrieve("status of INV-2023-001", file_id="report.pdf")
+    assert keyword
+    assert [chunk["source"] for chunk in chunks] == ["bm25"]
+
+
+def test_faiss_and_chroma_are_used_only_when_hnsw_is_empty(monkeypatch):
+    agent, _ = _agent(monkeypatch, bm25=["alpha"], hnsw=["beta"], faiss=["gamma"], chroma=["delta"])
+    chunks, _ = agent.retrieve("revenue growth", file_id="report.pdf")
+    assert {chunk["source"] for chunk in chunks} == {"bm25", "hnsw"}
+
+    agent, _ = _agent(monkeypatch, bm25=["alpha"], faiss=["gamma"], chroma=["delta"])
+    chunks, _ = agent.retrieve("revenue growth", file_id="report.pdf")
+    assert {chunk["source"] for chunk in chunks} == {"bm25", "faiss", "chroma"}
@@ -0,0 +1,48 @@
+import threading
+import pytest
+
+pytest.importorskip("sentence_transformers")
+
+from core.fanout import get_executor
+from core.speculative_pipeline import SpeculativePipeline
+
+
+class FakeRewriter:
+    def rewrite(self, query):
+        return query
+
+
+class FakeRetrieval:
+    def __init__(self, fail=False):
+        self.fail = fail
+
+    def retrieve(self, query, **kwargs):
+        if self.fail:
+            raise RuntimeError("index unavailable")
+        return [{"content": f"chunk for {query}", "source": "a.pdf p. 1"}], False
+
+    def rerank(self, query, chunks, top_k=5):
+        return chunks[:top_k]
+
+    def result_message(self, query, chunks, report):
+        return {"payload": {"query": query, "retrieved_context": chunks, "retrieval_report": report}}
+
+
+def test_failure_returns_an_empty_result_message():
+    msg = SpeculativePipeline(FakeRewriter(), FakeRetrieval(fail=True)).run("revenue?")
+    assert msg["payload"]["retrieved_context"] == []
+    assert msg["payload"]["query"] == "revenue?"
+
+
+def test_rewrite_does_not_queue_behind_a_busy_retriever_pool():
+    release = threading.Event()
+    shared = get_executor()
+    blockers = [shared.submit(release.wait, 5) for _ in range(shared._max_workers)]
+    try:
+        msg = SpeculativePipeline(FakeRewriter(), FakeRetrieval()).run("revenue?")
+        assert msg["payload"]["timings"]["rewrite_ms"] < 1000
+        assert msg["payload"]["retrieved_context"]
+    finally:
+        release.set()
+        for blocker in blockers:
+            blocker.result()
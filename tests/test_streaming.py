@@ -0,0 +1,75 @@
+import threading
+import time
+import pytest
+from core.streaming import prefetch
+
+
+def test_queue_bound_holds_against_a_slow_consumer():
+    produced = []
+    ahead = []
+
+    def source():
+        for i in range(30):
+            produced.append(i)
+            yield i
+
+    consumed = 0
+    for _ in prefetch(source(), maxsize=3):
+        consumed += 1
+        time.sleep(0.005)
+        ahead.append(len(produced) - consumed)
+    assert consumed == 30
+    # `maxsize` queued items, plus one the producer holds while blocked on the full queue
+    assert max(ahead) <= 3 + 1
+
+
+def test_chained_stages_overlap():
+    delay = 0.05
+    spans = {"parse": [], "embed": [], "index": []}
+
+    def stage(name, items):
+        for item in items:
+            start = time.perf_counter()
+            time.sleep(delay)
+            spans[name].append((start, time.perf_counter()))
+            yield item
+
+    def parse():
+        yield from stage("parse", range(6))
+
+    start = time.perf_counter()
+    embedded = prefetch(stage("embed", prefetch(parse(), maxsize=2)), maxsize=2)
+    assert list(stage("index", embedded)) == list(range(6))
+    elapsed = time.perf_counter() - start
+
+    # Serially this is 18 steps; pipelined it is the 6 of one stage plus the fill/drain of the others
+    assert elapsed < 12 * delay
+    # Embedding the first batch starts before parsing the last one ends
+    assert spans["embed"][0][0] < spans["parse"][-1][1]
+
+
+def test_producer_errors_reach_the_consumer():
+    def source():
+        yield 1
+        raise ValueError("bad page")
+
+    items = prefetch(source())
+    assert next(items) == 1
+    with pytest.raises(ValueError):
+        next(items)
+
+
+def test_stopping_early_closes_the_source():
+    closed = threading.Event()
+
+    def source():
+        try:
+            for i in range(1000):
+                yield i
+        finally:
+            closed.set()
+
+    items = prefetch(source(), maxsize=2)
+    assert next(items) == 0
+    items.close()
+    assert closed.wait(1.0)